@@ -0,0 +1,91 @@
+"""Background executor for slow system control actions.
+
+Key handlers call :func:`submit` instead of running ``nmcli``, ``amixer``
+and friends themselves, so the event loop never waits on a subprocess.
+Actions are keyed by what they control; submitting a new action for a key
+that is still queued replaces the queued one, so holding LEFT on Volume
+only applies the last value.  Results are collected with :func:`poll`.
+"""
+
+import collections
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_cond = threading.Condition()
+_order: collections.deque[str] = collections.deque()  # queued keys, FIFO
+_queued: dict[str, tuple] = {}  # key -> (fn, args, on_done)
+_running: str | None = None
+_results: list[tuple[str, bool, str]] = []
+_thread = None
+
+
+def submit(key: str, fn, *args, on_done=None) -> None:
+    """Run ``fn(*args)`` in the background, superseding queued ``key`` work.
+
+    ``on_done(ok, error)`` is called from the worker thread when the action
+    finishes; ``error`` is an empty string on success.
+    """
+    _ensure_started()
+    with _cond:
+        if key not in _queued:
+            _order.append(key)
+        _queued[key] = (fn, args, on_done)
+        _cond.notify()
+
+
+def pending(key: str) -> bool:
+    """Return True while an action for ``key`` is queued or running."""
+    with _cond:
+        return key in _queued or _running == key
+
+
+def poll() -> list[tuple[str, bool, str]]:
+    """Return ``(key, ok, error)`` for actions finished since the last poll."""
+    with _cond:
+        results = _results[:]
+        _results.clear()
+    return results
+
+
+def wait_idle(timeout: float | None = None) -> bool:
+    """Block until every queued action has finished (for tests and exit)."""
+    with _cond:
+        return _cond.wait_for(lambda: not _queued and _running is None, timeout)
+
+
+def _ensure_started() -> None:
+    global _thread
+    with _cond:
+        if _thread is None:
+            _thread = threading.Thread(target=_worker, daemon=True)
+            _thread.start()
+
+
+def _worker() -> None:
+    global _running
+    while True:
+        with _cond:
+            _cond.wait_for(lambda: _order)
+            key = _order.popleft()
+            fn, args, on_done = _queued.pop(key)
+            _running = key
+        try:
+            fn(*args)
+            ok, error = True, ""
+        except Exception as exc:
+            ok, error = False, str(exc) or type(exc).__name__
+            logger.warning(f"Action {key} failed: {error}")
+        if on_done is not None:
+            try:
+                on_done(ok, error)
+            except Exception:
+                logger.exception(f"Completion callback for {key} failed")
+        with _cond:
+            _running = None
+            _results.append((key, ok, error))
+            # Only the UI polls results; keep the backlog bounded if it
+            # is not looking
+            del _results[:-50]
+            _cond.notify_all()
@@ -1,6 +1,7 @@
 import pygame
 import random
 import logging
+import savestate
 from dataclasses import dataclass, field
 from typing import Optional
 
@@ -464,6 +465,26 @@ def start_wild_battle(
         clock.tick(60)
 
 
+def _save_state():
+    return {
+        "player_hp": player_hp,
+        "enemy_hp": enemy_hp,
+        "message": message,
+        "battle_over": battle_over,
+    }
+
+
+def _load_state(data):
+    global player_hp, enemy_hp, message, battle_over
+    player_hp = data.get("player_hp", PLAYER_MAX_HP)
+    enemy_hp = data.get("enemy_hp", ENEMY_MAX_HP)
+    message = data.get("message", "")
+    battle_over = data.get("battle_over", False)
+
+
+savestate.register("battle", _save_state, _load_state)
+
+
 # Example integration in a main loop:
 #   player = Pokemon("Pikachu", 12, 35, 15, 10, 14,
 #                    [Move("Tackle", 35, 95, 35)], pygame.Surface((32, 32)))
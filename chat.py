@@ -1,24 +1,29 @@
 """Simple IRC chat viewer for the virtual pet demo."""
 
-import socket
-import threading
 import logging
+import os
+import threading
 import pygame
-import queue
-
-# Typing state for composing outgoing messages
-keyboard_chars = list("abcdefghijklmnopqrstuvwxyz0123456789.,!? ")
+import completion
+import events
+import irc
+import textlayout
+from chathistory import History, Message
+from chatlog import ChatLog
+from chatsearch import SearchIndex
+from utils import data_path
+
+# Typing state for composing outgoing messages.  "/", ":" and "*" are
+# there for searching ("/s from:nick word*") from the device itself.
+keyboard_chars = list("abcdefghijklmnopqrstuvwxyz0123456789.,!?/:* ")
 VISIBLE = 10
 cursor = 0
 scroll = 0
 typed_text = ""
 shift = False
 
-# Queue used by the IRC thread to send outgoing messages
-send_queue: queue.Queue[str] = queue.Queue()
-
 # Nickname used when connecting to the IRC server
-NICK = "birdie"
+NICK = os.environ.get("VIRTUALPET_IRC_NICK", "birdie")
 
 # Mapping of nicknames to unique colors for easy differentiation
 nick_colors: dict[str, tuple[int, int, int]] = {}
@@ -38,7 +43,7 @@ PALETTE = [
 
 def get_nick_color(nick: str) -> tuple[int, int, int]:
     """Return a readable colour for ``nick``."""
-    if nick == NICK:
+    if nick in (NICK, client.nick):
         # Highlight our own nick in bright cyan
         return (96, 255, 255)
     if nick not in nick_colors:
@@ -70,119 +75,143 @@ def get_chat_font():
 
 def wrap_text(text: str, font: pygame.font.Font, width: int) -> list[str]:
     """Wrap ``text`` into a list of lines no wider than ``width`` pixels."""
-    words = text.split(" ")
-    lines: list[str] = []
-    current = ""
-    for word in words:
-        candidate = word if not current else f"{current} {word}"
-        if font.size(candidate)[0] <= width:
-            # Entire candidate fits on the current line
-            current = candidate
-            continue
-
-        if current:
-            # Finalise the current line before handling the long word
-            lines.append(current)
-            current = ""
-
-        # If the word itself is too wide for a single line, split it
-        while word and font.size(word)[0] > width:
-            # Find the largest prefix that fits within width
-            end = len(word)
-            while end > 0 and font.size(word[:end])[0] > width:
-                end -= 1
-            # Safety check to avoid infinite loops if a single
-            # character somehow does not fit
-            if end == 0:
-                break
-            lines.append(word[:end])
-            word = word[end:]
-
-        current = word
-
-    if current:
-        lines.append(current)
-
-    return lines
-
-chat_lines = []
+    return textlayout.wrap(text, font, width)
+
+# Messages received and sent, shared with the web remote
+history = History()
+# On-disk log of every message, opened by init_chat.  Messages older than
+# ``history`` are paged in from it when scrolling back.
+chatlog: ChatLog | None = None
+# Word index over the history and log for searching
+search_index = SearchIndex()
+# Logged messages read at a time while catching the index up
+INDEX_BATCH = 1024
+_record_lock = threading.Lock()
 _init = False
-_thread = None
 
 logger = logging.getLogger(__name__)
 
-
-def _irc_thread(server: str, port: int, channel: str, nick: str) -> None:
-    """Background worker that receives messages from the IRC server."""
-
-    def send(msg: str) -> None:
-        sock.sendall(msg.encode("utf-8"))
-
-    try:
-        sock = socket.socket()
-        sock.connect((server, port))
-        logger.debug(f"Connected to {server}:{port}, joining {channel} as {nick}")
-        send(f"NICK {nick}\r\n")
-        send(f"USER {nick} 0 * :{nick}\r\n")
-        send(f"JOIN {channel}\r\n")
-
-        buffer = ""
-        sock.settimeout(0.1)
-        while True:
-            # Send any queued outgoing messages
+# IRC server and channel the chat screen joins
+SERVER = os.environ.get("VIRTUALPET_IRC_SERVER", "192.168.0.81")
+PORT = int(os.environ.get("VIRTUALPET_IRC_PORT", "6667"))
+CHANNEL = os.environ.get("VIRTUALPET_IRC_CHANNEL", "#pet")
+
+
+def record(user: str, msg: str, ts: float | None = None) -> Message:
+    """Add a message to the history and the on-disk log."""
+    with _record_lock:
+        message = history.append(user, msg, ts)
+        search_index.add(message)
+        events.hub.publish("chat", {
+            "seq": message.seq, "user": message.user, "msg": message.msg, "ts": message.ts,
+        })
+        if chatlog is not None:
             try:
-                while True:
-                    out = send_queue.get_nowait()
-                    send(f"PRIVMSG {channel} :{out}\r\n")
-            except queue.Empty:
-                pass
-
-            try:
-                data = sock.recv(4096).decode("utf-8", "ignore")
-                if not data:
-                    break
-            except socket.timeout:
-                data = ""
-            buffer += data
-            while "\r\n" in buffer:
-                line, buffer = buffer.split("\r\n", 1)
-                if line.startswith("PING"):
-                    send(f"PONG {line.split()[1]}\r\n")
-                    continue
-                parts = line.split(" ", 3)
-                if len(parts) >= 4 and parts[1] == "PRIVMSG":
-                    user = parts[0].split("!")[0][1:]
-                    msg = parts[3][1:]
-                    chat_lines.append({"user": user, "msg": msg})
-                    if len(chat_lines) > 100:
-                        chat_lines.pop(0)
-    except Exception as exc:  # pragma: no cover - runtime errors shown onscreen
-        error_msg = f"IRC connection error: {exc}"
-        print(error_msg)
-        logger.exception(error_msg)
-        chat_lines.append({"user": "error", "msg": str(exc)})
+                chatlog.append(message)
+            except OSError as exc:
+                logger.warning(f"Failed to write chat log: {exc}")
+    return message
+
+
+client = irc.IrcClient(
+    SERVER,
+    PORT,
+    CHANNEL,
+    NICK,
+    on_message=record,
+    on_status=lambda text: record("*", text),
+)
+
+
+def _open_log() -> None:
+    """Open the chat log and continue its sequence.
+
+    The newest logged messages are loaded back into ``history`` so the
+    chat screen shows them after a restart.  The saved search index is
+    loaded and caught up with the log on a background thread; until then
+    searches only cover messages received since the log was opened.
+    """
+    global history, chatlog, search_index
+    try:
+        log = ChatLog(data_path("chatlog"))
+    except OSError as exc:
+        logger.warning(f"Chat log unavailable: {exc}")
+        return
+    with _record_lock:
+        earlier = history.snapshot()
+        last = log.last_seq
+        start = max(log.first_seq, last + 1 - history.size)
+        tail = log.range(start, last + 1)
+        if len(tail) != last + 1 - start:
+            # A gap in the log; start the history empty instead
+            tail = []
+        restored = History(history.size, start_seq=last + 1 - len(tail))
+        for message in tail:
+            restored.append(message.user, message.msg, message.ts)
+        history = restored
+        chatlog = log
+        # Messages received before now are renumbered, so the live index
+        # starts again with them
+        search_index = SearchIndex()
+        for message in earlier:
+            message = history.append(message.user, message.msg, message.ts)
+            log.append(message)
+            search_index.add(message)
+    threading.Thread(target=_load_index, args=(log,), name="chatsearch", daemon=True).start()
+
+
+def _load_index(log: ChatLog) -> None:
+    """Load the saved search index, index what was logged since, and use it."""
+    global search_index
+    index = SearchIndex(data_path("chatlog/search.idx"))
+    if index.last_seq > log.last_seq:
+        # The log was cleared but the index was not
+        index.clear()
+    index.prune(log.first_seq)
+    seq = max(index.last_seq + 1, log.first_seq)
+    while True:
+        with _record_lock:
+            last = log.last_seq
+            if seq > last:
+                # Caught up; record() adds anything newer from here on
+                search_index = index
+                return
+        # Index in batches so record() is not kept waiting on the log
+        stop = min(seq + INDEX_BATCH, last + 1)
+        for message in log.range(seq, stop):
+            index.add(message)
+        seq = stop
+
+
+def search(query: str, nick: str | None = None, limit: int = 50) -> list[Message]:
+    """Return messages matching ``query`` (and from ``nick``), newest first.
+
+    See ``chatsearch`` for the query syntax.
+    """
+    found = []
+    first = history.first_seq
+    recent = {message.seq: message for message in history.since(first - 1)}
+    for seq in search_index.search(query, nick=nick, limit=limit):
+        message = recent.get(seq) if seq >= first else None
+        if message is None and chatlog is not None:
+            message = chatlog.get(seq)
+        if message is not None:
+            found.append(message)
+    return found
 
 
 def init_chat() -> None:
-    """Start the IRC background thread with preset connection details."""
+    """Connect to the IRC server in the background."""
 
-    global _init, _thread
+    global _init
     if _init:
         return
 
-    server = "192.168.0.81"
-    port = 6667
-    channel = "#pet"
-    nick = NICK
-
-    logger.debug(
-        f"Starting IRC thread for {server}:{port} {channel} as {nick}"
-    )
-
-    _thread = threading.Thread(
-        target=_irc_thread, args=(server, port, channel, nick), daemon=True
-    )
-    _thread.start()
+    _open_log()
+    for message in history.snapshot():
+        completion.learn(message.msg)
+    logger.debug(f"Starting IRC client for {SERVER}:{PORT} {CHANNEL} as {NICK}")
+    client.start()
     _init = True
 
 
@@ -193,17 +222,43 @@ def update_chat(_lines, _now):
 def send_chat_message(message: str) -> None:
     """Queue an outgoing chat message to be sent to the IRC server."""
     if message:
-        send_queue.put(message)
+        client.send(message)
+        completion.learn(message)
         # Immediately display our own message locally so it shows up
-        chat_lines.append({"user": NICK, "msg": message})
-        if len(chat_lines) > 100:
-            chat_lines.pop(0)
+        record(client.nick, message)
+
+
+# Search results shown instead of the chat while ``search_query`` is set.
+# Typing "/s words" and RETURN searches, RETURN on an empty line goes back.
+search_query = ""
+search_results: list[Message] = []
+search_scroll = 0
+_search_lines: list[list] | None = None
+
+
+def show_search(query: str) -> None:
+    """Search the chat and show the results, or go back if ``query`` is empty."""
+    global search_query, search_results, search_scroll, _search_lines
+    search_query = query.strip()
+    search_results = search(search_query) if search_query else []
+    search_scroll = 0
+    _search_lines = None
 
 
 def handle_chat_event(event) -> None:
     """Handle key events for composing and sending chat messages."""
-    global cursor, scroll, typed_text, shift
-    if event.key == pygame.K_LEFT:
+    global cursor, scroll, typed_text, shift, view_scroll, search_scroll
+    if event.key == pygame.K_PAGEUP:
+        if search_query:
+            search_scroll = max(0, search_scroll - (MAX_VISIBLE - 1))
+        else:
+            view_scroll += MAX_VISIBLE
+    elif event.key == pygame.K_PAGEDOWN:
+        if search_query:
+            search_scroll += MAX_VISIBLE - 1
+        else:
+            view_scroll -= MAX_VISIBLE
+    elif event.key == pygame.K_LEFT:
         cursor = (cursor - 1) % len(keyboard_chars)
     elif event.key == pygame.K_RIGHT:
         cursor = (cursor + 1) % len(keyboard_chars)
@@ -219,65 +274,254 @@ def handle_chat_event(event) -> None:
         typed_text = typed_text[:-1]
     elif event.key == pygame.K_TAB:
         shift = not shift
+    elif event.key == pygame.K_SPACE:
+        typed_text = completion.accept(typed_text)[-200:]
     elif event.key == pygame.K_RETURN:
-        send_chat_message(typed_text)
+        if typed_text.startswith("/s "):
+            show_search(typed_text[3:])
+        elif not typed_text and search_query:
+            show_search("")
+        else:
+            send_chat_message(typed_text)
         typed_text = ""
 
     if cursor < scroll:
         scroll = cursor
     elif cursor >= scroll + VISIBLE:
         scroll = cursor - VISIBLE + 1
-def draw_chat(screen, FONT, chat_lines, chat_scroll):
-    """Render the received IRC messages with coloured nicknames."""
+
+
+# Wrapped layout of a window of consecutive messages.  While the window
+# is "live" it ends with the newest message and new arrivals are appended
+# as they come in.  Scrolling back pages older messages in from the
+# history or the chat log, and the window is trimmed to RESIDENT_LINES so
+# deep scrollback does not keep everything in memory.
+_layout_key: tuple | None = None
+_layout_seqs: list[int] = []  # sequence numbers laid out, oldest first
+_layout_counts: list[int] = []  # number of wrapped lines for each message
+_layout_lines: list[list] = []  # [prefix, text, prefix colour, text colour, surface]
+_layout_live = True
+
+# Lines scrolled up from the newest message (PGUP/PGDN)
+view_scroll = 0
+# Messages loaded at a time when scrolling past the window
+PAGE_MESSAGES = 20
+RESIDENT_LINES = 200
+
+
+def _layout_message(message, font, max_width: int) -> list[list]:
+    """Return the wrapped display lines for one chat ``message``."""
+    prefix = f"{message.user}> "
+    prefix_width = font.size(prefix)[0]
+    parts = wrap_text(message.msg, font, max_width - prefix_width) or [""]
+    prefix_color = get_nick_color(message.user)
+    text_color = (96, 255, 255) if message.user in (NICK, client.nick) else (255, 255, 255)
+    # Wrapped lines start underneath the nickname rather than aligning
+    # with the text from the previous line
+    lines = [[prefix, parts[0], prefix_color, text_color, None]]
+    lines.extend(["", part, prefix_color, text_color, None] for part in parts[1:])
+    return lines
+
+
+def _fetch(messages: History, start: int, stop: int) -> list:
+    """Return messages ``start <= seq < stop`` from the history or log."""
+    first = messages.first_seq
+    older = []
+    if start < first and chatlog is not None:
+        older = chatlog.range(start, min(stop, first))
+    newer = [m for m in messages.since(max(start, first) - 1) if m.seq < stop]
+    return older + newer
+
+
+def _clear_layout() -> None:
+    global _layout_live
+    _layout_seqs.clear()
+    _layout_counts.clear()
+    _layout_lines.clear()
+    _layout_live = True
+
+
+def _drop_front(count: int) -> int:
+    """Forget the ``count`` oldest laid out messages; return lines dropped."""
+    lines = sum(_layout_counts[:count])
+    del _layout_lines[:lines]
+    del _layout_seqs[:count]
+    del _layout_counts[:count]
+    return lines
+
+
+def _drop_back(count: int) -> int:
+    """Forget the ``count`` newest laid out messages; return lines dropped."""
+    global _layout_live
+    lines = sum(_layout_counts[len(_layout_counts) - count:])
+    del _layout_lines[len(_layout_lines) - lines:]
+    del _layout_seqs[len(_layout_seqs) - count:]
+    del _layout_counts[len(_layout_counts) - count:]
+    _layout_live = False
+    return lines
+
+
+def _append(batch: list, font, max_width: int) -> int:
+    added = 0
+    for message in batch:
+        lines = _layout_message(message, font, max_width)
+        _layout_seqs.append(message.seq)
+        _layout_counts.append(len(lines))
+        _layout_lines.extend(lines)
+        added += len(lines)
+    return added
+
+
+def _extend_older(messages: History, font, max_width: int) -> int:
+    """Lay out a page of messages before the window; return lines added."""
+    before = _layout_seqs[0] if _layout_seqs else messages.last_seq + 1
+    batch = _fetch(messages, max(1, before - PAGE_MESSAGES), before)
+    seqs, counts, lines = [], [], []
+    for message in batch:
+        laid_out = _layout_message(message, font, max_width)
+        seqs.append(message.seq)
+        counts.append(len(laid_out))
+        lines.extend(laid_out)
+    _layout_seqs[:0] = seqs
+    _layout_counts[:0] = counts
+    _layout_lines[:0] = lines
+    return len(lines)
+
+
+def _extend_newer(messages: History, font, max_width: int) -> int:
+    """Lay out a page of messages after a window that is not live."""
+    global _layout_live
+    after = _layout_seqs[-1] if _layout_seqs else 0
+    batch = _fetch(messages, after + 1, after + 1 + PAGE_MESSAGES)
+    added = _append(batch, font, max_width)
+    if not batch or batch[-1].seq >= messages.last_seq:
+        _layout_live = True
+    return added
+
+
+def _sync_layout(messages: History, font, max_width: int) -> None:
+    """Bring the laid out window in line with ``messages`` and the view."""
+    global _layout_key, _tip_surf, view_scroll
+    key = (id(messages), id(font), max_width)
+    if key != _layout_key:
+        _layout_key = key
+        _tip_surf = None
+        _clear_layout()
+
+    if _layout_live:
+        first = messages.first_seq
+        after = _layout_seqs[-1] if _layout_seqs else first - 1
+        if view_scroll <= 0:
+            # At the bottom only the in-memory history is kept laid out
+            # (plus whatever older lines are needed to fill the screen)
+            after = max(after, first - 1)
+            remaining = len(_layout_lines)
+            drop = 0
+            while (
+                drop < len(_layout_seqs)
+                and _layout_seqs[drop] < first
+                and remaining - _layout_counts[drop] >= MAX_VISIBLE
+            ):
+                remaining -= _layout_counts[drop]
+                drop += 1
+            if drop:
+                _drop_front(drop)
+            if messages.last_seq - after > PAGE_MESSAGES:
+                # A burst arrived since the last frame; only lay out the
+                # newest page and let scrolling back page the rest in
+                _clear_layout()
+                after = messages.last_seq - PAGE_MESSAGES
+        _append(_fetch(messages, after + 1, messages.last_seq + 1), font, max_width)
+
+    # Page in older messages until the view is filled
+    while len(_layout_lines) - MAX_VISIBLE - view_scroll < 0:
+        if not _extend_older(messages, font, max_width):
+            view_scroll = max(0, len(_layout_lines) - MAX_VISIBLE)
+            break
+    # Scrolling down past a window that no longer ends at the newest
+    # message pages the newer messages back in below it
+    while view_scroll < 0 and not _layout_live:
+        view_scroll += _extend_newer(messages, font, max_width)
+    view_scroll = max(0, view_scroll)
+
+    # Keep the window small by dropping messages on the far side of the view
+    while len(_layout_lines) > RESIDENT_LINES and len(_layout_seqs) > 1:
+        above = len(_layout_lines) - MAX_VISIBLE - view_scroll
+        if above > view_scroll:
+            if above - _layout_counts[0] < 0:
+                break
+            _drop_front(1)
+        else:
+            if view_scroll - _layout_counts[-1] < 0:
+                break
+            view_scroll -= _drop_back(1)
+
+
+def _line_surface(line: list, font):
+    """Return the cached surface for a wrapped display ``line``."""
+    if line[4] is None:
+        prefix, text, prefix_color, text_color, _ = line
+        text_surf = font.render(text, True, text_color)
+        if prefix:
+            pref_surf = font.render(prefix, True, prefix_color)
+            width = pref_surf.get_width() + text_surf.get_width()
+            height = max(pref_surf.get_height(), text_surf.get_height())
+            surf = pygame.Surface((width, height), pygame.SRCALPHA)
+            surf.blit(pref_surf, (0, 0))
+            surf.blit(text_surf, (pref_surf.get_width(), 0))
+        else:
+            surf = text_surf
+        line[4] = surf
+    return line[4]
+
+
+_TIP_TEXT = "ARROWS Type TAB=Shift SPC=Word RET=Send ESC=Back PGUP/DN=Scroll /s=Search"
+_tip_surf = None
+
+
+def _draw_search(screen, font, max_width: int) -> None:
+    """Draw the search header and a page of results, newest first."""
+    global _search_lines, search_scroll
+    if _search_lines is None:
+        _search_lines = [
+            line for message in search_results
+            for line in _layout_message(message, font, max_width)
+        ]
+    visible = MAX_VISIBLE - 1
+    search_scroll = min(search_scroll, max(0, len(_search_lines) - visible))
+    header = ["", f"Found {len(search_results)} for '{search_query}'",
+              (255, 255, 0), (255, 255, 0), None]
+    rows = [header] + _search_lines[search_scroll:search_scroll + visible]
+    for i, line in enumerate(rows):
+        screen.blit(_line_surface(line, font), (6, 15 + i * LINE_HEIGHT))
+
+
+def draw_chat(screen, FONT, messages: History | None = None):
+    """Render chat ``messages`` (the IRC history) with coloured nicknames."""
+    global _tip_surf
 
     font = get_chat_font()
     screen.fill((0, 0, 0))
 
     max_width = screen.get_width() - 12
-
-    # Expand stored messages into individual wrapped lines with colour info
-    rendered_lines: list[
-        tuple[str, str, tuple[int, int, int], tuple[int, int, int], int]
-    ] = []
-    for chat in chat_lines:
-        prefix = f"{chat['user']}> "
-        prefix_width = font.size(prefix)[0]
-        parts = wrap_text(chat["msg"], font, max_width - prefix_width)
-        if not parts:
-            parts = [""]
-        prefix_color = get_nick_color(chat["user"])
-        text_color = (96, 255, 255) if chat["user"] == NICK else (255, 255, 255)
-        for idx, part in enumerate(parts):
-            if idx == 0:
-                rendered_lines.append(
-                    (prefix, part, prefix_color, text_color, 6)
-                )
-            else:
-                # Start wrapped lines underneath the nickname rather than
-                # aligning with the text from the previous line
-                rendered_lines.append(
-                    ("", part, prefix_color, text_color, 6)
-                )
-
-    start = max(0, len(rendered_lines) - MAX_VISIBLE - chat_scroll)
-    end = max(0, len(rendered_lines) - chat_scroll)
-    visible = rendered_lines[start:end]
-
-    for i, (pref, text, pref_c, txt_c, x) in enumerate(visible):
-        y = 15 + i * LINE_HEIGHT
-        if pref:
-            pref_surf = font.render(pref, True, pref_c)
-            screen.blit(pref_surf, (x, y))
-            msg_surf = font.render(text, True, txt_c)
-            screen.blit(msg_surf, (x + font.size(pref)[0], y))
-        else:
-            msg_surf = font.render(text, True, txt_c)
-            screen.blit(msg_surf, (x, y))
+    if search_query:
+        _draw_search(screen, font, max_width)
+    else:
+        _sync_layout(history if messages is None else messages, font, max_width)
+        start = max(0, len(_layout_lines) - MAX_VISIBLE - view_scroll)
+        end = max(0, len(_layout_lines) - view_scroll)
+        for i, line in enumerate(_layout_lines[start:end]):
+            screen.blit(_line_surface(line, font), (6, 15 + i * LINE_HEIGHT))
 
     # Draw the current input line at the bottom
     input_display = typed_text[-16:]
     msg = font.render(f"> {input_display}", True, (255, 255, 255))
     screen.blit(msg, (6, 108))
+    # Show the best completion greyed out after the cursor (SPACE accepts)
+    options = completion.complete(typed_text, 1)
+    if options and options[0]:
+        ghost = font.render(options[0], True, (120, 120, 120))
+        screen.blit(ghost, (6 + msg.get_width(), 108))
 
     # Display on-screen keyboard similar to the typing mini-game
     start_k = scroll
@@ -290,9 +534,6 @@ def draw_chat(screen, FONT, chat_lines, chat_scroll):
         x = 6 + i * 12
         screen.blit(text, (x, 88))
 
-    tip = font.render(
-        "ARROWS Type TAB=Shift RET=Send ESC=Back PGUP/DN=Scroll",
-        True,
-        (255, 255, 255),
-    )
-    screen.blit(tip, (2, 2))
+    if _tip_surf is None:
+        _tip_surf = font.render(_TIP_TEXT, True, (255, 255, 255))
+    screen.blit(_tip_surf, (2, 2))
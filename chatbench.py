@@ -0,0 +1,136 @@
+"""Measure the chat path under a flood from a local ``fakeirc`` server.
+
+Starts a flooding fake IRC server, connects the real chat client to it
+and runs a headless chat screen at the normal frame rate, reporting how
+many messages per second reach the history, how long each one takes
+from the server to a drawn frame, and how long frames take::
+
+    python3 chatbench.py --rate 2000 --size 200 --nicks 50 --duration 10
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+# Run pygame without a display or sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+# Keep the chat log out of the working directory
+os.environ.setdefault("VIRTUALPET_DATA_DIR", tempfile.mkdtemp(prefix="chatbench-"))
+
+import pygame
+from fakeirc import FakeIrcServer
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(server: FakeIrcServer, duration: float, fps: float) -> dict:
+    """Draw the chat screen for ``duration`` seconds while ``server`` floods."""
+    import chat
+
+    screen = pygame.Surface((128, 128))
+    chat.init_chat()
+    deadline = time.monotonic() + 10
+    while not chat.client.connected:
+        if time.monotonic() > deadline:
+            raise SystemExit(f"Could not connect to fakeirc on port {server.port}")
+        time.sleep(0.01)
+
+    frame_budget = 1.0 / fps if fps > 0 else 0.0
+    frame_times: list[float] = []
+    latencies: list[float] = []
+    seen_seq = chat.history.last_seq
+    first_seq = seen_seq
+    shown = 0
+    skipped = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        frame_start = time.perf_counter()
+        arrived = chat.history.since(seen_seq)
+        if arrived:
+            seen_seq = arrived[-1].seq
+        chat.draw_chat(screen, None)
+        drawn_ns = time.time_ns()
+        frame_times.append(time.perf_counter() - frame_start)
+        # A burst can be cleared before it is laid out; only messages the
+        # screen actually laid out count as shown
+        laid_out = set(chat._layout_seqs)
+        for message in arrived:
+            fields = message.msg.split(" ", 2)
+            if message.user.startswith("user") and len(fields) >= 2 and fields[1].isdigit():
+                if message.seq in laid_out:
+                    latencies.append((drawn_ns - int(fields[1])) / 1e6)
+                    shown += 1
+                else:
+                    skipped += 1
+        delay = frame_budget - (time.perf_counter() - frame_start)
+        if delay > 0:
+            time.sleep(delay)
+    elapsed = time.perf_counter() - start
+    ingested = chat.history.last_seq - first_seq
+    chat.client.stop()
+    return {
+        "elapsed": elapsed,
+        "sent": server.sent,
+        "ingested": ingested,
+        "shown": shown,
+        "skipped": skipped,
+        "frames": len(frame_times),
+        "frame_times": frame_times,
+        "latencies": latencies,
+        "budget": frame_budget,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=float, default=500.0,
+                        help="flood messages per second")
+    parser.add_argument("--size", type=int, default=120,
+                        help="approximate message length")
+    parser.add_argument("--nicks", type=int, default=20,
+                        help="distinct flooding nicknames")
+    parser.add_argument("--duration", type=float, default=5.0,
+                        help="seconds to measure")
+    parser.add_argument("--fps", type=float, default=30.0,
+                        help="chat screen frame rate (0 = as fast as possible)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = FakeIrcServer(rate=args.rate, size=args.size, nicks=args.nicks, seed=args.seed)
+    server.start()
+    os.environ["VIRTUALPET_IRC_SERVER"] = server.address[0]
+    os.environ["VIRTUALPET_IRC_PORT"] = str(server.port)
+    pygame.init()
+    try:
+        result = run(server, args.duration, args.fps)
+    finally:
+        server.stop()
+
+    elapsed = result["elapsed"]
+    frames = result["frame_times"]
+    latencies = result["latencies"]
+    slow = sum(1 for t in frames if result["budget"] and t > result["budget"])
+    print(f"flood {args.rate:g} msg/s x {args.size} bytes from {args.nicks} nicks "
+          f"for {elapsed:.1f}s")
+    print(f"sent {result['sent']}, ingested {result['ingested']} "
+          f"({result['ingested'] / elapsed:,.0f} msg/s), "
+          f"laid out by the screen {result['shown']}, "
+          f"skipped in bursts {result['skipped']}")
+    print(f"message to screen latency ms: p50 {_percentile(latencies, 0.5):.1f} "
+          f"p95 {_percentile(latencies, 0.95):.1f} p99 {_percentile(latencies, 0.99):.1f} "
+          f"max {max(latencies, default=0.0):.1f}")
+    print(f"frame time ms over {result['frames']} frames: "
+          f"p50 {_percentile(frames, 0.5) * 1000:.2f} "
+          f"p99 {_percentile(frames, 0.99) * 1000:.2f} "
+          f"max {max(frames, default=0.0) * 1000:.2f}, {slow} over budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Bounded chat history shared by the IRC thread, the UI and the web remote.
+
+Messages are stored in a fixed-size ring buffer, so appending never
+shifts the older entries, and each message gets a sequence number that
+only ever increases.  Readers ask for everything after the last sequence
+number they saw with :meth:`History.since` and get a consistent list even
+while the IRC thread keeps appending.
+"""
+
+import os
+import threading
+import time
+
+# Messages kept by default; override with VIRTUALPET_CHAT_HISTORY
+HISTORY_SIZE = int(os.environ.get("VIRTUALPET_CHAT_HISTORY", "100"))
+
+
+class Message:
+    """One chat message."""
+
+    __slots__ = ("seq", "user", "msg", "ts")
+
+    def __init__(self, seq: int, user: str, msg: str, ts: float) -> None:
+        self.seq = seq
+        self.user = user
+        self.msg = msg
+        self.ts = ts
+
+    def __repr__(self) -> str:
+        return f"Message({self.seq}, {self.user!r}, {self.msg!r})"
+
+
+class History:
+    """Thread-safe ring buffer of the last ``size`` messages."""
+
+    def __init__(self, size: int = HISTORY_SIZE, start_seq: int = 1) -> None:
+        if size < 1:
+            raise ValueError("History size must be at least 1")
+        self.size = size
+        self._slots: list[Message | None] = [None] * size
+        self._next_seq = start_seq
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def append(self, user: str, msg: str, ts: float | None = None) -> Message:
+        """Add a message, dropping the oldest one when full."""
+        with self._lock:
+            message = Message(self._next_seq, user, msg, time.time() if ts is None else ts)
+            self._slots[self._next_seq % self.size] = message
+            self._next_seq += 1
+            if self._count < self.size:
+                self._count += 1
+        return message
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the newest message, 0 if none were added."""
+        return self._next_seq - 1
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest message still kept."""
+        with self._lock:
+            return self._next_seq - self._count
+
+    def since(self, seq: int) -> list[Message]:
+        """Return the kept messages newer than ``seq``, oldest first."""
+        with self._lock:
+            start = max(seq + 1, self._next_seq - self._count)
+            slots, size = self._slots, self.size
+            return [slots[s % size] for s in range(start, self._next_seq)]
+
+    def last(self, count: int) -> list[Message]:
+        """Return up to ``count`` of the newest messages, oldest first."""
+        with self._lock:
+            start = self._next_seq - min(count, self._count)
+            slots, size = self._slots, self.size
+            return [slots[s % size] for s in range(start, self._next_seq)]
+
+    def snapshot(self) -> list[Message]:
+        """Return every kept message, oldest first."""
+        return self.since(0)
+
+    def clear(self) -> None:
+        """Forget all messages; sequence numbers keep counting up."""
+        with self._lock:
+            self._slots = [None] * self.size
+            self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
@@ -0,0 +1,196 @@
+"""Append-only on-disk chat log for scrolling back past the in-memory history.
+
+Messages are appended to segment files named after the sequence number
+of their first message.  Each ``.log`` file holds the records back to
+back::
+
+    f64 timestamp  u16 nick length  u32 text length  nick  text
+
+and the matching ``.idx`` file is a fixed-size array of u32 record end
+offsets, memory-mapped so looking up any message is two array reads and
+one ``pread``.  Once a segment is full a new one is started, and the
+oldest segments are deleted beyond MAX_SEGMENTS.
+
+A record is written to the log before its index entry, so after a crash
+an index entry pointing past the end of the log, or log bytes with no
+index entry, are simply dropped when the segment is opened again.
+"""
+
+import bisect
+import logging
+import mmap
+import os
+import struct
+import threading
+from chathistory import Message
+
+logger = logging.getLogger(__name__)
+
+# Start a new segment after this many bytes or messages
+SEGMENT_BYTES = 1 << 20
+SEGMENT_ENTRIES = 16384
+# Oldest segments beyond this many are deleted
+MAX_SEGMENTS = 32
+
+RECORD = struct.Struct("<dHI")
+_INDEX_BYTES = SEGMENT_ENTRIES * 4
+
+
+class _Segment:
+    """One ``.log`` file and its memory-mapped ``.idx`` file."""
+
+    def __init__(self, directory: str, first_seq: int) -> None:
+        self.first_seq = first_seq
+        self.base = os.path.join(directory, f"{first_seq:012d}")
+        self._log = os.open(self.base + ".log", os.O_RDWR | os.O_CREAT, 0o644)
+        self._index_fd = os.open(self.base + ".idx", os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._index_fd).st_size < _INDEX_BYTES:
+            os.ftruncate(self._index_fd, _INDEX_BYTES)
+        self._map = mmap.mmap(self._index_fd, _INDEX_BYTES)
+        self._ends = memoryview(self._map).cast("I")
+
+        # End offsets only grow, so the used entries are the non-zero
+        # prefix of the index
+        ends = self._ends
+        lo, hi = 0, SEGMENT_ENTRIES
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ends[mid]:
+                lo = mid + 1
+            else:
+                hi = mid
+        count = lo
+        size = os.fstat(self._log).st_size
+        while count and ends[count - 1] > size:
+            count -= 1
+            ends[count] = 0
+        valid = ends[count - 1] if count else 0
+        if size > valid:
+            logger.warning(f"Dropping {size - valid} unindexed bytes from {self.base}.log")
+            os.ftruncate(self._log, valid)
+        self.count = count
+        self.size = valid
+
+    def full(self, max_bytes: int) -> bool:
+        return self.count >= SEGMENT_ENTRIES or self.size >= max_bytes
+
+    def append(self, user: str, msg: str, ts: float) -> None:
+        raw_user = user.encode("utf-8")[:0xFFFF]
+        raw_msg = msg.encode("utf-8")
+        data = RECORD.pack(ts, len(raw_user), len(raw_msg)) + raw_user + raw_msg
+        os.pwrite(self._log, data, self.size)
+        self.size += len(data)
+        self._ends[self.count] = self.size
+        self.count += 1
+
+    def read(self, index: int) -> tuple[str, str, float]:
+        start = self._ends[index - 1] if index else 0
+        data = os.pread(self._log, self._ends[index] - start, start)
+        ts, user_len, msg_len = RECORD.unpack_from(data)
+        offset = RECORD.size
+        user = data[offset:offset + user_len].decode("utf-8", "replace")
+        offset += user_len
+        return user, data[offset:offset + msg_len].decode("utf-8", "replace"), ts
+
+    def close(self) -> None:
+        self._ends.release()
+        self._map.close()
+        os.close(self._index_fd)
+        os.close(self._log)
+
+    def delete(self) -> None:
+        self.close()
+        for suffix in (".log", ".idx"):
+            try:
+                os.remove(self.base + suffix)
+            except FileNotFoundError:
+                pass
+
+
+class ChatLog:
+    """Persistent, append-only sequence of chat messages."""
+
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES,
+                 max_segments: int = MAX_SEGMENTS) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._segments: list[_Segment] = []
+        for name in sorted(os.listdir(directory)):
+            stem, ext = os.path.splitext(name)
+            if ext == ".log" and stem.isdigit():
+                self._segments.append(_Segment(directory, int(stem)))
+        self._firsts = [segment.first_seq for segment in self._segments]
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest stored message."""
+        with self._lock:
+            return self._segments[0].first_seq if self._segments else 1
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the newest stored message, 0 if empty."""
+        with self._lock:
+            if not self._segments:
+                return 0
+            last = self._segments[-1]
+            return last.first_seq + last.count - 1
+
+    def append(self, message: Message) -> bool:
+        """Store ``message``; returns ``False`` if its ``seq`` is not new."""
+        with self._lock:
+            segment = self._segments[-1] if self._segments else None
+            next_seq = segment.first_seq + segment.count if segment else 1
+            if message.seq < next_seq:
+                logger.warning(f"Ignoring chat message {message.seq}, log is at {next_seq}")
+                return False
+            if segment is None or message.seq != next_seq or segment.full(self.segment_bytes):
+                segment = _Segment(self.directory, message.seq)
+                self._segments.append(segment)
+                self._firsts.append(segment.first_seq)
+                while len(self._segments) > self.max_segments:
+                    self._segments.pop(0).delete()
+                    self._firsts.pop(0)
+            segment.append(message.user, message.msg, message.ts)
+            return True
+
+    def _locate(self, seq: int) -> tuple[_Segment, int] | None:
+        pos = bisect.bisect_right(self._firsts, seq) - 1
+        if pos < 0:
+            return None
+        segment = self._segments[pos]
+        index = seq - segment.first_seq
+        if index >= segment.count:
+            return None
+        return segment, index
+
+    def get(self, seq: int) -> Message | None:
+        """Return message ``seq``, or ``None`` if it is not stored."""
+        with self._lock:
+            found = self._locate(seq)
+            if found is None:
+                return None
+            segment, index = found
+            return Message(seq, *segment.read(index))
+
+    def range(self, start: int, stop: int) -> list[Message]:
+        """Return the stored messages with ``start <= seq < stop``."""
+        messages = []
+        with self._lock:
+            for seq in range(max(start, 1), stop):
+                found = self._locate(seq)
+                if found is not None:
+                    segment, index = found
+                    messages.append(Message(seq, *segment.read(index)))
+        return messages
+
+    def close(self) -> None:
+        with self._lock:
+            for segment in self._segments:
+                segment.close()
+            self._segments.clear()
+            self._firsts.clear()
+
@@ -0,0 +1,205 @@
+"""Full-text search over the chat history.
+
+:class:`SearchIndex` maps every lower-cased word to the sequence numbers
+of the messages containing it, and every nick to the messages it sent.
+Messages are added as they arrive, so a query only touches the posting
+lists of its words instead of scanning the messages.
+
+Queries are words that must all appear; a word ending in ``*`` matches
+any word starting with it, and ``from:nick`` keeps only messages from
+``nick``.  The index is saved next to the chat log at most every
+``delay`` seconds while messages arrive, and brought up to date from the
+log when it is loaded.  A file that cannot be read (damaged, or from an
+older format) is ignored and the index is rebuilt from the log.
+
+File layout (little endian)::
+
+    b"VPSI"  u16 FORMAT_VERSION  u32 last_seq  u32 words  u32 nicks
+    per word, then per nick: u16 length, token (utf-8), u32 count,
+    count x u32 sequence numbers
+"""
+
+import array
+import atexit
+import bisect
+import logging
+import re
+import struct
+import sys
+import threading
+from utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"VPSI"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sHIII")
+ENTRY = struct.Struct("<HI")
+_WORD = re.compile(r"\w+")
+# Postings are stored little endian whatever the machine
+_SWAP = sys.byteorder != "little"
+
+
+def tokenize(text: str) -> set[str]:
+    """Return the distinct lower-cased words in ``text``."""
+    return set(_WORD.findall(text.lower()))
+
+
+class SearchIndex:
+    """Inverted index from words and nicks to message sequence numbers."""
+
+    def __init__(self, path: str | None = None, delay: float = 30.0) -> None:
+        self.path = path
+        self.delay = delay
+        self.last_seq = 0
+        self._words: dict[str, array.array] = {}
+        self._nicks: dict[str, array.array] = {}
+        self._sorted_words: list[str] = []
+        self._lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        if path is not None:
+            self._load()
+            atexit.register(self.flush)
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "rb") as fh:
+                data = fh.read()
+            magic, version, last_seq, words, nicks = HEADER.unpack_from(data)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"unsupported index {magic!r} v{version}")
+            offset = HEADER.size
+            for target, count in ((self._words, words), (self._nicks, nicks)):
+                for _ in range(count):
+                    size, length = ENTRY.unpack_from(data, offset)
+                    offset += ENTRY.size
+                    token = data[offset:offset + size].decode("utf-8")
+                    offset += size
+                    postings = array.array("I")
+                    postings.frombytes(data[offset:offset + 4 * length])
+                    offset += 4 * length
+                    if len(postings) != length:
+                        raise ValueError("truncated index")
+                    if _SWAP:
+                        postings.byteswap()
+                    target[token] = postings
+            self.last_seq = last_seq
+            self._sorted_words = sorted(self._words)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, struct.error) as exc:
+            logger.warning(f"Rebuilding chat search index: {exc}")
+            self._words.clear()
+            self._nicks.clear()
+            self._sorted_words = []
+            self.last_seq = 0
+
+    def add(self, message) -> None:
+        """Index ``message`` (anything with ``seq``, ``user`` and ``msg``)."""
+        with self._lock:
+            if message.seq <= self.last_seq:
+                return
+            self.last_seq = message.seq
+            for word in tokenize(message.msg):
+                postings = self._words.get(word)
+                if postings is None:
+                    postings = self._words[word] = array.array("I")
+                    bisect.insort(self._sorted_words, word)
+                postings.append(message.seq)
+            self._nicks.setdefault(message.user.lower(), array.array("I")).append(message.seq)
+            self._schedule()
+
+    def clear(self) -> None:
+        """Forget everything, e.g. when the chat log was deleted."""
+        with self._lock:
+            self._words.clear()
+            self._nicks.clear()
+            self._sorted_words.clear()
+            self.last_seq = 0
+            self._schedule()
+
+    def prune(self, first_seq: int) -> None:
+        """Forget messages older than ``first_seq``."""
+        with self._lock:
+            for index in (self._words, self._nicks):
+                for token in list(index):
+                    postings = index[token]
+                    cut = bisect.bisect_left(postings, first_seq)
+                    if cut == len(postings):
+                        del index[token]
+                    elif cut:
+                        del postings[:cut]
+            self._sorted_words = sorted(self._words)
+            self._schedule()
+
+    def _matches(self, term: str) -> set[int]:
+        if term.endswith("*"):
+            prefix = term[:-1]
+            found: set[int] = set()
+            start = bisect.bisect_left(self._sorted_words, prefix)
+            for word in self._sorted_words[start:]:
+                if not word.startswith(prefix):
+                    break
+                found.update(self._words[word])
+            return found
+        return set(self._words.get(term, ()))
+
+    def search(self, query: str, nick: str | None = None, limit: int = 50) -> list[int]:
+        """Return sequence numbers matching ``query``, newest first."""
+        terms = []
+        for part in query.lower().split():
+            if part.startswith("from:"):
+                nick = part[5:]
+            else:
+                # Apply the same word splitting as indexing, keeping a
+                # trailing * as the prefix marker
+                words = _WORD.findall(part)
+                if part.endswith("*") and words:
+                    words[-1] += "*"
+                terms.extend(words)
+        with self._lock:
+            if not terms and not nick:
+                return []
+            # Intersect the rarest terms first
+            sets = sorted((self._matches(term) for term in terms), key=len)
+            if nick:
+                sets.insert(0, set(self._nicks.get(nick.lower(), ())))
+            result = sets[0]
+            for other in sets[1:]:
+                if not result:
+                    break
+                result = result & other
+        return sorted(result, reverse=True)[:limit]
+
+    def _schedule(self) -> None:
+        # Unlike JsonStore the timer is not pushed back by later changes;
+        # in a busy channel that would mean never saving
+        if self.path is None or self._timer is not None:
+            return
+        self._timer = threading.Timer(self.delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self) -> None:
+        """Save the index now if it changed."""
+        with self._lock:
+            if self._timer is None or self.path is None:
+                return
+            self._timer.cancel()
+            self._timer = None
+            parts = [HEADER.pack(MAGIC, FORMAT_VERSION, self.last_seq,
+                                 len(self._words), len(self._nicks))]
+            for index in (self._words, self._nicks):
+                for token, postings in index.items():
+                    raw = token.encode("utf-8")
+                    if _SWAP:
+                        postings = array.array("I", postings)
+                        postings.byteswap()
+                    parts.append(ENTRY.pack(len(raw), len(postings)))
+                    parts.append(raw)
+                    parts.append(postings.tobytes())
+            data = b"".join(parts)
+        try:
+            atomic_write(self.path, data)
+        except OSError as exc:
+            logger.warning(f"Failed to save {self.path}: {exc}")
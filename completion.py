@@ -0,0 +1,156 @@
+"""Word completion for the on-screen keyboards.
+
+Words are kept in a prefix trie.  Every node caches the few most frequent
+words below it, so completing a prefix is one dictionary lookup per
+typed letter no matter how many words are known.  The trie starts from
+the bundled ``assets/words.txt`` (most common words first) and learns the
+words of chat messages as they are sent.
+"""
+
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+WORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "words.txt")
+# Completions cached per node
+TOP_K = 4
+# Stop adding new words past this many so the trie stays small
+MAX_WORDS = 5000
+# Count given to the most common bundled word; the rest scale down to 1
+BUNDLED_WEIGHT = 10
+# Count added each time a word is used in chat
+LEARN_WEIGHT = 10
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class _Node:
+    __slots__ = ("children", "count", "top")
+
+    def __init__(self) -> None:
+        self.children: dict[str, "_Node"] | None = None
+        self.count = 0
+        # Up to TOP_K (count, word) pairs for this subtree, best first
+        self.top: tuple = ()
+
+
+class Trie:
+    """Prefix trie of words with usage counts."""
+
+    def __init__(self, max_words: int = MAX_WORDS) -> None:
+        self.max_words = max_words
+        self.words = 0
+        self._root = _Node()
+        self._lock = threading.Lock()
+
+    def add(self, word: str, count: int = 1) -> None:
+        """Add ``count`` uses of the lower-case ``word``."""
+        if not word:
+            return
+        with self._lock:
+            path = [self._root]
+            node = self._root
+            for ch in word:
+                child = node.children.get(ch) if node.children else None
+                if child is None:
+                    if self.words >= self.max_words:
+                        return
+                    if node.children is None:
+                        node.children = {}
+                    child = node.children[ch] = _Node()
+                node = child
+                path.append(node)
+            if not node.count:
+                self.words += 1
+            node.count += count
+            entry = (node.count, word)
+            # Counts only grow, so only this word can move into or up
+            # the cached lists along its path
+            for step in path:
+                top = [item for item in step.top if item[1] != word]
+                top.append(entry)
+                top.sort(key=lambda item: -item[0])
+                step.top = tuple(top[:TOP_K])
+
+    def complete(self, prefix: str, limit: int = 3) -> list[str]:
+        """Return up to ``limit`` of the most used words starting with ``prefix``.
+
+        If ``prefix`` is itself a known word it comes first, so a finished
+        word is never replaced by a longer one.
+        """
+        prefix = prefix.lower()
+        node = self._root
+        for ch in prefix:
+            if not node.children:
+                return []
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        words = [prefix] if node.count else []
+        words += [word for _, word in node.top if len(word) > len(prefix)]
+        return words[:limit]
+
+    def learn(self, text: str) -> None:
+        """Count the words of ``text``."""
+        for word in _WORD.findall(text.lower()):
+            self.add(word, LEARN_WEIGHT)
+
+
+def load(path: str = WORDS_PATH) -> Trie:
+    """Return a trie of the word list at ``path``, one word per line."""
+    trie = Trie()
+    try:
+        with open(path, encoding="utf-8") as fh:
+            words = [line.strip().lower() for line in fh if line.strip()]
+    except OSError as exc:
+        logger.warning(f"No word list for completion: {exc}")
+        return trie
+    for rank, word in enumerate(words):
+        trie.add(word, 1 + (len(words) - rank) * (BUNDLED_WEIGHT - 1) // len(words))
+    return trie
+
+
+_trie: Trie | None = None
+_trie_lock = threading.Lock()
+
+
+def _default() -> Trie:
+    global _trie
+    if _trie is None:
+        with _trie_lock:
+            if _trie is None:
+                _trie = load()
+    return _trie
+
+
+def current_word(text: str) -> str:
+    """Return the partial word at the end of ``text``."""
+    # Only whole words: "/s" or "from:ni" are not completed
+    match = re.search(r"(?:^|(?<=\s))[A-Za-z0-9]+$", text)
+    return match.group(0) if match else ""
+
+
+def complete(text: str, limit: int = 3) -> list[str]:
+    """Return completions for the word being typed at the end of ``text``.
+
+    Each completion is the rest of the word, to be appended to ``text``;
+    it is empty when the word is already complete.
+    """
+    prefix = current_word(text)
+    if not prefix:
+        return []
+    return [word[len(prefix):] for word in _default().complete(prefix, limit)]
+
+
+def accept(text: str) -> str:
+    """Return ``text`` with its last word completed and a space added."""
+    options = complete(text, 1)
+    return text + (options[0] if options else "") + " "
+
+
+def learn(text: str) -> None:
+    """Teach the shared trie the words of a sent message."""
+    _default().learn(text)
@@ -1,11 +1,18 @@
-"""GPIO input handler for the Waveshare 1.44" LCD HAT."""
+"""Input pipeline for the Waveshare 1.44" LCD HAT.
+
+An input backend from ``input_backends`` reports raw key edges through
+:func:`feed`.  They are debounced, auto-repeated while a direction is
+held and posted to the pygame event queue.  Other sources, such as the
+UDP remote joystick, feed edges under their own name; those are not
+debounced, and a key stays down while any source holds it.
+"""
 
 import logging
+import os
+import threading
+import time
 import pygame
-try:
-    import RPi.GPIO as GPIO
-except ImportError:  # Allow running on non-RPi platforms
-    GPIO = None
+import input_backends
 
 # Shared logger for HAT-related activity
 logger = logging.getLogger("hat")
@@ -17,76 +24,178 @@ if not logger.handlers:
     logger.addHandler(handler)
 logger.setLevel(logging.DEBUG)
 
-# GPIO pin definitions for the 1.44" LCD HAT
-PIN_JOY_UP = 6
-PIN_JOY_DOWN = 19
-PIN_JOY_LEFT = 5
-PIN_JOY_RIGHT = 26
-PIN_JOY_PRESS = 13
-PIN_KEY1 = 21
-PIN_KEY2 = 20
-PIN_KEY3 = 16
-
-# Mapping of GPIO pins to pygame key constants
-PIN_KEY_MAP = {
-    PIN_JOY_UP: pygame.K_UP,
-    PIN_JOY_DOWN: pygame.K_DOWN,
-    PIN_JOY_LEFT: pygame.K_LEFT,
-    PIN_JOY_RIGHT: pygame.K_RIGHT,
-    PIN_JOY_PRESS: pygame.K_RETURN,
-    PIN_KEY1: pygame.K_SPACE,
-    PIN_KEY2: pygame.K_ESCAPE,
-    PIN_KEY3: pygame.K_TAB,
-}
-
-
-def init() -> None:
-    """Initialise GPIO handling and register callbacks."""
-    if GPIO is None:
-        # If GPIO is unavailable we fall back to keyboard controls.
-        logger.warning("GPIO not available; using keyboard input")
-        return
+# Edges arriving within this many seconds of the previous edge on the same
+# key are treated as contact bounce and resolved by re-reading the key once
+# it has been quiet for the same period.
+DEBOUNCE = 0.02
+
+# Held joystick directions start repeating after REPEAT_DELAY seconds and
+# then repeat every REPEAT_INTERVAL seconds.
+REPEAT_DELAY = 0.35
+REPEAT_INTERVAL = 0.1
+REPEAT_KEYS = {pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT}
+
+# Active input backend
+backend: input_backends.InputBackend | None = None
+
+# Number of events the pygame queue refused because it was full
+dropped = 0
+
+# Source name of edges from the input backend
+LOCAL = "local"
 
-    # Clear any previous GPIO configuration that might remain if the
-    # application exited unexpectedly.  This helps avoid "Failed to add edge
-    # detection" errors when rerunning the program.
-    logger.debug("Configuring GPIO pins")
-    GPIO.cleanup()
-    GPIO.setmode(GPIO.BCM)
-    for pin in PIN_KEY_MAP:
-        GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-        try:
-            GPIO.add_event_detect(
-                pin, GPIO.BOTH, callback=_handle, bouncetime=50
-            )
-            logger.debug(f"Added event detection for pin {pin}")
-        except RuntimeError:
-            # If event detection is already in place for this pin, remove and
-            # try again so that reruns work without manual cleanup.
-            try:
-                GPIO.remove_event_detect(pin)
-                GPIO.add_event_detect(
-                    pin, GPIO.BOTH, callback=_handle, bouncetime=50
-                )
-                logger.debug(f"Re-added event detection for pin {pin}")
-            except RuntimeError as exc:
-                logger.exception(f"Failed to add edge detection for pin {pin}: {exc}")
+# State shared between backend threads and the repeat thread
+_cond = threading.Condition()
+_holders: dict[int, set[str]] = {}  # key -> sources holding it down
+_last_edge: dict[int, float] = {}  # key -> time of the last edge seen
+_unsettled: set[int] = set()  # keys that bounced and need re-reading
+_next_repeat: dict[int, float] = {}  # held key -> when to repeat next
+_repeat_pending: set[int] = set()  # keys with a repeat not yet consumed
+_repeat_thread = None
+_running = False
+# Repeat timing passed to init
+_repeat_delay = REPEAT_DELAY
+_repeat_interval = REPEAT_INTERVAL
+
+
+def init(input_backend: input_backends.InputBackend | None = None,
+         repeat_delay: float = REPEAT_DELAY,
+         repeat_interval: float = REPEAT_INTERVAL) -> None:
+    """Start the repeat thread and the input backend.
+
+    Without ``input_backend`` the backend is chosen from the
+    ``VIRTUALPET_INPUT`` environment variable (see
+    :func:`input_backends.create`) or detected automatically.
+    """
+    global backend, _repeat_delay, _repeat_interval
+    _repeat_delay = repeat_delay
+    _repeat_interval = repeat_interval
+    if input_backend is None:
+        input_backend = input_backends.create(os.environ.get("VIRTUALPET_INPUT"))
+    backend = input_backend
+    _start_repeat_thread()
+    backend.start(feed)
+    logger.info(f"Using {backend.name} input backend")
 
 
 def cleanup() -> None:
-    """Clean up GPIO resources."""
-    if GPIO is not None:
-        GPIO.cleanup()
-        logger.debug("GPIO cleanup complete")
+    """Stop the input backend and the repeat thread."""
+    global _running
+    with _cond:
+        _running = False
+        _cond.notify()
+    if backend is not None:
+        backend.stop()
+
+
+def feed(key: int, pressed: bool, source: str = LOCAL) -> None:
+    """Report a raw press or release of ``key``.
+
+    Edges from the input backend use the default ``source``.  Other
+    sources are taken as they are: they are not debounced, and their keys
+    are never re-read from the backend.
+    """
+    now = time.monotonic()
+    with _cond:
+        if source != LOCAL:
+            _set_key(key, pressed, now, source)
+            return
+        if backend is not None and backend.debounce:
+            if now - _last_edge.get(key, float("-inf")) < DEBOUNCE:
+                # Still bouncing; the repeat thread re-reads the key once
+                # it has been quiet for DEBOUNCE seconds.
+                _last_edge[key] = now
+                _unsettled.add(key)
+                _cond.notify()
+                return
+            _last_edge[key] = now
+        _set_key(key, pressed, now, LOCAL)
 
 
-def _handle(pin: int) -> None:
-    """Internal callback translating GPIO changes into pygame events."""
-    key = PIN_KEY_MAP.get(pin)
-    if key is None:
+def coalesce(events: list) -> list:
+    """Drop stale auto-repeat events from a batch of pygame ``events``.
+
+    A repeat is stale when a newer repeat or a release of the same key is
+    already queued behind it, so a slow frame handles at most one repeat
+    per held direction.  Only repeats are dropped: every real press and
+    release is kept, even several of the same direction in one frame.
+    """
+    newer: set[int] = set()
+    kept = []
+    for event in reversed(events):
+        if event.type == pygame.KEYUP:
+            newer.add(event.key)
+        elif event.type == pygame.KEYDOWN and getattr(event, "repeat", False):
+            if event.key in newer:
+                continue
+            newer.add(event.key)
+        kept.append(event)
+    kept.reverse()
+    with _cond:
+        # Let the repeat thread queue the next repeat for these keys
+        _repeat_pending.difference_update(newer)
+    return kept
+
+
+def _start_repeat_thread() -> None:
+    global _repeat_thread, _running
+    with _cond:
+        if _running:
+            return
+        _running = True
+    _repeat_thread = threading.Thread(target=_repeat_worker, daemon=True)
+    _repeat_thread.start()
+
+
+def _post(event_type: int, key: int, repeat: bool) -> None:
+    global dropped
+    if not pygame.event.post(pygame.event.Event(event_type, key=key, repeat=repeat)):
+        dropped += 1
+
+
+def _set_key(key: int, pressed: bool, now: float, source: str) -> None:
+    """Record ``source`` pressing or releasing ``key``.
+
+    A press is posted when the first source presses the key and a release
+    when the last one lets go.  Must be called with ``_cond`` held.
+    """
+    holders = _holders.setdefault(key, set())
+    was_down = bool(holders)
+    if pressed:
+        holders.add(source)
+    else:
+        holders.discard(source)
+    if bool(holders) == was_down:
         return
-    pressed = GPIO.input(pin) == GPIO.LOW
-    event_type = pygame.KEYDOWN if pressed else pygame.KEYUP
-    pygame.event.post(pygame.event.Event(event_type, key=key))
-    state = "pressed" if pressed else "released"
-    logger.debug(f"Pin {pin} {state}")
+    _post(pygame.KEYDOWN if pressed else pygame.KEYUP, key, False)
+    _repeat_pending.discard(key)
+    if pressed and key in REPEAT_KEYS:
+        _next_repeat[key] = now + _repeat_delay
+        _cond.notify()
+    else:
+        _next_repeat.pop(key, None)
+
+
+def _repeat_worker() -> None:
+    """Resolve bouncing keys and generate auto-repeat for held directions."""
+    with _cond:
+        while _running:
+            now = time.monotonic()
+            for key in list(_unsettled):
+                if now - _last_edge[key] >= DEBOUNCE:
+                    _unsettled.discard(key)
+                    pressed = backend.read(key)
+                    if pressed is not None:
+                        _set_key(key, pressed, now, LOCAL)
+            for key, due in list(_next_repeat.items()):
+                if due > now:
+                    continue
+                _next_repeat[key] = now + _repeat_interval
+                if key not in _repeat_pending:
+                    _repeat_pending.add(key)
+                    _post(pygame.KEYDOWN, key, True)
+
+            deadlines = list(_next_repeat.values())
+            deadlines.extend(_last_edge[key] + DEBOUNCE for key in _unsettled)
+            timeout = max(0.0, min(deadlines) - now) if deadlines else None
+            _cond.wait(timeout)
@@ -0,0 +1,120 @@
+"""Fan-out of state changes to the web remote's ``/events`` stream.
+
+Chat messages, settings changes and inventory changes are published to
+the shared :data:`hub`.  Each event is encoded as a server-sent events
+frame once and queued for every connected client.  A client whose queue
+fills up (a phone on a bad connection during a chat flood) is dropped
+rather than slowing the publisher down; its browser reconnects with the
+``Last-Event-ID`` header and is sent what it missed from the last
+``REPLAY`` events, or a ``reset`` event telling it to reload everything
+if it fell further behind.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+# Events kept for clients resuming with Last-Event-ID; more than
+# CLIENT_BUFFER is pointless, as a longer backlog is sent as a reset
+REPLAY = 128
+# Events queued per client before it is dropped as too slow
+CLIENT_BUFFER = 128
+# Streams served at once
+MAX_CLIENTS = 16
+
+
+class Client:
+    """One connected ``/events`` stream."""
+
+    __slots__ = ("frames", "wakeup", "dropped")
+
+    def __init__(self, backlog: list[bytes]) -> None:
+        self.frames: deque[bytes] = deque(backlog)
+        self.wakeup = threading.Event()
+        self.dropped = False
+        if backlog:
+            self.wakeup.set()
+
+
+class EventHub:
+    """Publishes events to every subscribed client."""
+
+    def __init__(self, replay: int = REPLAY, client_buffer: int = CLIENT_BUFFER,
+                 max_clients: int = MAX_CLIENTS) -> None:
+        self.client_buffer = client_buffer
+        self.max_clients = max_clients
+        # Event ids restart with the process, so they carry its start time
+        self.epoch = f"{time.time_ns():x}"
+        self._next_id = 1
+        self._recent: deque[tuple[int, bytes]] = deque(maxlen=replay)
+        self._clients: list[Client] = []
+        self._lock = threading.Lock()
+
+    def publish(self, kind: str, data) -> None:
+        """Send ``data`` as a ``kind`` event to every client."""
+        payload = json.dumps(data, separators=(",", ":"))
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            frame = f"id: {self.epoch}-{event_id}\nevent: {kind}\ndata: {payload}\n\n".encode("utf-8")
+            self._recent.append((event_id, frame))
+            for client in self._clients:
+                if len(client.frames) >= self.client_buffer:
+                    client.dropped = True
+                else:
+                    client.frames.append(frame)
+                client.wakeup.set()
+            if any(client.dropped for client in self._clients):
+                self._clients = [client for client in self._clients if not client.dropped]
+
+    def _backlog(self, last_event_id: str | None) -> list[bytes]:
+        if not last_event_id:
+            return []
+        epoch, _, number = last_event_id.rpartition("-")
+        if epoch == self.epoch and number.isdigit():
+            last = int(number)
+            missed = self._next_id - 1 - last
+            if missed <= 0:
+                return []
+            # A backlog filling client_buffer would get the client dropped
+            # again by the next publish()
+            if missed < self.client_buffer and self._recent and self._recent[0][0] <= last + 1:
+                return [frame for event_id, frame in self._recent if event_id > last]
+        # Missed more than can be replayed, or from before a restart
+        return [b"event: reset\ndata: {}\n\n"]
+
+    def subscribe(self, last_event_id: str | None = None) -> Client | None:
+        """Return a new client, or ``None`` if MAX_CLIENTS are connected."""
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                return None
+            client = Client(self._backlog(last_event_id))
+            self._clients.append(client)
+            return client
+
+    def unsubscribe(self, client: Client) -> None:
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def wait(self, client: Client, timeout: float) -> list[bytes] | None:
+        """Return the frames queued for ``client`` within ``timeout`` seconds.
+
+        Returns ``None`` once the client was dropped for falling behind.
+        """
+        client.wakeup.wait(timeout)
+        with self._lock:
+            if client.dropped:
+                return None
+            frames = list(client.frames)
+            client.frames.clear()
+            client.wakeup.clear()
+        return frames
+
+    @property
+    def clients(self) -> int:
+        return len(self._clients)
+
+
+hub = EventHub()
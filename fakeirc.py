@@ -0,0 +1,243 @@
+"""Local stand-in IRC server for testing and benchmarking the chat screen.
+
+Speaks just enough IRC for ``irc.IrcClient``: registration, JOIN, PING
+and relaying PRIVMSG between connected clients.  With ``--rate`` it also
+floods the channel from ``--nicks`` made-up users.  Each flood message
+starts with ``<seq> <send time in ns>`` so a benchmark can measure
+latency and spot lost messages::
+
+    python3 fakeirc.py --port 6667 --rate 500 --size 120 --nicks 20
+    VIRTUALPET_IRC_SERVER=127.0.0.1 python3 main.py
+"""
+
+import argparse
+import logging
+import random
+import selectors
+import socket
+import threading
+import time
+import ircproto
+
+logger = logging.getLogger(__name__)
+
+# Flood messages are sent in batches at this interval
+TICK = 0.01
+# Clients that fall this far behind are disconnected
+MAX_BACKLOG = 4 << 20
+
+_WORDS = (
+    "purr meow nap chirp tuna yarn sunbeam whisker pounce zoomies box "
+    "catnip feather laser bird window snack treat scratch stretch"
+).split()
+
+
+class _Conn:
+    __slots__ = ("sock", "framer", "out", "nick", "registered")
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.framer = ircproto.LineFramer()
+        self.out = bytearray()
+        self.nick = "*"
+        self.registered = False
+
+
+class FakeIrcServer:
+    """Single-threaded IRC server with an optional channel flood."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, channel: str = "#pet",
+                 rate: float = 0.0, size: int = 80, nicks: int = 10,
+                 seed: int | None = None) -> None:
+        self.channel = channel
+        self.rate = rate
+        self.size = size
+        self.nicks = [f"user{i}" for i in range(max(1, nicks))]
+        self.sent = 0
+        self._rng = random.Random(seed)
+        self._listener = socket.create_server((host, port))
+        self._listener.setblocking(False)
+        self.address = self._listener.getsockname()[:2]
+        self._sel = selectors.DefaultSelector()
+        self._sel.register(self._listener, selectors.EVENT_READ)
+        self._conns: dict[socket.socket, _Conn] = {}
+        self._running = False
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.address[1]
+
+    def start(self) -> None:
+        """Serve in a background thread."""
+        self._running = True
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def serve_forever(self) -> None:
+        self._running = True
+        next_tick = time.monotonic()
+        carry = 0.0
+        try:
+            while self._running:
+                timeout = max(0.0, next_tick - time.monotonic()) if self.rate else 0.5
+                for key, mask in self._sel.select(timeout):
+                    if key.fileobj is self._listener:
+                        self._accept()
+                        continue
+                    conn = key.data
+                    # An earlier event in this batch may have closed it
+                    if mask & selectors.EVENT_READ and conn.sock in self._conns:
+                        self._read(conn)
+                    if mask & selectors.EVENT_WRITE and conn.sock in self._conns:
+                        self._write(conn)
+                now = time.monotonic()
+                if self.rate and now >= next_tick:
+                    # Send whatever the rate allows since the last batch
+                    carry += self.rate * (now - next_tick + TICK)
+                    count = int(carry)
+                    carry -= count
+                    if count:
+                        self._flood(count)
+                    next_tick = now + TICK
+        finally:
+            for conn in list(self._conns.values()):
+                self._close(conn)
+            self._sel.close()
+            self._listener.close()
+
+    def _accept(self) -> None:
+        try:
+            sock, _ = self._listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = _Conn(sock)
+        self._conns[sock] = conn
+        self._sel.register(sock, selectors.EVENT_READ, conn)
+
+    def _close(self, conn: _Conn) -> None:
+        if self._conns.pop(conn.sock, None) is not None:
+            self._sel.unregister(conn.sock)
+            conn.sock.close()
+
+    def _send(self, conn: _Conn, line: str) -> None:
+        if conn.sock not in self._conns:
+            return
+        conn.out += f"{line}\r\n".encode("utf-8")
+        if len(conn.out) > MAX_BACKLOG:
+            logger.warning(f"Disconnecting {conn.nick}: {len(conn.out)} bytes behind")
+            self._close(conn)
+            return
+        self._sel.modify(conn.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, conn)
+
+    def _write(self, conn: _Conn) -> None:
+        try:
+            sent = conn.sock.send(conn.out)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._close(conn)
+            return
+        del conn.out[:sent]
+        if not conn.out:
+            self._sel.modify(conn.sock, selectors.EVENT_READ, conn)
+
+    def _read(self, conn: _Conn) -> None:
+        try:
+            data = conn.sock.recv(16384)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._close(conn)
+            return
+        for line in conn.framer.feed(data):
+            message = ircproto.parse(line)
+            if message is not None:
+                self._handle(conn, message)
+                if conn.sock not in self._conns:
+                    # QUIT, or dropped for falling behind
+                    break
+
+    def _handle(self, conn: _Conn, message: ircproto.IrcMessage) -> None:
+        command, params = message.command, message.params
+        if command == "NICK" and params:
+            taken = any(c.nick == params[0] for c in self._conns.values() if c is not conn)
+            if taken or params[0] in self.nicks:
+                self._send(conn, f":fakeirc 433 {conn.nick} {params[0]} :Nickname is already in use")
+                return
+            conn.nick = params[0]
+        elif command == "USER" and not conn.registered and conn.nick != "*":
+            conn.registered = True
+            self._send(conn, f":fakeirc 001 {conn.nick} :Welcome to fakeirc")
+        elif command == "JOIN" and params:
+            self._send(conn, f":{conn.nick}!{conn.nick}@local JOIN {params[0]}")
+        elif command == "PING":
+            self._send(conn, f":fakeirc PONG fakeirc :{message.trailing}")
+        elif command == "PRIVMSG" and len(params) >= 2:
+            line = f":{conn.nick}!{conn.nick}@local PRIVMSG {params[0]} :{params[1]}"
+            for other in list(self._conns.values()):
+                if other is not conn and other.registered:
+                    self._send(other, line)
+        elif command == "QUIT":
+            self._close(conn)
+
+    def _flood(self, count: int) -> None:
+        targets = [c for c in self._conns.values() if c.registered]
+        if not targets:
+            return
+        rng = self._rng
+        lines = []
+        for _ in range(count):
+            self.sent += 1
+            head = f"{self.sent} {time.time_ns()}"
+            words = [head]
+            length = len(head)
+            while length < self.size:
+                word = rng.choice(_WORDS)
+                words.append(word)
+                length += len(word) + 1
+            nick = rng.choice(self.nicks)
+            lines.append(f":{nick}!{nick}@flood PRIVMSG {self.channel} :{' '.join(words)}")
+        for conn in targets:
+            conn.out += ("\r\n".join(lines) + "\r\n").encode("utf-8")
+            if len(conn.out) > MAX_BACKLOG:
+                logger.warning(f"Disconnecting {conn.nick}: {len(conn.out)} bytes behind")
+                self._close(conn)
+            else:
+                self._sel.modify(conn.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, conn)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6667)
+    parser.add_argument("--channel", default="#pet")
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="flood messages per second (0 = no flood)")
+    parser.add_argument("--size", type=int, default=80,
+                        help="approximate length of each flood message")
+    parser.add_argument("--nicks", type=int, default=10,
+                        help="number of distinct flood nicknames")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeIrcServer(args.host, args.port, args.channel, args.rate, args.size, args.nicks)
+    print(f"fakeirc listening on {server.address[0]}:{server.port} {args.channel}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Local stand-in for the NYT Top Stories API for testing the News screen.
+
+Serves ``/<section>.json`` with made-up stories in the same shape as the
+real API, with ``ETag`` and ``Last-Modified`` headers and ``304 Not
+Modified`` answers to conditional requests.  Each story has pictures in
+a few sizes, served from ``/images/``.  The stories change every
+``--change-every`` seconds, and ``--delay`` adds latency to every
+response::
+
+    python3 fakenyt.py --port 8001 --stories 30 --delay 0.5
+    VIRTUALPET_NEWS_URL=http://127.0.0.1:8001 python3 main.py
+"""
+
+import argparse
+import email.utils
+import http.server
+import io
+import json
+import random
+import threading
+import time
+import urllib.parse
+from PIL import Image, ImageDraw
+
+_WORDS = (
+    "pet bird council storm market election garden robot moon river city "
+    "study finds new old record heat vote team wins loses plan court"
+).split()
+
+# (format, width, height) of the pictures given with every story
+_IMAGE_SIZES = [
+    ("Standard Thumbnail", 75, 75),
+    ("mediumThreeByTwo210", 210, 140),
+    ("superJumbo", 2048, 1365),
+]
+
+
+class FakeNytServer:
+    """Threaded HTTP server answering like the Top Stories API."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, stories: int = 20,
+                 delay: float = 0.0, change_every: float = 0.0,
+                 seed: int | None = None) -> None:
+        self.stories = stories
+        self.delay = delay
+        self.change_every = change_every
+        self.seed = seed
+        self.requests = 0
+        self.not_modified = 0
+        self._started = time.time()
+        self._lock = threading.Lock()
+        self._bodies: dict[tuple[str, int], bytes] = {}
+        self._images: dict[str, bytes] = {}
+        handler = type("Handler", (_Handler,), {"fake": self})
+        self._httpd = http.server.ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self.address = self._httpd.server_address[:2]
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.address[1]
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.address[0]}:{self.port}"
+
+    def start(self) -> None:
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def serve_forever(self) -> None:
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def version(self) -> int:
+        """Number of times the stories have changed."""
+        if self.change_every <= 0:
+            return 0
+        return int((time.time() - self._started) / self.change_every)
+
+    def modified(self, version: int) -> float:
+        return self._started + version * self.change_every if self.change_every > 0 else self._started
+
+    def body(self, section: str, version: int) -> bytes:
+        with self._lock:
+            key = (section, version)
+            if key not in self._bodies:
+                self._bodies[key] = self._generate(section, version)
+            return self._bodies[key]
+
+    def _generate(self, section: str, version: int) -> bytes:
+        rng = random.Random(f"{self.seed}-{section}-{version}")
+        results = []
+        for i in range(self.stories):
+            title = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 12))).capitalize()
+            abstract = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(10, 60)))
+            results.append({
+                "section": section,
+                "title": f"{title} ({version}.{i})",
+                "abstract": abstract.capitalize() + ".",
+                "url": f"https://example.com/{section}/{version}/{i}.html",
+                "byline": "By Fake Reporter",
+                "multimedia": [
+                    {
+                        "url": f"{self.url}/images/{section}-{version}-{i}-{w}x{h}.jpg",
+                        "format": name,
+                        "width": w,
+                        "height": h,
+                        "type": "image",
+                    }
+                    for name, w, h in _IMAGE_SIZES
+                ],
+            })
+        return json.dumps({
+            "status": "OK",
+            "section": section,
+            "num_results": len(results),
+            "results": results,
+        }).encode("utf-8")
+
+
+    def image(self, name: str) -> bytes | None:
+        """Return a made-up JPEG for an image name like ``home-0-3-210x140``."""
+        try:
+            width, height = (int(n) for n in name.rsplit("-", 1)[1].split("x"))
+        except ValueError:
+            return None
+        with self._lock:
+            if name not in self._images:
+                rng = random.Random(name)
+                image = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+                draw = ImageDraw.Draw(image)
+                for _ in range(8):
+                    left, right = sorted(rng.randrange(width) for _ in range(2))
+                    top, bottom = sorted(rng.randrange(height) for _ in range(2))
+                    draw.ellipse((left, top, right, bottom),
+                                 fill=tuple(rng.randrange(256) for _ in range(3)))
+                out = io.BytesIO()
+                image.save(out, "JPEG", quality=85)
+                self._images[name] = out.getvalue()
+            return self._images[name]
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    fake: FakeNytServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        fake = self.fake
+        fake.requests += 1
+        if fake.delay:
+            time.sleep(fake.delay)
+        path = urllib.parse.urlparse(self.path).path
+        if path.startswith("/images/") and path.endswith(".jpg"):
+            self._send_image(path[len("/images/"):-4])
+            return
+        if not path.endswith(".json"):
+            self.send_error(404)
+            return
+        section = path.rsplit("/", 1)[-1][:-5]
+        version = fake.version()
+        etag = f'"{section}-{version}"'
+        last_modified = email.utils.formatdate(fake.modified(version), usegmt=True)
+        if self.headers.get("If-None-Match") is not None:
+            unchanged = self.headers["If-None-Match"] == etag
+        else:
+            since = self.headers.get("If-Modified-Since")
+            unchanged = since == last_modified
+        if unchanged:
+            fake.not_modified += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = fake.body(section, version)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_image(self, name: str) -> None:
+        body = self.fake.image(name)
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--stories", type=int, default=20,
+                        help="stories per section")
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="seconds to wait before each response")
+    parser.add_argument("--change-every", type=float, default=300.0,
+                        help="seconds between story changes (0 = never)")
+    args = parser.parse_args(argv)
+
+    server = FakeNytServer(args.host, args.port, args.stories, args.delay, args.change_every)
+    print(f"fakenyt serving {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
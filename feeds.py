@@ -0,0 +1,340 @@
+"""News feed sources for the News screen.
+
+A :class:`FeedSource` produces compact :class:`Story` records.  Feeds are
+parsed as they stream in and only the few fields the News screen shows
+are kept, so a feed of thousands of items costs no more memory than
+``limit`` stories plus one item being parsed:
+
+* :class:`NytSource` - one NYT Top Stories section.  The ``results``
+  array is decoded one object at a time with ``JSONDecoder.raw_decode``
+  as chunks arrive, instead of loading the whole response.
+* :class:`RssSource` - an RSS or Atom feed from a URL or a file, read
+  with ``ElementTree.iterparse`` and cleared item by item.
+* :class:`DirectorySource` - every ``.json`` (Top Stories format),
+  ``.xml``, ``.rss`` and ``.atom`` file in a local directory.
+
+``source(spec)`` picks one from a ``VIRTUALPET_NEWS_SECTIONS`` entry.
+"""
+
+import codecs
+import html
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
+from typing import Iterable, Iterator
+import requests
+import thumbnails
+
+# Stories kept per source; override with VIRTUALPET_NEWS_MAX_ITEMS
+MAX_ITEMS = int(os.environ.get("VIRTUALPET_NEWS_MAX_ITEMS", "50"))
+# The smallest picture at least as wide as the thumbnails is used
+IMAGE_WIDTH = thumbnails.THUMB_WIDTH
+CHUNK_SIZE = 16384
+REQUEST_TIMEOUT = 10
+
+_TAG = re.compile(r"<[^>]*>")
+_FEED_EXTENSIONS = (".xml", ".rss", ".atom")
+
+
+class Story:
+    """One news story."""
+
+    __slots__ = ("title", "abstract", "url", "image", "section", "layout")
+    FIELDS = ("title", "abstract", "url", "image", "section")
+
+    def __init__(self, title: str = "", abstract: str = "", url: str = "",
+                 image: str = "", section: str = "") -> None:
+        self.title = title
+        self.abstract = abstract
+        self.url = url
+        self.image = image
+        self.section = section
+        # Wrapped lines, filled in by the News screen
+        self.layout = None
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Story":
+        return cls(**{name: str(data.get(name) or "") for name in cls.FIELDS})
+
+    def __repr__(self) -> str:
+        return f"Story({self.title!r}, {self.url!r})"
+
+
+class FeedSource(ABC):
+    """Somewhere stories come from.
+
+    ``fetch`` returns the stories, or ``None`` when the feed did not
+    change since the ``validators`` returned by the previous fetch, along
+    with the validators to pass next time.
+    """
+
+    name = ""
+
+    @abstractmethod
+    def fetch(self, session: requests.Session, validators: dict,
+              limit: int = MAX_ITEMS) -> tuple[list[Story] | None, dict]:
+        ...
+
+
+def _get(session: requests.Session, url: str, validators: dict,
+         params: dict | None = None) -> requests.Response | None:
+    """Start a conditional streaming GET; ``None`` means not modified."""
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    resp = session.get(url, params=params, headers=headers, timeout=REQUEST_TIMEOUT,
+                       stream=True)
+    if resp.status_code == 304:
+        resp.close()
+        return None
+    try:
+        resp.raise_for_status()
+    except requests.HTTPError:
+        resp.close()
+        raise
+    return resp
+
+
+def _validators(resp: requests.Response) -> dict:
+    return {
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+    }
+
+
+def _pick_image(images: list[tuple[int, str]]) -> str:
+    """Return the URL of the smallest ``(width, url)`` that fills the screen."""
+    if not images:
+        return ""
+    wide = [image for image in images if image[0] >= IMAGE_WIDTH]
+    return min(wide)[1] if wide else max(images)[1]
+
+
+def _image_url(item: dict) -> str:
+    return _pick_image([
+        (int(media.get("width") or 0), media["url"])
+        for media in item.get("multimedia") or ()
+        if isinstance(media, dict) and media.get("url") and media.get("type", "image") == "image"
+    ])
+
+
+def iter_json_results(chunks: Iterable[bytes]) -> Iterator[dict]:
+    """Yield the objects of the top-level ``results`` array of a JSON stream.
+
+    Only the text of the object being decoded is buffered.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    buffer = ""
+    pos = 0
+    in_results = False
+    chunks = iter(chunks)
+    done = False
+    while True:
+        if not in_results:
+            # The Top Stories fields before "results" are short scalars
+            start = buffer.find('"results"', pos)
+            if start >= 0:
+                bracket = buffer.find("[", start)
+                if bracket >= 0:
+                    pos = bracket + 1
+                    in_results = True
+                    continue
+            else:
+                pos = max(pos, len(buffer) - len('"results"'))
+        else:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buffer):
+                if buffer[pos] == "]":
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    if done:
+                        raise
+                else:
+                    if isinstance(item, dict):
+                        yield item
+                    pos = end
+                    continue
+        if done:
+            if in_results:
+                raise ValueError("truncated results array")
+            return
+        # Drop what was consumed and read more
+        buffer = buffer[pos:]
+        pos = 0
+        chunk = next(chunks, None)
+        if chunk is None:
+            done = True
+            buffer += text_decoder.decode(b"", final=True)
+        else:
+            buffer += text_decoder.decode(chunk)
+
+
+def _nyt_stories(items: Iterable[dict], section: str, limit: int) -> list[Story]:
+    stories = []
+    for item in items:
+        stories.append(Story(
+            str(item.get("title") or ""),
+            str(item.get("abstract") or ""),
+            str(item.get("url") or ""),
+            _image_url(item),
+            section,
+        ))
+        if len(stories) >= limit:
+            break
+    return stories
+
+
+class NytSource(FeedSource):
+    """One section of the NYT Top Stories API."""
+
+    def __init__(self, section: str, base_url: str, api_key: str) -> None:
+        self.name = section
+        self.url = f"{base_url}/{section}.json"
+        self.api_key = api_key
+
+    def fetch(self, session, validators, limit=MAX_ITEMS):
+        resp = _get(session, self.url, validators, {"api-key": self.api_key})
+        if resp is None:
+            return None, validators
+        with resp:
+            items = iter_json_results(resp.iter_content(CHUNK_SIZE))
+            return _nyt_stories(items, self.name, limit), _validators(resp)
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _plain(text: str | None) -> str:
+    """Return ``text`` without HTML tags or entities."""
+    if not text:
+        return ""
+    return " ".join(html.unescape(_TAG.sub(" ", text)).split())
+
+
+def _xml_story(element: ET.Element, section: str) -> Story:
+    title = abstract = url = ""
+    images = []
+    for child in element:
+        tag = _local(child.tag)
+        if tag == "title":
+            title = _plain(child.text)
+        elif tag in ("description", "summary") or (tag == "content" and child.text):
+            # Atom <content> is only used when there is no <summary>
+            if tag != "content" or not abstract:
+                abstract = _plain(child.text)
+        elif tag == "link":
+            # RSS has the URL as text, Atom in href (prefer rel=alternate)
+            href = child.get("href")
+            if href is None:
+                url = (child.text or "").strip()
+            elif not url or child.get("rel", "alternate") == "alternate":
+                url = href
+        elif tag in ("thumbnail", "content", "enclosure") and child.get("url"):
+            if tag == "enclosure" and not child.get("type", "image").startswith("image"):
+                continue
+            try:
+                width = int(child.get("width") or 0)
+            except ValueError:
+                width = 0
+            images.append((width, child.get("url")))
+    return Story(title, abstract, url, _pick_image(images), section)
+
+
+def iter_xml_stories(stream, section: str) -> Iterator[Story]:
+    """Yield the items of an RSS or Atom ``stream``, clearing them as it goes."""
+    parents: list[ET.Element] = []
+    try:
+        for event, element in ET.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                parents.append(element)
+                continue
+            parents.pop()
+            if _local(element.tag) in ("item", "entry"):
+                yield _xml_story(element, section)
+                if parents:
+                    parents[-1].remove(element)
+    except ET.ParseError as exc:
+        raise ValueError(f"bad feed: {exc}") from exc
+
+
+class RssSource(FeedSource):
+    """An RSS or Atom feed at a URL or in a file."""
+
+    def __init__(self, location: str, name: str | None = None) -> None:
+        self.location = location
+        self.name = name or location
+
+    def fetch(self, session, validators, limit=MAX_ITEMS):
+        if not self.location.startswith(("http://", "https://")):
+            stat = os.stat(self.location)
+            mtime = {"mtime": stat.st_mtime_ns}
+            if validators.get("mtime") == mtime["mtime"]:
+                return None, validators
+            with open(self.location, "rb") as fh:
+                return _take(iter_xml_stories(fh, self.name), limit), mtime
+        resp = _get(session, self.location, validators)
+        if resp is None:
+            return None, validators
+        with resp:
+            resp.raw.decode_content = True
+            return _take(iter_xml_stories(resp.raw, self.name), limit), _validators(resp)
+
+
+class DirectorySource(FeedSource):
+    """Feed files in a local directory, e.g. copied from a USB stick."""
+
+    def __init__(self, path: str, name: str | None = None) -> None:
+        self.path = path
+        self.name = name or path
+
+    def fetch(self, session, validators, limit=MAX_ITEMS):
+        files = sorted(
+            entry.path for entry in os.scandir(self.path)
+            if entry.is_file() and entry.name.endswith((".json",) + _FEED_EXTENSIONS)
+        )
+        state = [[path, os.stat(path).st_mtime_ns] for path in files]
+        if validators.get("files") == state:
+            return None, validators
+        stories: list[Story] = []
+        for path in files:
+            remaining = limit - len(stories)
+            if remaining <= 0:
+                break
+            section = os.path.splitext(os.path.basename(path))[0]
+            with open(path, "rb") as fh:
+                if path.endswith(".json"):
+                    chunks = iter(lambda: fh.read(CHUNK_SIZE), b"")
+                    stories += _nyt_stories(iter_json_results(chunks), section, remaining)
+                else:
+                    stories += _take(iter_xml_stories(fh, section), remaining)
+        return stories, {"files": state}
+
+
+def _take(items: Iterator[Story], limit: int) -> list[Story]:
+    stories = []
+    for story in items:
+        stories.append(story)
+        if len(stories) >= limit:
+            break
+    return stories
+
+
+def source(spec: str, base_url: str, api_key: str) -> FeedSource:
+    """Return the source for ``spec``: a feed URL, a file, a directory or a NYT section."""
+    if spec.startswith(("http://", "https://")) or spec.endswith(_FEED_EXTENSIONS):
+        return RssSource(spec)
+    if os.path.isdir(spec):
+        return DirectorySource(spec)
+    return NytSource(spec, base_url, api_key)
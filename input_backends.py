@@ -0,0 +1,337 @@
+"""Input backends feeding key edges into the ``controller`` pipeline.
+
+Each backend reports raw presses and releases by calling the ``feed``
+function handed to :meth:`InputBackend.start`.  ``controller`` takes care
+of debouncing, auto-repeat and posting pygame events.
+"""
+
+import logging
+import random
+import threading
+import time
+import pygame
+try:
+    import RPi.GPIO as GPIO
+except ImportError:  # Allow running on non-RPi platforms
+    GPIO = None
+try:
+    import evdev
+except ImportError:  # evdev is optional
+    evdev = None
+
+# Shared logger for HAT-related activity
+logger = logging.getLogger("hat")
+if not logger.handlers:
+    handler = logging.FileHandler("hatlog.txt", mode="a")
+    handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s: %(message)s")
+    )
+    logger.addHandler(handler)
+logger.setLevel(logging.DEBUG)
+
+# GPIO pin definitions for the 1.44" LCD HAT
+PIN_JOY_UP = 6
+PIN_JOY_DOWN = 19
+PIN_JOY_LEFT = 5
+PIN_JOY_RIGHT = 26
+PIN_JOY_PRESS = 13
+PIN_KEY1 = 21
+PIN_KEY2 = 20
+PIN_KEY3 = 16
+
+# Mapping of GPIO pins to pygame key constants
+PIN_KEY_MAP = {
+    PIN_JOY_UP: pygame.K_UP,
+    PIN_JOY_DOWN: pygame.K_DOWN,
+    PIN_JOY_LEFT: pygame.K_LEFT,
+    PIN_JOY_RIGHT: pygame.K_RIGHT,
+    PIN_JOY_PRESS: pygame.K_RETURN,
+    PIN_KEY1: pygame.K_SPACE,
+    PIN_KEY2: pygame.K_ESCAPE,
+    PIN_KEY3: pygame.K_TAB,
+}
+
+# Names used by scripts and remote clients for the keys the HAT provides
+KEY_NAMES = {
+    "up": pygame.K_UP,
+    "down": pygame.K_DOWN,
+    "left": pygame.K_LEFT,
+    "right": pygame.K_RIGHT,
+    "return": pygame.K_RETURN,
+    "space": pygame.K_SPACE,
+    "escape": pygame.K_ESCAPE,
+    "tab": pygame.K_TAB,
+}
+
+# evdev key names mapped onto the same pygame keys
+EVDEV_KEY_NAMES = {
+    "KEY_UP": pygame.K_UP,
+    "KEY_DOWN": pygame.K_DOWN,
+    "KEY_LEFT": pygame.K_LEFT,
+    "KEY_RIGHT": pygame.K_RIGHT,
+    "KEY_ENTER": pygame.K_RETURN,
+    "KEY_SPACE": pygame.K_SPACE,
+    "KEY_ESC": pygame.K_ESCAPE,
+    "KEY_TAB": pygame.K_TAB,
+}
+
+
+class InputBackend:
+    """Base class for sources of joystick and button input."""
+
+    name = "none"
+    # Whether edges from this backend need software debouncing
+    debounce = False
+
+    def start(self, feed) -> None:
+        """Begin reporting edges by calling ``feed(key, pressed)``."""
+
+    def stop(self) -> None:
+        """Stop reporting edges and release any resources."""
+
+    def read(self, key: int) -> bool | None:
+        """Return whether ``key`` is held right now, if that can be sampled."""
+        return None
+
+
+class GpioBackend(InputBackend):
+    """Joystick and buttons of the LCD HAT via ``RPi.GPIO`` callbacks."""
+
+    name = "gpio"
+    debounce = True
+
+    def __init__(self) -> None:
+        self._feed = None
+        self._key_pins = {key: pin for pin, key in PIN_KEY_MAP.items()}
+
+    def start(self, feed) -> None:
+        self._feed = feed
+        # Clear any previous GPIO configuration that might remain if the
+        # application exited unexpectedly.  This helps avoid "Failed to add
+        # edge detection" errors when rerunning the program.
+        logger.debug("Configuring GPIO pins")
+        GPIO.cleanup()
+        GPIO.setmode(GPIO.BCM)
+        for pin in PIN_KEY_MAP:
+            GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            # No hardware bouncetime: RPi.GPIO drops the release edge when it
+            # arrives inside the window, leaving keys stuck.  Bounces are
+            # filtered in software by controller.feed instead.
+            try:
+                GPIO.add_event_detect(pin, GPIO.BOTH, callback=self._handle)
+                logger.debug(f"Added event detection for pin {pin}")
+            except RuntimeError:
+                # If event detection is already in place for this pin,
+                # remove and try again so that reruns work without manual
+                # cleanup.
+                try:
+                    GPIO.remove_event_detect(pin)
+                    GPIO.add_event_detect(pin, GPIO.BOTH, callback=self._handle)
+                    logger.debug(f"Re-added event detection for pin {pin}")
+                except RuntimeError as exc:
+                    logger.exception(f"Failed to add edge detection for pin {pin}: {exc}")
+
+    def stop(self) -> None:
+        GPIO.cleanup()
+        logger.debug("GPIO cleanup complete")
+
+    def read(self, key: int) -> bool | None:
+        pin = self._key_pins.get(key)
+        if pin is None:
+            return None
+        return GPIO.input(pin) == GPIO.LOW
+
+    def _handle(self, pin: int) -> None:
+        """Callback translating GPIO changes into key edges."""
+        key = PIN_KEY_MAP.get(pin)
+        if key is None:
+            return
+        pressed = GPIO.input(pin) == GPIO.LOW
+        self._feed(key, pressed)
+        state = "pressed" if pressed else "released"
+        logger.debug(f"Pin {pin} {state}")
+
+
+class EvdevBackend(InputBackend):
+    """Keyboards, gamepads or ``gpio-keys`` devices via Linux evdev."""
+
+    name = "evdev"
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path = path
+        self._device = None
+        self._codes: dict[int, int] = {}
+
+    @staticmethod
+    def find_device() -> str | None:
+        """Return the path of the first device that has arrow keys."""
+        if evdev is None:
+            return None
+        for path in evdev.list_devices():
+            try:
+                device = evdev.InputDevice(path)
+            except OSError:
+                continue
+            keys = device.capabilities().get(evdev.ecodes.EV_KEY, [])
+            device.close()
+            if evdev.ecodes.KEY_UP in keys:
+                return path
+        return None
+
+    def start(self, feed) -> None:
+        path = self.path or self.find_device()
+        if path is None:
+            raise RuntimeError("No evdev device with arrow keys found")
+        self._device = evdev.InputDevice(path)
+        self._codes = {
+            evdev.ecodes.ecodes[name]: key
+            for name, key in EVDEV_KEY_NAMES.items()
+        }
+        logger.debug(f"Reading evdev input from {path}")
+        threading.Thread(target=self._read_loop, args=(feed,), daemon=True).start()
+
+    def stop(self) -> None:
+        if self._device is not None:
+            self._device.close()
+            self._device = None
+
+    def read(self, key: int) -> bool | None:
+        if self._device is None:
+            return None
+        codes = [code for code, mapped in self._codes.items() if mapped == key]
+        return any(code in self._device.active_keys() for code in codes)
+
+    def _read_loop(self, feed) -> None:
+        try:
+            for event in self._device.read_loop():
+                # Value 2 is the kernel's own auto-repeat; controller
+                # generates repeats itself.
+                if event.type != evdev.ecodes.EV_KEY or event.value == 2:
+                    continue
+                key = self._codes.get(event.code)
+                if key is not None:
+                    feed(key, event.value == 1)
+        except (OSError, AttributeError):
+            # Raised when stop() closes the device underneath the loop
+            pass
+
+
+class KeyboardBackend(InputBackend):
+    """Regular pygame keyboard events; needs a display to receive them."""
+
+    name = "keyboard"
+
+    def start(self, feed) -> None:
+        logger.warning("GPIO not available; using keyboard input")
+
+
+class ScriptedBackend(InputBackend):
+    """Replays timed ``(seconds, key, pressed)`` steps from a thread.
+
+    Steps come from an event file (see :meth:`from_file`) or a synthetic
+    burst (see :meth:`burst`).  ``speed`` scales playback; ``0`` feeds
+    every step as fast as possible.
+    """
+
+    name = "scripted"
+
+    def __init__(self, steps: list[tuple[float, int, bool]],
+                 speed: float = 1.0) -> None:
+        self.steps = steps
+        self.speed = speed
+        self.fed = 0
+        self.done = threading.Event()
+        self._stop = threading.Event()
+        self._held: dict[int, bool] = {}
+        self._thread = None
+
+    @classmethod
+    def from_file(cls, path: str, speed: float = 1.0) -> "ScriptedBackend":
+        """Load steps from ``path``.
+
+        Each line holds a timestamp in seconds, a key name from
+        ``KEY_NAMES`` and ``down`` or ``up``, e.g. ``0.25 left down``.
+        Blank lines and ``#`` comments are ignored.
+        """
+        steps = []
+        with open(path) as fh:
+            for lineno, line in enumerate(fh, 1):
+                line = line.split("#", 1)[0].strip()
+                if not line:
+                    continue
+                try:
+                    stamp, name, action = line.split()
+                    steps.append((float(stamp), KEY_NAMES[name], action == "down"))
+                except (ValueError, KeyError):
+                    raise ValueError(f"{path}:{lineno}: bad event {line!r}") from None
+        steps.sort(key=lambda step: step[0])
+        return cls(steps, speed)
+
+    @classmethod
+    def burst(cls, rate: float, count: int, keys: list[int] | None = None,
+              seed: int = 0) -> "ScriptedBackend":
+        """Return a backend producing ``count`` random key taps.
+
+        Each tap is a press followed by a release, and edges are spaced
+        evenly at ``rate`` edges per second.
+        """
+        rng = random.Random(seed)
+        keys = keys or list(KEY_NAMES.values())
+        interval = 1.0 / rate
+        steps = []
+        for i in range(count):
+            key = rng.choice(keys)
+            steps.append((2 * i * interval, key, True))
+            steps.append(((2 * i + 1) * interval, key, False))
+        return cls(steps, speed=1.0)
+
+    def start(self, feed) -> None:
+        self._thread = threading.Thread(target=self._play, args=(feed,), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def read(self, key: int) -> bool | None:
+        return self._held.get(key, False)
+
+    def _play(self, feed) -> None:
+        start = time.monotonic()
+        for stamp, key, pressed in self.steps:
+            if self.speed > 0:
+                delay = start + stamp / self.speed - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+            elif self._stop.is_set():
+                break
+            self._held[key] = pressed
+            feed(key, pressed)
+            self.fed += 1
+        self.done.set()
+
+
+def create(spec: str | None = None) -> InputBackend:
+    """Return the backend named by ``spec``.
+
+    ``spec`` is ``gpio``, ``evdev[:PATH]``, ``keyboard`` or
+    ``scripted:FILE``.  Without a spec the HAT's GPIO is used when
+    available, then an evdev device with arrow keys, then the keyboard.
+    """
+    if not spec:
+        if GPIO is not None:
+            return GpioBackend()
+        if EvdevBackend.find_device() is not None:
+            return EvdevBackend()
+        return KeyboardBackend()
+    name, _, arg = spec.partition(":")
+    if name == "gpio":
+        return GpioBackend()
+    if name == "evdev":
+        return EvdevBackend(arg or None)
+    if name == "keyboard":
+        return KeyboardBackend()
+    if name == "scripted":
+        return ScriptedBackend.from_file(arg)
+    raise ValueError(f"Unknown input backend {spec!r}")
@@ -0,0 +1,100 @@
+"""Stress-test the input event path of ``main.py`` without the HAT.
+
+A scripted input backend feeds key edges through ``controller`` into the
+pygame queue while a headless copy of the main loop drains it, so queue
+depth and handling throughput can be measured on any Linux box::
+
+    python3 inputbench.py --rate 2000 --count 20000
+    python3 inputbench.py --script taps.txt --speed 4
+"""
+
+import argparse
+import os
+import time
+
+# Run pygame without a display or sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+import controller
+import soak
+from input_backends import ScriptedBackend
+
+
+def run(backend: ScriptedBackend, fps: float) -> dict:
+    """Drive the main loop until ``backend`` finishes and the queue drains."""
+    import main
+
+    frame_time = 1.0 / fps if fps > 0 else 0.0
+    depths: list[int] = []
+    handled = 0
+    busy = 0.0
+    start = time.perf_counter()
+    controller.init(backend)
+    try:
+        while True:
+            frame_start = time.perf_counter()
+            events = [
+                event for event in pygame.event.get()
+                if event.type in (pygame.KEYDOWN, pygame.KEYUP)
+            ]
+            depths.append(len(events))
+            events = controller.coalesce(events)
+            main.step(events)
+            handled += len(events)
+            busy += time.perf_counter() - frame_start
+            if backend.done.is_set() and not events and not pygame.event.peek():
+                break
+            delay = frame_time - (time.perf_counter() - frame_start)
+            if delay > 0:
+                time.sleep(delay)
+    finally:
+        controller.cleanup()
+    elapsed = time.perf_counter() - start
+    depths.sort()
+    return {
+        "fed": backend.fed,
+        "handled": handled,
+        "dropped": controller.dropped,
+        "frames": len(depths),
+        "elapsed": elapsed,
+        "throughput": handled / busy if busy else 0.0,
+        "depth_mean": sum(depths) / len(depths),
+        "depth_p99": depths[int(len(depths) * 0.99)],
+        "depth_max": depths[-1],
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", help="timestamped event file to replay")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="playback speed for --script (0 = flat out)")
+    parser.add_argument("--rate", type=float, default=1000.0,
+                        help="synthetic edges per second")
+    parser.add_argument("--count", type=int, default=5000,
+                        help="synthetic key taps to generate")
+    parser.add_argument("--fps", type=float, default=30.0,
+                        help="main loop frame rate (0 = as fast as possible)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    soak.setup()
+    pygame.init()
+    if args.script:
+        backend = ScriptedBackend.from_file(args.script, args.speed)
+    else:
+        backend = ScriptedBackend.burst(args.rate, args.count, seed=args.seed)
+
+    result = run(backend, args.fps)
+    print(f"fed {result['fed']} edges, handled {result['handled']} events "
+          f"in {result['frames']} frames ({result['elapsed']:.2f}s), "
+          f"dropped {result['dropped']}")
+    print(f"handler throughput: {result['throughput']:,.0f} events/s")
+    print(f"queue depth per frame: mean {result['depth_mean']:.1f}, "
+          f"p99 {result['depth_p99']}, max {result['depth_max']}")
+
+
+if __name__ == "__main__":
+    main()
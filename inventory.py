@@ -1,6 +1,9 @@
 """Simple interactive inventory for the virtual pet."""
 
+import threading
 import pygame
+import events
+import savestate
 
 
 # Items that a cat might have
@@ -28,13 +31,60 @@ mode = "browse"
 # Last item "selected" (no effect beyond displaying a message)
 current_item: str | None = None
 
+# Bumped on every change to the items or ``current_item``, so the web
+# remote can tell whether anything changed
+version = 0
+# Held while changing the items, ``current_item`` and ``version``; the web
+# remote changes them from its own threads
+_lock = threading.Lock()
+
+
+def snapshot() -> dict:
+    """Return the version, items and current item as of one moment."""
+    with _lock:
+        return _snapshot()
+
+
+def _snapshot() -> dict:
+    return {"version": version, "items": list(inventory_items), "current": current_item}
+
+
+def _changed() -> None:
+    """Bump ``version`` and send the new inventory to the web remote.
+
+    Must be called with ``_lock`` held.
+    """
+    global version
+    version += 1
+    events.hub.publish("inventory", _snapshot())
+
+
+def add_item(item: str) -> None:
+    """Add ``item`` to the end of the inventory."""
+    with _lock:
+        inventory_items.append(item)
+        _changed()
+
+
+def remove_item(index: int) -> bool:
+    """Remove the item at ``index``; returns ``False`` if there is none."""
+    global selected_index
+    with _lock:
+        if not 0 <= index < len(inventory_items):
+            return False
+        del inventory_items[index]
+        if selected_index >= len(inventory_items):
+            selected_index = max(0, len(inventory_items) - 1)
+        _changed()
+    return True
+
 
 def handle_inventory_event(event) -> bool:
     """Handle key input on the inventory screen.
 
     Returns ``True`` if the caller should exit the inventory screen.
     """
-    global selected_index, action_index, mode, current_item, inventory_items
+    global selected_index, action_index, mode, current_item
 
     if mode == "inspect":
         if event.key in (pygame.K_RETURN, pygame.K_SPACE, pygame.K_ESCAPE):
@@ -55,14 +105,14 @@ def handle_inventory_event(event) -> bool:
                 item = inventory_items[selected_index]
                 action = ACTION_OPTIONS[action_index]
                 if action == "Discard":
-                    del inventory_items[selected_index]
-                    if selected_index >= len(inventory_items):
-                        selected_index = max(0, len(inventory_items) - 1)
+                    remove_item(selected_index)
                     mode = "browse"
                 elif action == "Inspect":
                     mode = "inspect"
                 else:  # Select
-                    current_item = item
+                    with _lock:
+                        current_item = item
+                        _changed()
                     mode = "browse"
         return False
 
@@ -128,3 +178,19 @@ def draw_inventory(screen, FONT):
         screen.blit(msg, (14, 60))
         tip = FONT.render("Press key to return", True, (200, 255, 200))
         screen.blit(tip, (6, 114))
+
+
+def _save_state():
+    return {"items": inventory_items, "current": current_item}
+
+
+def _load_state(data):
+    global inventory_items, current_item, selected_index
+    with _lock:
+        inventory_items = [str(item) for item in data.get("items", inventory_items)]
+        current_item = data.get("current")
+        selected_index = 0
+        _changed()
+
+
+savestate.register("inventory", _save_state, _load_state, lambda: version)
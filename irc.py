@@ -0,0 +1,248 @@
+"""Event-driven IRC client used by the chat screen.
+
+A single background thread waits in ``selectors`` on the server socket and
+one end of a socketpair.  :meth:`IrcClient.send` queues a message and
+writes a byte to the other end, so outgoing messages go out immediately
+and the thread sleeps while nothing happens.
+
+Lost connections are retried with exponential backoff.  A nickname that
+is already taken gets an underscore appended for that connection only;
+:attr:`IrcClient.nick` is the one in use.  A server that stays silent is
+pinged and then dropped after PING_TIMEOUT.
+"""
+
+import collections
+import logging
+import random
+import selectors
+import socket
+import threading
+import time
+import ircproto
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before reconnecting, doubled after every failure
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 60.0
+CONNECT_TIMEOUT = 10.0
+# Ping the server after this long without traffic, and give up on it if
+# nothing arrives within PING_TIMEOUT after that
+PING_INTERVAL = 90.0
+PING_TIMEOUT = 30.0
+# Outgoing messages kept while disconnected
+SEND_QUEUE_SIZE = 50
+RECV_SIZE = 16384
+
+ERR_NICKNAMEINUSE = "433"
+RPL_WELCOME = "001"
+
+
+class IrcClient:
+    """Connection to one channel on one IRC server.
+
+    ``on_message(user, text)`` is called from the client thread for every
+    channel or private message and notice, and ``on_status(text)`` when the
+    connection is made or lost and when people join or leave the channel.
+    ``/me`` actions arrive as messages from ``*``.
+    """
+
+    def __init__(self, server: str, port: int, channel: str, nick: str,
+                 on_message, on_status=None) -> None:
+        self.server = server
+        self.port = port
+        self.channel = channel
+        # Nick asked for on every connection, and the one the server accepted
+        self.configured_nick = nick
+        self.nick = nick
+        self.on_message = on_message
+        self.on_status = on_status or (lambda text: None)
+        self.connected = False
+        self._outgoing: collections.deque[str] = collections.deque(maxlen=SEND_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._running = False
+        self._thread = None
+
+    def start(self) -> None:
+        """Connect in a background thread."""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Disconnect and stop the background thread."""
+        self._running = False
+        self._wake()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def send(self, text: str) -> None:
+        """Queue ``text`` for the channel; it is sent once connected."""
+        with self._lock:
+            self._outgoing.append(text)
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            # The pair is already full of wakeups, which is just as good
+            pass
+
+    def _drain_wakeups(self) -> None:
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _sleep(self, seconds: float) -> None:
+        """Wait ``seconds`` unless :meth:`stop` is called first."""
+        with selectors.DefaultSelector() as sel:
+            sel.register(self._wake_r, selectors.EVENT_READ)
+            deadline = time.monotonic() + seconds
+            while self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sel.select(remaining)
+                self._drain_wakeups()
+
+    def _run(self) -> None:
+        delay = BACKOFF_MIN
+        while self._running:
+            try:
+                self._session()
+                reason = "Disconnected"
+            except Exception as exc:
+                logger.warning(f"IRC connection to {self.server}:{self.port} failed: {exc}")
+                reason = f"Disconnected: {exc}"
+            if not self._running:
+                break
+            if self.connected:
+                # Only a session that got registered resets the backoff
+                self.on_status(reason)
+                delay = BACKOFF_MIN
+            elif delay == BACKOFF_MIN:
+                self.on_status(f"Cannot connect to {self.server}")
+            self.connected = False
+            wait = delay * random.uniform(0.8, 1.2)
+            logger.debug(f"Reconnecting to IRC in {wait:.1f}s")
+            self._sleep(wait)
+            delay = min(delay * 2, BACKOFF_MAX)
+        self.connected = False
+
+    def _dispatch(self, message: ircproto.IrcMessage) -> None:
+        """Pass a channel event from the server on to the callbacks."""
+        command = message.command
+        params = message.params
+        nick = message.nick
+        if command in ("PRIVMSG", "NOTICE") and len(params) >= 2:
+            if params[0] not in (self.channel, self.nick):
+                return
+            text = params[1]
+            request = ircproto.ctcp(text)
+            if request is None:
+                self.on_message(nick if command == "PRIVMSG" else f"-{nick}-", text)
+            elif request[0] == "ACTION":
+                self.on_message("*", f"{nick} {request[1]}")
+        elif command == "JOIN" and params and nick != self.nick:
+            self.on_status(f"{nick} joined {params[0]}")
+        elif command == "PART" and params and nick != self.nick:
+            self.on_status(f"{nick} left {params[0]}")
+
+    def _session(self) -> None:
+        """Run one connection until it closes or fails."""
+        sock = socket.create_connection((self.server, self.port), timeout=CONNECT_TIMEOUT)
+        sock.setblocking(False)
+        sel = selectors.DefaultSelector()
+        out = bytearray()
+        nick = self.configured_nick
+        registered = False
+        framer = ircproto.LineFramer()
+        last_seen = time.monotonic()
+        pinged = False
+
+        def queue(line: str) -> None:
+            out.extend(f"{line}\r\n".encode("utf-8"))
+
+        try:
+            sel.register(self._wake_r, selectors.EVENT_READ)
+            sel.register(sock, selectors.EVENT_READ)
+            queue(f"NICK {nick}")
+            queue(f"USER {nick} 0 * :{nick}")
+            logger.debug(f"Connected to {self.server}:{self.port} as {nick}")
+
+            while self._running:
+                if registered:
+                    with self._lock:
+                        while self._outgoing:
+                            queue(f"PRIVMSG {self.channel} :{self._outgoing.popleft()}")
+                sel.modify(sock, selectors.EVENT_READ | (selectors.EVENT_WRITE if out else 0))
+
+                now = time.monotonic()
+                if pinged:
+                    timeout = last_seen + PING_INTERVAL + PING_TIMEOUT - now
+                else:
+                    timeout = last_seen + PING_INTERVAL - now
+                for key, mask in sel.select(max(0.0, timeout)):
+                    if key.fileobj is self._wake_r:
+                        self._drain_wakeups()
+                        continue
+                    if mask & selectors.EVENT_WRITE and out:
+                        try:
+                            sent = sock.send(out)
+                        except BlockingIOError:
+                            sent = 0
+                        del out[:sent]
+                    if mask & selectors.EVENT_READ:
+                        try:
+                            data = sock.recv(RECV_SIZE)
+                        except BlockingIOError:
+                            continue
+                        if not data:
+                            return
+                        last_seen = time.monotonic()
+                        pinged = False
+                        for line in framer.feed(data):
+                            message = ircproto.parse(line)
+                            if message is None:
+                                continue
+                            command = message.command
+                            if command == "PING":
+                                queue(f"PONG :{message.trailing}")
+                            elif command == RPL_WELCOME:
+                                registered = True
+                                self.nick = nick
+                                self.connected = True
+                                queue(f"JOIN {self.channel}")
+                                self.on_status(f"Connected to {self.server}")
+                            elif command == ERR_NICKNAMEINUSE and not registered:
+                                nick = f"{nick}_"
+                                logger.info(f"IRC nick in use, trying {nick}")
+                                queue(f"NICK {nick}")
+                            else:
+                                self._dispatch(message)
+
+                now = time.monotonic()
+                if not pinged and now - last_seen >= PING_INTERVAL:
+                    queue(f"PING :{self.server}")
+                    pinged = True
+                elif pinged and now - last_seen >= PING_INTERVAL + PING_TIMEOUT:
+                    raise TimeoutError("Ping timeout")
+        finally:
+            sel.close()
+            if self.connected and not self._running:
+                try:
+                    sock.setblocking(True)
+                    sock.settimeout(1)
+                    sock.sendall(out + b"QUIT\r\n")
+                except OSError:
+                    pass
+            sock.close()
@@ -0,0 +1,187 @@
+"""IRC line framing and message parsing.
+
+:class:`LineFramer` collects raw socket data in a ``bytearray`` and only
+decodes complete lines, so a multibyte character split across two
+``recv`` calls is decoded correctly, and a burst of lines is split in one
+pass without copying the rest of the buffer for every line.
+:func:`parse` turns a line into an :class:`IrcMessage` following RFC 1459
+with IRCv3 message tags.
+
+Run ``python3 ircproto.py`` to benchmark both on a large burst.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Longest line accepted: 8191 bytes of tags plus a 512 byte message
+MAX_LINE = 8191 + 512
+
+_TAG_ESCAPES = {":": ";", "s": " ", "\\": "\\", "r": "\r", "n": "\n"}
+
+
+def decode(raw: bytes | bytearray) -> str:
+    """Decode a line as UTF-8, falling back to Latin-1 for old clients."""
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+class LineFramer:
+    """Split a byte stream into decoded lines."""
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> list[str]:
+        """Add ``data`` and return the lines it completed."""
+        buf = self._buf
+        buf += data
+        end = buf.rfind(b"\n")
+        if end < 0:
+            if len(buf) > MAX_LINE:
+                logger.warning(f"Discarding {len(buf)} bytes without a line ending")
+                buf.clear()
+            return []
+        # Cut every complete line off the front in one step and decode
+        # them together; only a block with bad UTF-8 is decoded per line
+        block = bytes(buf[:end])
+        del buf[:end + 1]
+        try:
+            lines = block.decode("utf-8").split("\n")
+        except UnicodeDecodeError:
+            lines = [decode(raw) for raw in block.split(b"\n")]
+        return [line[:-1] if line.endswith("\r") else line for line in lines if line and line != "\r"]
+
+    def pending(self) -> int:
+        """Return the number of buffered bytes of an incomplete line."""
+        return len(self._buf)
+
+
+class IrcMessage:
+    """One parsed IRC message."""
+
+    __slots__ = ("tags", "prefix", "command", "params")
+
+    def __init__(self, tags: dict, prefix: str, command: str, params: list[str]) -> None:
+        self.tags = tags
+        self.prefix = prefix
+        self.command = command
+        self.params = params
+
+    @property
+    def nick(self) -> str:
+        """Nickname part of the prefix (``nick!user@host``)."""
+        return self.prefix.split("!", 1)[0]
+
+    @property
+    def trailing(self) -> str:
+        """Last parameter, usually the message text."""
+        return self.params[-1] if self.params else ""
+
+    def __repr__(self) -> str:
+        return f"IrcMessage({self.prefix!r}, {self.command!r}, {self.params!r})"
+
+
+def _unescape_tag(value: str) -> str:
+    if "\\" not in value:
+        return value
+    out = []
+    i = 0
+    while i < len(value):
+        ch = value[i]
+        if ch == "\\" and i + 1 < len(value):
+            i += 1
+            out.append(_TAG_ESCAPES.get(value[i], value[i]))
+        elif ch != "\\":
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def parse(line: str) -> IrcMessage | None:
+    """Parse one line without its line ending; ``None`` if it is empty."""
+    tags = {}
+    if line.startswith("@"):
+        raw_tags, _, line = line[1:].partition(" ")
+        for item in raw_tags.split(";"):
+            if item:
+                key, _, value = item.partition("=")
+                tags[key] = _unescape_tag(value)
+        line = line.lstrip(" ")
+    prefix = ""
+    if line.startswith(":"):
+        prefix, _, line = line[1:].partition(" ")
+        line = line.lstrip(" ")
+    if not line:
+        return None
+    head, sep, trailing = line.partition(" :")
+    params = head.split()
+    if sep:
+        params.append(trailing)
+    if not params:
+        return None
+    command = params.pop(0).upper()
+    return IrcMessage(tags, prefix, command, params)
+
+
+def ctcp(text: str) -> tuple[str, str] | None:
+    """Return ``(command, argument)`` for a CTCP message such as ACTION."""
+    if len(text) < 2 or not text.startswith("\x01"):
+        return None
+    body = text[1:-1] if text.endswith("\x01") else text[1:]
+    command, _, arg = body.partition(" ")
+    return command.upper(), arg
+
+
+def _naive_split(chunks: list[bytes]) -> int:
+    """The old str-based splitting, kept for comparison in the benchmark."""
+    buffer = ""
+    count = 0
+    for chunk in chunks:
+        buffer += chunk.decode("utf-8", "ignore")
+        while "\r\n" in buffer:
+            line, buffer = buffer.split("\r\n", 1)
+            count += 1
+    return count
+
+
+def _benchmark(lines: int = 50000, chunk: int = 65536) -> None:
+    import time
+
+    line = "@time=2024-01-01T00:00:00Z :nick{}!user@host PRIVMSG #pet :héllo wörld number {}\r\n"
+    data = "".join(line.format(i % 50, i) for i in range(lines)).encode("utf-8")
+    chunks = [data[i:i + chunk] for i in range(0, len(data), chunk)]
+    print(f"{lines} lines, {len(data) / 1e6:.1f} MB in {len(chunks)} chunks of {chunk} bytes")
+
+    start = time.perf_counter()
+    count = _naive_split(chunks)
+    naive = time.perf_counter() - start
+    print(f"str split:      {naive * 1000:8.1f} ms ({count} lines)")
+
+    framer = LineFramer()
+    start = time.perf_counter()
+    count = sum(len(framer.feed(c)) for c in chunks)
+    framed = time.perf_counter() - start
+    print(f"LineFramer:     {framed * 1000:8.1f} ms ({count} lines)")
+
+    framer = LineFramer()
+    start = time.perf_counter()
+    count = 0
+    for c in chunks:
+        for text in framer.feed(c):
+            if parse(text) is not None:
+                count += 1
+    parsed = time.perf_counter() - start
+    print(f"frame + parse:  {parsed * 1000:8.1f} ms ({count / parsed:,.0f} messages/s)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark IRC framing and parsing")
+    parser.add_argument("--lines", type=int, default=50000)
+    parser.add_argument("--chunk", type=int, default=65536)
+    args = parser.parse_args()
+    _benchmark(args.lines, args.chunk)
@@ -0,0 +1,94 @@
+"""Desktop client for the virtual pet's UDP remote joystick.
+
+Opens a small pygame window and forwards the arrow keys, Enter, Space,
+Escape and Tab to the device as they are pressed and released::
+
+    python3 joystick_client.py 192.168.0.42
+
+This file is self-contained so it can be copied to any machine with
+pygame installed.  The packet format must match ``udp_joystick.py``.
+"""
+
+import argparse
+import socket
+import struct
+import pygame
+
+PACKET = struct.Struct("!2sBBIBB")
+MAGIC = b"VJ"
+PROTOCOL_VERSION = 1
+KIND_KEY = 0
+KIND_KEEPALIVE = 1
+
+# Same order as udp_joystick.KEY_ORDER
+KEYS = [
+    pygame.K_UP,
+    pygame.K_DOWN,
+    pygame.K_LEFT,
+    pygame.K_RIGHT,
+    pygame.K_RETURN,
+    pygame.K_SPACE,
+    pygame.K_ESCAPE,
+    pygame.K_TAB,
+]
+
+# Seconds between keepalives while a key is held; must be well below
+# udp_joystick.HOLD_TIMEOUT
+KEEPALIVE_INTERVAL = 0.25
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Remote joystick client")
+    parser.add_argument("host", help="address of the virtual pet")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.connect((args.host, args.port))
+    seq = 0
+
+    def send(kind: int, key_idx: int = 0, pressed: bool = False) -> None:
+        nonlocal seq
+        seq = (seq + 1) % 2**32
+        sock.send(PACKET.pack(MAGIC, PROTOCOL_VERSION, kind, seq, key_idx, pressed))
+
+    pygame.init()
+    screen = pygame.display.set_mode((240, 80))
+    pygame.display.set_caption("Virtual Pet joystick")
+    font = pygame.font.SysFont("monospace", 14)
+    clock = pygame.time.Clock()
+    held: set[int] = set()
+    since_keepalive = 0
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type in (pygame.KEYDOWN, pygame.KEYUP) and event.key in KEYS:
+                pressed = event.type == pygame.KEYDOWN
+                idx = KEYS.index(event.key)
+                send(KIND_KEY, idx, pressed)
+                if pressed:
+                    held.add(idx)
+                else:
+                    held.discard(idx)
+
+        since_keepalive += clock.tick(60)
+        if held and since_keepalive >= KEEPALIVE_INTERVAL * 1000:
+            send(KIND_KEEPALIVE)
+            since_keepalive = 0
+
+        screen.fill((30, 40, 80))
+        names = " ".join(pygame.key.name(KEYS[i]) for i in sorted(held)) or "-"
+        screen.blit(font.render(f"-> {args.host}:{args.port}", True, (255, 255, 255)), (8, 10))
+        screen.blit(font.render(f"held: {names}", True, (200, 220, 255)), (8, 40))
+        pygame.display.flip()
+
+    # Release anything still held so the device does not wait for the timeout
+    for idx in held:
+        send(KIND_KEY, idx, False)
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,7 @@ from luma.core.interface.serial import spi
 from luma.core.render import canvas
 from luma.lcd.device import st7735
 from inventory import handle_inventory_event
-from chat import init_chat, chat_lines, handle_chat_event
+from chat import init_chat, handle_chat_event
 from settings import (
     handle_settings_event,
     handle_sound_event,
@@ -24,9 +24,11 @@ from tetris import (
     stop_music,
 )
 from typer import handle_type_event
-from news import init_news, handle_news_event, draw_news
+from news import init_news, handle_news_event, draw_news, configure_layout
 import remote
 import controller
+import savestate
+import udp_joystick
 from battle import (
     handle_battle_menu_event,
     start_practice_battle,
@@ -43,7 +45,6 @@ if not logger.handlers:
     )
     logger.addHandler(handler)
 logger.setLevel(logging.DEBUG)
-logger.info("Virtual Pet starting")
 
 # Configure pygame to use the LCD HAT's framebuffer if running on the Pi
 # Environment settings for the old pygame framebuffer output are kept
@@ -52,24 +53,8 @@ logger.info("Virtual Pet starting")
 # os.environ.setdefault("SDL_FBDEV", "/dev/fb1")
 # os.environ.setdefault("SDL_NOMOUSE", "1")
 
-pygame.init()  # Still needed for event handling from controller
-logger.debug("pygame initialised")
-controller.init()
-logger.debug("Controller initialised")
 SIZE = 128
 
-# SPI interface for the LCD; verify the GPIO numbers for your HAT
-serial = spi(port=0, device=0, gpio_DC=24, gpio_RST=25, gpio_CS=8)
-logger.debug("SPI interface created")
-
-# Initialize the ST7735 display. h_offset and v_offset may need tuning.
-try:
-    device = st7735(serial, width=SIZE, height=SIZE, h_offset=2, v_offset=1)
-    logger.info("ST7735 display initialised")
-except Exception as exc:
-    logger.exception(f"Failed to initialise display: {exc}")
-    raise
-
 # pygame screen no longer used
 # screen = pygame.display.set_mode((SIZE, SIZE), pygame.FULLSCREEN)
 # pygame.display.set_caption("Virtual Pet")
@@ -79,6 +64,7 @@ FONT = ImageFont.truetype(
 BIGFONT = ImageFont.truetype(
     "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 15
 )
+configure_layout(FONT, SIZE)
 
 
 menu_options = [
@@ -103,127 +89,197 @@ prev_state = state
 
 running = True
 
-try:
-    while running:
-        prev_state = state
-        now = time.time()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN:
-                if state == "menu":
-                    if event.key in [pygame.K_UP, pygame.K_DOWN]:
-                        if event.key == pygame.K_UP:
-                            selected = (selected - 1) % len(menu_options)
-                        else:
-                            selected = (selected + 1) % len(menu_options)
-                        if selected < menu_scroll:
-                            menu_scroll = selected
-                        elif selected >= menu_scroll + MAX_VISIBLE:
-                            menu_scroll = selected - MAX_VISIBLE + 1
-                        menu_scroll = max(0, min(menu_scroll, len(menu_options) - MAX_VISIBLE))
-                    elif event.key in [pygame.K_RETURN, pygame.K_SPACE]:
-                        state = menu_options[selected]
-                        if state == "Chat":
-                            init_chat()
-                        elif state == "News":
-                            init_news()
-                        elif state == "Remote":
-                            remote.start_server()
-                        elif state == "Tetris":
-                            reset_tetris()
+# Screens that can be resumed after a restart; the others need setup
+# (network connections, music) that only happens when entered from the menu
+RESUMABLE = {
+    "menu", "Inventory", "Battle", "BattlePractice", "Settings",
+    "SoundSettings", "Snake", "Pong", "Type",
+}
+
+
+def _save_state():
+    return {"state": state, "selected": selected, "menu_scroll": menu_scroll}
+
+
+def _load_state(data):
+    global state, selected, menu_scroll
+    selected = data.get("selected", 0) % len(menu_options)
+    menu_scroll = max(0, min(data.get("menu_scroll", 0), len(menu_options) - MAX_VISIBLE))
+    saved = data.get("state", "menu")
+    state = saved if saved in RESUMABLE else "menu"
+
+
+savestate.register("main", _save_state, _load_state)
+
+
+def handle_event(event) -> None:
+    """Update the screen state machine for a single pygame ``event``."""
+    global running, state, selected, menu_scroll
+    if event.type == pygame.QUIT:
+        running = False
+    elif event.type == pygame.KEYDOWN:
+        if state == "menu":
+            if event.key in [pygame.K_UP, pygame.K_DOWN]:
+                if event.key == pygame.K_UP:
+                    selected = (selected - 1) % len(menu_options)
                 else:
-                    if state == "Type":
-                        if event.key == pygame.K_ESCAPE:
-                            state = "menu"
-                        else:
-                            handle_type_event(event)
-                    elif state == "Battle":
-                        selection = handle_battle_menu_event(event)
-                        if selection == "Practice":
-                            start_practice_battle()
-                            state = "BattlePractice"
-                        elif selection == "GameLink":
-                            state = "BattleGameLink"
-                        elif event.key == pygame.K_ESCAPE:
-                            state = "menu"
-                    elif state == "BattlePractice":
-                        if handle_practice_event(event):
-                            state = "Battle"
-                    elif state == "BattleGameLink":
-                        if handle_gamelink_event(event):
-                            state = "Battle"
-                    elif state == "Settings":
-                        if event.key == pygame.K_RETURN:
-                            option = settings.settings_options[settings.selected_option]
-                            if option["name"] == "Sound":
-                                state = "SoundSettings"
-                            else:
-                                state = "menu"
-                        else:
-                            handle_settings_event(event)
-                    elif state == "SoundSettings":
-                        if event.key == pygame.K_RETURN:
-                            state = "Settings"
-                        else:
-                            handle_sound_event(event)
-                    elif state == "Chat":
-                        if event.key == pygame.K_ESCAPE:
-                            state = "menu"
-                        else:
-                            handle_chat_event(event)
-                    elif state == "News":
-                        if handle_news_event(event):
-                            state = "menu"
-                    elif state == "Inventory":
-                        if handle_inventory_event(event):
-                            state = "menu"
-                    elif state == "Remote":
-                        if event.key in (pygame.K_RETURN, pygame.K_SPACE, pygame.K_ESCAPE):
-                            state = "menu"
-                    elif event.key in [pygame.K_RETURN, pygame.K_SPACE]:
-                        state = "menu"
-                    elif state == "Snake":
-                        handle_snake_event(event)
-                    elif state == "Pong":
-                        handle_pong_event(event)
-                    elif state == "Tetris":
-                        handle_tetris_event(event)
-
-            elif event.type == pygame.KEYUP:
-                if state == "Pong":
-                    handle_pong_event(event)
-
-        # Stop Tetris music when leaving the screen
-        if prev_state == "Tetris" and state != "Tetris":
-            stop_music()
-
-        # Draw current screen on the SPI LCD
-        try:
-            with canvas(device) as draw:
-                logger.debug(f"Rendering state: {state}")
-                draw.rectangle(device.bounding_box, outline="black", fill="black")
-                if state == "menu":
-                    draw.text((10, 5), "Main Menu", font=BIGFONT, fill="white")
-                    visible = menu_options[menu_scroll:menu_scroll + MAX_VISIBLE]
-                    for idx, option in enumerate(visible):
-                        i = menu_scroll + idx
-                        color = "blue" if i == selected else "white"
-                        draw.text((20, 28 + idx * 16), option, font=FONT, fill=color)
+                    selected = (selected + 1) % len(menu_options)
+                if selected < menu_scroll:
+                    menu_scroll = selected
+                elif selected >= menu_scroll + MAX_VISIBLE:
+                    menu_scroll = selected - MAX_VISIBLE + 1
+                menu_scroll = max(0, min(menu_scroll, len(menu_options) - MAX_VISIBLE))
+            elif event.key in [pygame.K_RETURN, pygame.K_SPACE]:
+                state = menu_options[selected]
+                if state == "Chat":
+                    init_chat()
                 elif state == "News":
-                    draw_news(draw, FONT, SIZE, SIZE)
+                    init_news()
+                elif state == "Remote":
+                    remote.start_server()
+                elif state == "Tetris":
+                    reset_tetris()
+        else:
+            if state == "Type":
+                if event.key == pygame.K_ESCAPE:
+                    state = "menu"
+                else:
+                    handle_type_event(event)
+            elif state == "Battle":
+                selection = handle_battle_menu_event(event)
+                if selection == "Practice":
+                    start_practice_battle()
+                    state = "BattlePractice"
+                elif selection == "GameLink":
+                    state = "BattleGameLink"
+                elif event.key == pygame.K_ESCAPE:
+                    state = "menu"
+            elif state == "BattlePractice":
+                if handle_practice_event(event):
+                    state = "Battle"
+            elif state == "BattleGameLink":
+                if handle_gamelink_event(event):
+                    state = "Battle"
+            elif state == "Settings":
+                if event.key == pygame.K_RETURN:
+                    option = settings.settings_options[settings.selected_option]
+                    if option["name"] == "Sound":
+                        state = "SoundSettings"
+                    else:
+                        state = "menu"
+                else:
+                    handle_settings_event(event)
+            elif state == "SoundSettings":
+                if event.key == pygame.K_RETURN:
+                    state = "Settings"
                 else:
-                    draw.text((10, 54), f"{state} screen", font=FONT, fill="white")
-        except Exception as exc:
-            logger.exception(f"Failed to render frame: {exc}")
-
-        time.sleep(1/30)
-
-except KeyboardInterrupt:
-    logger.info("Exiting due to KeyboardInterrupt")
-finally:
-    controller.cleanup()
-    pygame.quit()
-    logger.info("Virtual Pet stopped")
-    sys.exit()
+                    handle_sound_event(event)
+            elif state == "Chat":
+                if event.key == pygame.K_ESCAPE:
+                    state = "menu"
+                else:
+                    handle_chat_event(event)
+            elif state == "News":
+                if handle_news_event(event):
+                    state = "menu"
+            elif state == "Inventory":
+                if handle_inventory_event(event):
+                    state = "menu"
+            elif state == "Remote":
+                if event.key in (pygame.K_RETURN, pygame.K_SPACE, pygame.K_ESCAPE):
+                    state = "menu"
+            elif event.key in [pygame.K_RETURN, pygame.K_SPACE]:
+                state = "menu"
+            elif state == "Snake":
+                handle_snake_event(event)
+            elif state == "Pong":
+                handle_pong_event(event)
+            elif state == "Tetris":
+                handle_tetris_event(event)
+
+    elif event.type == pygame.KEYUP:
+        if state == "Pong":
+            handle_pong_event(event)
+
+
+def step(events) -> None:
+    """Process one frame worth of ``events`` and run screen transitions."""
+    global prev_state
+    prev_state = state
+    for event in events:
+        handle_event(event)
+
+    # Stop Tetris music when leaving the screen
+    if prev_state == "Tetris" and state != "Tetris":
+        stop_music()
+
+
+def render(draw, image) -> None:
+    """Draw the current screen using the Pillow ``draw`` handle on ``image``."""
+    logger.debug(f"Rendering state: {state}")
+    draw.rectangle((0, 0, SIZE - 1, SIZE - 1), outline="black", fill="black")
+    if state == "menu":
+        draw.text((10, 5), "Main Menu", font=BIGFONT, fill="white")
+        visible = menu_options[menu_scroll:menu_scroll + MAX_VISIBLE]
+        for idx, option in enumerate(visible):
+            i = menu_scroll + idx
+            color = "blue" if i == selected else "white"
+            draw.text((20, 28 + idx * 16), option, font=FONT, fill=color)
+    elif state == "News":
+        draw_news(draw, image, FONT, SIZE, SIZE)
+    else:
+        draw.text((10, 54), f"{state} screen", font=FONT, fill="white")
+
+
+def main() -> None:
+    """Initialise the hardware and run the main loop."""
+    logger.info("Virtual Pet starting")
+    pygame.init()  # Still needed for event handling from controller
+    logger.debug("pygame initialised")
+    controller.init()
+    logger.debug("Controller initialised")
+    udp_joystick.start()
+
+    # SPI interface for the LCD; verify the GPIO numbers for your HAT
+    serial = spi(port=0, device=0, gpio_DC=24, gpio_RST=25, gpio_CS=8)
+    logger.debug("SPI interface created")
+
+    # Initialize the ST7735 display. h_offset and v_offset may need tuning.
+    try:
+        device = st7735(serial, width=SIZE, height=SIZE, h_offset=2, v_offset=1)
+        logger.info("ST7735 display initialised")
+    except Exception as exc:
+        logger.exception(f"Failed to initialise display: {exc}")
+        raise
+
+    restored = savestate.restore()
+    if restored:
+        logger.info(f"Restored save state: {', '.join(restored)}")
+
+    try:
+        while running:
+            step(controller.coalesce(pygame.event.get()))
+            savestate.maybe_snapshot()
+
+            # Draw current screen on the SPI LCD
+            try:
+                frame = canvas(device)
+                with frame as draw:
+                    render(draw, frame.image)
+            except Exception as exc:
+                logger.exception(f"Failed to render frame: {exc}")
+
+            time.sleep(1/30)
+
+    except KeyboardInterrupt:
+        logger.info("Exiting due to KeyboardInterrupt")
+    finally:
+        savestate.flush()
+        controller.cleanup()
+        pygame.quit()
+        logger.info("Virtual Pet stopped")
+        sys.exit()
+
+
+if __name__ == "__main__":
+    main()
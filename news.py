@@ -1,17 +1,50 @@
 # New York Times Top Stories viewer for the virtual pet
 
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
 import pygame
 import webbrowser
+import feeds
+import textlayout
+import thumbnails
+from utils import atomic_write, data_path
 
-# Placeholder for your NYT API key
-NYT_API_KEY = "YOUR_NYT_API_KEY_HERE"
+logger = logging.getLogger(__name__)
+
+# Placeholder for your NYT API key; set VIRTUALPET_NYT_API_KEY instead
+NYT_API_KEY = os.environ.get("VIRTUALPET_NYT_API_KEY", "YOUR_NYT_API_KEY_HERE")
+# Top Stories API; point it at fakenyt.py for testing
+NEWS_URL = os.environ.get("VIRTUALPET_NEWS_URL", "https://api.nytimes.com/svc/topstories/v2")
+# Seconds between background refreshes
+REFRESH_INTERVAL = float(os.environ.get("VIRTUALPET_NEWS_REFRESH", "900"))
+# Sections shown, in order; each story is listed under the first one.
+# Besides NYT sections these can be RSS/Atom URLs, files or directories
+# (see feeds.source).
+SECTIONS = [
+    name.strip()
+    for name in os.environ.get("VIRTUALPET_NEWS_SECTIONS", "home,world,technology,science").split(",")
+    if name.strip()
+]
+SOURCES = [feeds.source(spec, NEWS_URL, NYT_API_KEY) for spec in SECTIONS]
+# Sections fetched at the same time
+MAX_FETCHERS = 3
+# Last response per section, so stories show instantly and refreshes can be conditional
+CACHE_PATH = data_path("news.json")
 
 # Visible lines for listing stories
 MAX_VISIBLE = 6
 
-# Fetched list of stories
+# Fetched list of stories.  The fetch thread replaces the list as a
+# whole, so readers can keep using the one they picked up.
 stories = []
+# Shown in the list header while there is something to report
+status = ""
 
 # Current selection and scroll position in the list
 selected = 0
@@ -23,56 +56,213 @@ mode = "list"
 # Scroll offset when viewing a story
 story_scroll = 0
 
+# Font and width that stories are laid out for as they arrive, set by
+# configure_layout.  Each story keeps its wrapped lines in ``layout``.
+_layout_font = None
+_layout_width = 0
+
+# Background fetch state
+_cache: dict[str, dict] = {}
+_cache_lock = threading.Lock()
+_session: requests.Session | None = None
+_executor: ThreadPoolExecutor | None = None
+_worker: threading.Thread | None = None
+_wake = threading.Event()
+# The list ``selected`` refers to
+_shown: list = []
+
 
 def wrap_text(text: str, font, width: int) -> list[str]:
     """Wrap text to fit within a given pixel width."""
-    words = text.split(" ")
-    lines: list[str] = []
-    current = ""
-    for word in words:
-        candidate = word if not current else f"{current} {word}"
-        if font.getsize(candidate)[0] <= width:
-            current = candidate
-            continue
-        if current:
-            lines.append(current)
-            current = ""
-        while word and font.getsize(word)[0] > width:
-            end = len(word)
-            while end > 0 and font.getsize(word[:end])[0] > width:
-                end -= 1
-            if end == 0:
-                break
-            lines.append(word[:end])
-            word = word[end:]
-        current = word
-    if current:
-        lines.append(current)
-    return lines
+    return textlayout.wrap(text, font, width)
 
 
-def init_news() -> None:
-    """Fetch the top stories from the NYT API."""
-    global stories, selected, scroll
-    url = (
-        "https://api.nytimes.com/svc/topstories/v2/home.json"
-        f"?api-key={NYT_API_KEY}"
-    )
+def configure_layout(font, width: int) -> None:
+    """Lay stories out in the background for ``font`` on a ``width`` screen."""
+    global _layout_font, _layout_width
+    _layout_font = font
+    _layout_width = width
+
+
+def _story_layout(story: feeds.Story, font, width: int) -> tuple[str, list[str]]:
+    """Return the list title line and the story lines, wrapping them once."""
+    key = (id(font), width)
+    layout = story.layout
+    if layout is None or layout[0] != key:
+        lines = wrap_text(f"{story.title}\n\n{story.abstract}", font, width - 4)
+        title_line = (wrap_text(story.title, font, width - 4) or [""])[0]
+        layout = story.layout = (key, title_line, lines)
+    return layout[1], layout[2]
+
+
+def _lay_out(items: list[feeds.Story]) -> None:
+    font = _layout_font
+    if font is not None:
+        for story in items:
+            _story_layout(story, font, _layout_width)
+
+
+def _load_cache() -> dict:
     try:
-        resp = requests.get(url, timeout=5)
-        data = resp.json()
-        stories = [
-            {
-                "title": item.get("title", ""),
-                "abstract": item.get("abstract", ""),
-                "url": item.get("url", ""),
+        with open(CACHE_PATH, "rb") as fh:
+            data = json.load(fh)
+        if isinstance(data, dict) and isinstance(data.get("sections"), dict):
+            return {
+                name: dict(entry, stories=[feeds.Story.from_dict(story) for story in entry["stories"]])
+                for name, entry in data["sections"].items()
             }
-            for item in data.get("results", [])
-        ]
-    except Exception as exc:  # pragma: no cover - network issues shown onscreen
-        stories = [{"title": f"Error: {exc}", "abstract": "", "url": ""}]
+        logger.warning(f"Ignoring {CACHE_PATH}: unexpected contents")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as exc:
+        logger.warning(f"Ignoring unreadable {CACHE_PATH}: {exc}")
+    return {}
+
+
+def _save_cache() -> None:
+    with _cache_lock:
+        sections = {
+            name: dict(entry, stories=[story.to_dict() for story in entry["stories"]])
+            for name, entry in _cache.items()
+        }
+    try:
+        atomic_write(CACHE_PATH, json.dumps({"sections": sections}).encode("utf-8"))
+    except OSError as exc:
+        logger.warning(f"Failed to save {CACHE_PATH}: {exc}")
+
+
+def _merge() -> list[feeds.Story]:
+    """Return the stories of every section in order, each URL only once."""
+    merged = []
+    seen = set()
+    with _cache_lock:
+        for source in SOURCES:
+            for story in _cache.get(source.name, {}).get("stories", []):
+                url = story.url
+                if url:
+                    if url in seen:
+                        continue
+                    seen.add(url)
+                merged.append(story)
+    return merged
+
+
+def _fetch(source: feeds.FeedSource) -> bool:
+    """Fetch one section; returns ``True`` if its stories changed."""
+    with _cache_lock:
+        entry = _cache.get(source.name, {})
+    items, validators = source.fetch(_session, entry.get("validators", {}))
+    changed = items is not None
+    if changed:
+        _lay_out(items)
+        for story in items:
+            thumbnails.request(story.image)
+        entry = {"stories": items}
+    with _cache_lock:
+        _cache[source.name] = dict(entry, validators=validators, fetched=time.time())
+    return changed
+
+
+def _refresh(sections: list[feeds.FeedSource]) -> None:
+    """Fetch ``sections`` at once, showing each one as soon as it arrives."""
+    global stories, status
+    try:
+        futures = {_executor.submit(_fetch, source): source.name for source in sections}
+    except RuntimeError:
+        # The interpreter is exiting
+        return
+    error = None
+    for done, future in enumerate(as_completed(futures), 1):
+        try:
+            if future.result():
+                stories = _merge()
+        except (requests.RequestException, OSError, ValueError) as exc:
+            logger.warning(f"News fetch for {futures[future]} failed: {exc}")
+            error = exc
+        except Exception as exc:
+            # A bug in one section must not stop the refresh thread
+            logger.exception(f"News fetch for {futures[future]} crashed: {exc}")
+            error = exc
+        status = f"{done}/{len(futures)}" if done < len(futures) else ""
+    if error is not None:
+        if stories:
+            status = "offline"
+        else:
+            stories = [feeds.Story(f"Error: {error}")]
+    _save_cache()
+
+
+def _stale() -> tuple[list[feeds.FeedSource], float]:
+    """Return the sections due for a refresh and the seconds until the next."""
+    now = time.time()
+    due = []
+    wait = REFRESH_INTERVAL
+    with _cache_lock:
+        for source in SOURCES:
+            age = now - _cache.get(source.name, {}).get("fetched", 0)
+            if age >= REFRESH_INTERVAL:
+                due.append(source)
+            else:
+                wait = min(wait, REFRESH_INTERVAL - age)
+    return due, wait
+
+
+def _run() -> None:
+    _lay_out(stories)
+    while True:
+        due, wait = _stale()
+        if due:
+            _refresh(due)
+            # Sections that failed wait for the next visit or refresh
+            wait = _stale()[1]
+        _wake.wait(wait)
+        _wake.clear()
+
+
+def init_news() -> None:
+    """Show the cached top stories and refresh them in the background."""
+    global stories, selected, scroll, status, _cache, _session, _executor, _worker, _shown
+    if _worker is None:
+        _cache = _load_cache()
+        stories = _merge()
+        status = "" if stories else "Loading..."
+        # One keep-alive connection per fetch thread
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_FETCHERS)
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+        _executor = ThreadPoolExecutor(MAX_FETCHERS, thread_name_prefix="news")
+        thumbnails.start()
+        _worker = threading.Thread(target=_run, name="news", daemon=True)
+        _worker.start()
+    elif _stale()[0]:
+        _wake.set()
     selected = 0
     scroll = 0
+    _shown = stories
+
+
+def _follow_selection() -> None:
+    """Keep the same story selected when a refresh replaces the list."""
+    global selected, scroll, mode, _shown
+    items = stories
+    if items is _shown:
+        return
+    url = _shown[selected].url if selected < len(_shown) else None
+    if url:
+        for i, story in enumerate(items):
+            if story.url == url:
+                selected = i
+                break
+    _shown = items
+    if selected >= len(items):
+        selected = max(0, len(items) - 1)
+    if not items:
+        mode = "list"
+    if selected < scroll:
+        scroll = selected
+    elif selected >= scroll + MAX_VISIBLE:
+        scroll = selected - MAX_VISIBLE + 1
 
 
 def handle_news_event(event) -> bool:
@@ -81,6 +271,7 @@ def handle_news_event(event) -> bool:
     Returns ``True`` when the caller should exit to the main menu.
     """
     global selected, scroll, mode, story_scroll
+    _follow_selection()
     if mode == "list":
         if event.key == pygame.K_UP:
             if stories:
@@ -106,40 +297,47 @@ def handle_news_event(event) -> bool:
         elif event.key == pygame.K_DOWN:
             story_scroll += 1
         elif event.key == pygame.K_SPACE:
-            story = stories[selected]
-            url = story.get("url")
-            if url:
-                webbrowser.open(url)
+            if selected < len(stories):
+                url = stories[selected].url
+                if url:
+                    webbrowser.open(url)
         elif event.key == pygame.K_TAB:  # back to list
             mode = "list"
     return False
 
 
-def draw_news(draw, font, width: int, height: int) -> None:
-    """Render the news screen using ``draw`` from Pillow."""
+def draw_news(draw, image, font, width: int, height: int) -> None:
+    """Render the news screen using ``draw`` from Pillow on ``image``."""
     global story_scroll
     draw.rectangle((0, 0, width, height), outline="black", fill="black")
+    _follow_selection()
+    items = _shown
     if mode == "list":
-        draw.text((2, 2), "Top Stories", font=font, fill="white")
-        visible = stories[scroll:scroll + MAX_VISIBLE]
+        draw.text((2, 2), f"Top Stories {status}", font=font, fill="white")
+        visible = items[scroll:scroll + MAX_VISIBLE]
         for idx, story in enumerate(visible):
             i = scroll + idx
             color = "yellow" if i == selected else "white"
-            title = story.get("title", "")
-            line = wrap_text(title, font, width - 4)[0]
+            line, _ = _story_layout(story, font, width)
             draw.text((2, 18 + idx * 16), line, font=font, fill=color)
         draw.text((2, height - 14), "SPACE=Open TAB=Back", font=font, fill="cyan")
     else:
-        story = stories[selected]
-        text = f"{story.get('title', '')}\n\n{story.get('abstract', '')}"
-        lines = wrap_text(text, font, width - 4)
+        story = items[selected]
+        _, lines = _story_layout(story, font, width)
+        # The picture, once loaded, scrolls with the text as the first
+        # few lines of the story
+        thumb = thumbnails.get(story.image) if story.image else None
+        image_lines = -(-thumb.height // 16) if thumb is not None else 0
         visible_lines = height // 16 - 1
-        if story_scroll > len(lines) - visible_lines:
-            story_scroll = max(0, len(lines) - visible_lines)
-        start = story_scroll
-        end = start + visible_lines
-        y = 2
-        for line in lines[start:end]:
+        if story_scroll > image_lines + len(lines) - visible_lines:
+            story_scroll = max(0, image_lines + len(lines) - visible_lines)
+        if story_scroll < image_lines:
+            image.paste(thumb, ((width - thumb.width) // 2, 2 - story_scroll * 16))
+        start = max(0, story_scroll - image_lines)
+        y = 2 + max(0, image_lines - story_scroll) * 16
+        for line in lines[start:]:
+            if y > height - 30:
+                break
             draw.text((2, y), line, font=font, fill="white")
             y += 16
         draw.text((2, height - 14), "SPACE=Browser TAB=Back", font=font, fill="cyan")
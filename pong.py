@@ -1,5 +1,6 @@
 import pygame
 import random
+import savestate
 
 WIDTH, HEIGHT = 128, 128
 PADDLE_W, PADDLE_H = 4, 20
@@ -101,3 +102,15 @@ def draw_pong(screen, FONT):
     screen.blit(score_text, (2, 2))
     tip = FONT.render("Arrows=Move  Enter=Back", True, (200, 200, 200))
     screen.blit(tip, (2, 114))
+
+
+def _save_state():
+    return {"high_score": high_score}
+
+
+def _load_state(data):
+    global high_score
+    high_score = data.get("high_score", 0)
+
+
+savestate.register("pong", _save_state, _load_state)
@@ -1,54 +1,269 @@
+import hashlib
 import http.server
+import json
 import threading
 import time
 import urllib.parse
 import html
+import events
 import settings
 import chat
 import inventory
 
 _server_thread = None
 
-class RemoteHandler(http.server.BaseHTTPRequestHandler):
-    def do_GET(self):
-        parsed = urllib.parse.urlparse(self.path)
-        if parsed.path == "/":
-            self.send_response(200)
-            self.send_header("Content-Type", "text/html")
-            self.end_headers()
-            difficulty = next((o["value"] for o in settings.settings_options if o["name"] == "Difficulty"), "?")
-            wifi = next((o["value"] for o in settings.settings_options if o["name"] == "WiFi"), False)
-            wifi_status = "on" if wifi else "off"
-            chat_html = "".join(
-                f"<p><b>{html.escape(c['user'])}</b>: {html.escape(c['msg'])}</p>"
-                for c in chat.chat_lines[-10:]
-            )
-            inv_html = "".join(
-                f"<li>{html.escape(item)} <a href='/remove_item?idx={i}'>remove</a></li>"
-                for i, item in enumerate(inventory.inventory_items)
-            )
-            html_doc = f"""<html><body><h1>Remote Control</h1>
-<p>Difficulty: {difficulty}</p>
-<p>WiFi: {wifi_status}</p>
+# The page is a fixed shell that loads everything else from the JSON API
+# and then follows changes on the /events stream.  API responses carry an
+# ETag built from version counters, so a reload of something unchanged
+# gets a 304 before any JSON is built.
+_SHELL = """<html><head><meta name='viewport' content='width=device-width' />
+<title>Remote Control</title></head><body><h1>Remote Control</h1>
+<p>Difficulty: <span id='difficulty'>?</span></p>
+<p>WiFi: <span id='wifi'>?</span></p>
 <p>Set difficulty:
-<a href='/set?option=Difficulty&value=Easy'>Easy</a> |
-<a href='/set?option=Difficulty&value=Normal'>Normal</a> |
-<a href='/set?option=Difficulty&value=Hard'>Hard</a></p>
+<button onclick="setOption('Difficulty', 'Easy')">Easy</button>
+<button onclick="setOption('Difficulty', 'Normal')">Normal</button>
+<button onclick="setOption('Difficulty', 'Hard')">Hard</button></p>
 <p>Toggle WiFi:
-<a href='/set?option=WiFi&value=true'>On</a> |
-<a href='/set?option=WiFi&value=false'>Off</a></p>
+<button onclick="setOption('WiFi', true)">On</button>
+<button onclick="setOption('WiFi', false)">Off</button></p>
 <h2>Inventory</h2>
-<ul>{inv_html}</ul>
-<form action='/add_item' method='get'>
+<ul id='inventory'></ul>
+<form onsubmit="post('/api/inventory', {add: this.item.value}); this.item.value = ''; return false;">
 <input type='text' name='item' />
 <input type='submit' value='Add' />
 </form>
 <h2>Chat</h2>
-{chat_html}
-<form action='/send' method='get'>
+<div id='chat'></div>
+<form onsubmit="post('/api/chat', {msg: this.msg.value}); this.msg.value = ''; return false;">
 <input type='text' name='msg' />
 <input type='submit' value='Send' />
 </form>
+<form action='/search' method='get'>
+<input type='text' name='q' />
+<input type='submit' value='Search' />
+</form>
+<script>
+// Versions of what is shown, so an older snapshot never replaces a newer one
+let versions = {settings: -1, inventory: -1};
+let lastSeq = 0;
+let stream = null;
+
+async function get(url) {
+  // The browser revalidates with If-None-Match and reuses its copy on a 304
+  const response = await fetch(url, {cache: 'no-cache'});
+  return response.json();
+}
+
+async function post(url, body) {
+  await fetch(url, {method: 'POST', headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify(body)});
+  // With a stream open the change comes back as an event
+  if (!stream) refresh();
+}
+
+function setOption(option, value) {
+  post('/api/settings', {option: option, value: value});
+}
+
+function line(parent, tag, text) {
+  const node = document.createElement(tag);
+  node.textContent = text;
+  parent.appendChild(node);
+  return node;
+}
+
+function showSettings(data) {
+  if (data.version < versions.settings) return;
+  versions.settings = data.version;
+  document.getElementById('difficulty').textContent = data.settings.Difficulty;
+  document.getElementById('wifi').textContent = data.settings.WiFi ? 'on' : 'off';
+}
+
+function showInventory(data) {
+  if (data.version < versions.inventory) return;
+  versions.inventory = data.version;
+  const list = document.getElementById('inventory');
+  list.replaceChildren();
+  data.items.forEach((item, i) => {
+    const entry = line(list, 'li', item + ' ');
+    const remove = line(entry, 'button', 'remove');
+    remove.onclick = () => post('/api/inventory', {remove: i});
+  });
+}
+
+function showChat(messages) {
+  const box = document.getElementById('chat');
+  for (const message of messages) {
+    if (message.seq <= lastSeq) continue;
+    const entry = line(box, 'p', '');
+    line(entry, 'b', message.user);
+    entry.appendChild(document.createTextNode(': ' + message.msg));
+    lastSeq = message.seq;
+  }
+  while (box.children.length > 10) box.removeChild(box.firstChild);
+}
+
+async function refresh() {
+  try {
+    const state = await get('/api/state');
+    showSettings({version: state.versions.settings, settings: state.settings});
+    if (state.versions.inventory !== versions.inventory) showInventory(await get('/api/inventory'));
+    if (state.versions.chat !== lastSeq) showChat((await get('/api/chat?limit=10&since=' + lastSeq)).messages);
+  } catch (e) {}
+}
+
+function reset() {
+  // Missed events, or the pet restarted: start over from the API
+  versions = {settings: -1, inventory: -1};
+  lastSeq = 0;
+  document.getElementById('chat').replaceChildren();
+  refresh();
+}
+
+if (window.EventSource) {
+  stream = new EventSource('/events');
+  const on = (kind, show) => stream.addEventListener(kind, e => show(JSON.parse(e.data)));
+  on('settings', showSettings);
+  on('inventory', showInventory);
+  on('chat', message => showChat([message]));
+  stream.addEventListener('reset', reset);
+} else {
+  setInterval(refresh, 2000);
+}
+refresh();
+</script>
+</body></html>
+""".encode("utf-8")
+_SHELL_ETAG = f'"{hashlib.sha1(_SHELL).hexdigest()[:16]}"'
+# Version counters restart from zero, so API ETags include the start time
+_EPOCH = f"{time.time_ns():x}"
+# Seconds between comments sent on an idle /events stream, so proxies
+# and the browser keep it open
+KEEPALIVE = 15
+# A stream that cannot take a write for this long is closed
+WRITE_TIMEOUT = 10
+# Most messages one /api/chat response carries
+CHAT_LIMIT = 50
+
+
+class RemoteHandler(http.server.BaseHTTPRequestHandler):
+    def _not_modified(self, etag: str) -> bool:
+        """Answer 304 if the client already has ``etag``."""
+        tags = self.headers.get("If-None-Match")
+        if tags is None or (tags.strip() != "*" and etag not in (t.strip() for t in tags.split(","))):
+            return False
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.end_headers()
+        return True
+
+    def _send_body(self, body: bytes, content_type: str, etag: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        # Cache, but check back every time
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, etag: str, build) -> None:
+        """Send ``build()`` as JSON, unless the client has ``etag`` already."""
+        if not self._not_modified(etag):
+            self._send_body(json.dumps(build()).encode("utf-8"), "application/json", etag)
+
+    def _redirect_home(self) -> None:
+        self.send_response(303)
+        self.send_header("Location", "/")
+        self.end_headers()
+
+    def _stream_events(self) -> None:
+        """Send hub events as server-sent events until the client goes away."""
+        client = events.hub.subscribe(self.headers.get("Last-Event-ID"))
+        if client is None:
+            self.send_error(503, "Too many event streams")
+            return
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.connection.settimeout(WRITE_TIMEOUT)
+            self.wfile.write(b"retry: 2000\n\n")
+            while True:
+                frames = events.hub.wait(client, KEEPALIVE)
+                if frames is None:
+                    # Fell behind; the browser reconnects and catches up
+                    break
+                self.wfile.write(b"".join(frames) if frames else b": keepalive\n\n")
+        except OSError:
+            pass
+        finally:
+            events.hub.unsubscribe(client)
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        if parsed.path == "/":
+            if not self._not_modified(_SHELL_ETAG):
+                self._send_body(_SHELL, "text/html; charset=utf-8", _SHELL_ETAG)
+        elif parsed.path == "/api/state":
+            versions = {
+                "settings": settings.version,
+                "inventory": inventory.version,
+                "chat": chat.history.last_seq,
+            }
+            self._send_json(
+                '"{}-{settings}-{inventory}-{chat}"'.format(_EPOCH, **versions),
+                lambda: {"settings": settings.option_values(), "versions": versions},
+            )
+        elif parsed.path == "/api/chat":
+            params = urllib.parse.parse_qs(parsed.query)
+            try:
+                since = int(params.get("since", ["0"])[0])
+            except ValueError:
+                since = 0
+            try:
+                limit = min(max(int(params.get("limit", [""])[0]), 1), CHAT_LIMIT)
+            except ValueError:
+                limit = CHAT_LIMIT
+            last = chat.history.last_seq
+            # Only the newest ``limit`` messages after ``since``
+            since = max(since, last - limit)
+            self._send_json(f'"{_EPOCH}-{last}-{limit}"', lambda: {
+                "last_seq": last,
+                "messages": [
+                    {"seq": m.seq, "user": m.user, "msg": m.msg, "ts": m.ts}
+                    for m in chat.history.since(since) if m.seq <= last
+                ],
+            })
+        elif parsed.path == "/api/inventory":
+            state = inventory.snapshot()
+            self._send_json(f'"{_EPOCH}-{state["version"]}"', lambda: state)
+        elif parsed.path == "/events":
+            self._stream_events()
+        elif parsed.path == "/search":
+            params = urllib.parse.parse_qs(parsed.query)
+            query = params.get("q", [""])[0]
+            nick = params.get("nick", [""])[0] or None
+            results = chat.search(query, nick=nick) if query or nick else []
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.end_headers()
+            results_html = "".join(
+                f"<p>{time.strftime('%Y-%m-%d %H:%M', time.localtime(c.ts))} "
+                f"<b>{html.escape(c.user)}</b>: {html.escape(c.msg)}</p>"
+                for c in results
+            )
+            html_doc = f"""<html><body><h1>Chat search</h1>
+<form action='/search' method='get'>
+<input type='text' name='q' value='{html.escape(query, quote=True)}' />
+<input type='text' name='nick' placeholder='nick' value='{html.escape(nick or "", quote=True)}' />
+<input type='submit' value='Search' />
+</form>
+<p>{len(results)} found</p>
+{results_html}
+<p><a href='/'>Back</a></p>
 </body></html>"""
             self.wfile.write(html_doc.encode("utf-8"))
         elif parsed.path == "/set":
@@ -59,14 +274,10 @@ class RemoteHandler(http.server.BaseHTTPRequestHandler):
                 for opt in settings.settings_options:
                     if opt["name"] == option:
                         if opt["type"] == "bool":
-                            opt["value"] = value.lower() == "true"
-                            if opt["name"] == "WiFi":
-                                settings.set_wifi_enabled(opt["value"])
-                        elif isinstance(opt["type"], list) and value in opt["type"]:
-                            opt["value"] = value
-                self.send_response(303)
-                self.send_header("Location", "/")
-                self.end_headers()
+                            settings.set_option(option, value.lower() == "true")
+                        elif isinstance(opt["type"], list):
+                            settings.set_option(option, value)
+                self._redirect_home()
             else:
                 self.send_error(400, "Invalid option")
         elif parsed.path == "/send":
@@ -74,30 +285,64 @@ class RemoteHandler(http.server.BaseHTTPRequestHandler):
             msg = params.get("msg", [""])[0]
             if msg:
                 chat.send_chat_message(msg)
-            self.send_response(303)
-            self.send_header("Location", "/")
-            self.end_headers()
+            self._redirect_home()
         elif parsed.path == "/add_item":
             params = urllib.parse.parse_qs(parsed.query)
             item = params.get("item", [""])[0]
             if item:
-                inventory.inventory_items.append(item)
-            self.send_response(303)
-            self.send_header("Location", "/")
-            self.end_headers()
+                inventory.add_item(item)
+            self._redirect_home()
         elif parsed.path == "/remove_item":
             params = urllib.parse.parse_qs(parsed.query)
             try:
                 idx = int(params.get("idx", ["-1"])[0])
             except ValueError:
                 idx = -1
-            if 0 <= idx < len(inventory.inventory_items):
-                del inventory.inventory_items[idx]
-            self.send_response(303)
-            self.send_header("Location", "/")
-            self.end_headers()
+            inventory.remove_item(idx)
+            self._redirect_home()
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        path = urllib.parse.urlparse(self.path).path
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(body, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as exc:
+            self.send_error(400, f"Invalid JSON: {exc}")
+            return
+        if path == "/api/chat":
+            msg = body.get("msg")
+            if not isinstance(msg, str) or not msg:
+                self.send_error(400, "Missing msg")
+                return
+            chat.send_chat_message(msg)
+        elif path == "/api/inventory":
+            if isinstance(body.get("add"), str) and body["add"]:
+                inventory.add_item(body["add"])
+            elif isinstance(body.get("remove"), int) and not isinstance(body["remove"], bool):
+                if not inventory.remove_item(body["remove"]):
+                    self.send_error(404, "No such item")
+                    return
+            else:
+                self.send_error(400, "Expected add or remove")
+                return
+        elif path == "/api/settings":
+            option = body.get("option")
+            try:
+                ok = isinstance(option, str) and settings.set_option(option, body.get("value"))
+            except (TypeError, ValueError):
+                ok = False
+            if not ok:
+                self.send_error(400, "Invalid option")
+                return
         else:
             self.send_error(404)
+            return
+        self.send_response(204)
+        self.end_headers()
 
 
 def start_server(host: str = "0.0.0.0", port: int = 8000) -> None:
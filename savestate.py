@@ -0,0 +1,211 @@
+"""Periodic save-state snapshots restored after a crash or power loss.
+
+Modules register named sections with a ``capture`` function returning
+plain data (numbers, strings, lists, dicts, tuples) and a ``restore``
+function taking that data back.  The main loop calls
+:func:`maybe_snapshot` every frame; every INTERVAL seconds each section is
+captured and serialised as JSON, and the file is rewritten (as a whole,
+atomically) only when some section's bytes changed.  A section registered
+with a ``version`` function is only captured again when that value
+changes; otherwise its previous bytes are reused.
+
+File layout (little endian)::
+
+    b"VPSV"  u16 FORMAT_VERSION  u16 section count
+    per section: u8 name length, name (utf-8), u32 crc32, u32 length, payload
+
+Version 1 files held ``marshal`` payloads, which only the Python version
+that wrote them can be relied on to read; they are still restored when
+possible.
+"""
+
+import json
+import logging
+import marshal
+import struct
+import threading
+import time
+import zlib
+from utils import atomic_write, data_path
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"VPSV"
+FORMAT_VERSION = 2
+MARSHAL_VERSION = 1
+HEADER = struct.Struct("<4sHH")
+SECTION = struct.Struct("<II")
+
+# Seconds between snapshots
+INTERVAL = 5.0
+
+PATH = data_path("savestate.bin")
+
+_sections: dict[str, tuple] = {}  # name -> (capture, restore, version)
+_payloads: dict[str, bytes] = {}  # name -> last serialised payload
+_versions: dict[str, object] = {}  # name -> version of that payload
+_last_snapshot = 0.0
+_write_lock = threading.Lock()
+
+
+def register(name: str, capture, restore, version=None) -> None:
+    """Save ``capture()`` as section ``name`` and feed it to ``restore``.
+
+    ``version``, if given, returns a value that changes whenever the
+    captured data would, so unchanged sections are not captured again.
+    """
+    _sections[name] = (capture, restore, version)
+
+
+def encode(payloads: dict[str, bytes]) -> bytes:
+    """Return the file contents for serialised section ``payloads``."""
+    parts = [HEADER.pack(MAGIC, FORMAT_VERSION, len(payloads))]
+    for name, payload in payloads.items():
+        raw = name.encode("utf-8")
+        parts.append(bytes([len(raw)]) + raw)
+        parts.append(SECTION.pack(zlib.crc32(payload), len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def decode(data: bytes) -> tuple[int, dict[str, bytes]]:
+    """Return the format version and ``{name: payload}`` for every intact
+    section in ``data``.
+
+    Raises ``ValueError`` for a foreign or newer file; sections failing
+    their checksum are skipped.
+    """
+    magic, version, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version not in (MARSHAL_VERSION, FORMAT_VERSION):
+        raise ValueError(f"Unsupported save state {magic!r} v{version}")
+    offset = HEADER.size
+    payloads = {}
+    for _ in range(count):
+        size = data[offset]
+        name = data[offset + 1:offset + 1 + size].decode("utf-8")
+        offset += 1 + size
+        crc, length = SECTION.unpack_from(data, offset)
+        offset += SECTION.size
+        payload = data[offset:offset + length]
+        offset += length
+        if len(payload) != length:
+            raise ValueError("Truncated save state")
+        if zlib.crc32(payload) != crc:
+            logger.warning(f"Skipping corrupt save state section {name}")
+            continue
+        payloads[name] = payload
+    return version, payloads
+
+
+def _dumps(data) -> bytes:
+    return json.dumps(data, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+def snapshot(force: bool = False) -> bool:
+    """Capture every section and write the file if anything changed.
+
+    Capturing happens on the calling thread so the sections are consistent
+    with each other; the file is written on a background thread.  Returns
+    ``True`` if a write was started.
+    """
+    global _last_snapshot
+    _last_snapshot = time.monotonic()
+    changed = force
+    payloads = {}
+    versions = {}
+    for name, (capture, _restore, version) in _sections.items():
+        if version is not None:
+            versions[name] = current = version()
+            if name in _payloads and _versions.get(name) == current:
+                payloads[name] = _payloads[name]
+                continue
+        try:
+            payload = _dumps(capture())
+        except Exception as exc:
+            logger.warning(f"Failed to capture save state {name}: {exc}")
+            payload = _payloads.get(name)
+            if payload is None:
+                continue
+        if _payloads.get(name) != payload:
+            changed = True
+        payloads[name] = payload
+    if not changed:
+        return False
+    if not _write_lock.acquire(blocking=False):
+        # The previous write is still in progress; try again next interval
+        return False
+    _payloads.update(payloads)
+    _versions.update(versions)
+    data = encode(payloads)
+    threading.Thread(target=_write, args=(data,), daemon=True).start()
+    return True
+
+
+def _write(data: bytes) -> None:
+    try:
+        atomic_write(PATH, data)
+    except OSError as exc:
+        logger.warning(f"Failed to write save state: {exc}")
+        # Forget what was "saved" so the next snapshot writes again
+        _payloads.clear()
+        _versions.clear()
+    finally:
+        _write_lock.release()
+
+
+def maybe_snapshot() -> None:
+    """Take a snapshot if INTERVAL seconds have passed since the last one."""
+    if time.monotonic() - _last_snapshot >= INTERVAL:
+        snapshot()
+
+
+def flush() -> None:
+    """Wait for any write in progress, then save synchronously."""
+    with _write_lock:
+        pass
+    if snapshot():
+        with _write_lock:
+            pass
+
+
+def restore() -> list[str]:
+    """Load the save state file and restore every registered section.
+
+    Returns the names of the restored sections.
+    """
+    global _last_snapshot
+    try:
+        with open(PATH, "rb") as fh:
+            file_version, payloads = decode(fh.read())
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, struct.error, IndexError) as exc:
+        logger.warning(f"Ignoring unreadable save state: {exc}")
+        return []
+    restored = []
+    for name, payload in payloads.items():
+        section = _sections.get(name)
+        if section is None:
+            continue
+        try:
+            if file_version == MARSHAL_VERSION:
+                data = marshal.loads(payload)
+            else:
+                data = json.loads(payload)
+        except (ValueError, EOFError, TypeError, UnicodeDecodeError) as exc:
+            if file_version == MARSHAL_VERSION:
+                logger.warning(f"Cannot read save state {name} from an older format, "
+                               f"possibly written by another Python version: {exc}")
+            else:
+                logger.warning(f"Cannot read save state {name}: {exc}")
+            continue
+        try:
+            section[1](data)
+        except Exception as exc:
+            logger.warning(f"Failed to restore save state {name}: {exc}")
+            continue
+        if file_version == FORMAT_VERSION:
+            _payloads[name] = payload
+        restored.append(name)
+    _last_snapshot = time.monotonic()
+    return restored
@@ -1,69 +1,72 @@
 """Interactive settings screen."""
 
+import multiprocessing
+import threading
+import time
 import pygame
-import subprocess
+import actions
+import events
+import sysbackends
+import sysstatus
+from store import JsonStore
+from utils import data_path
+
+
+# Audio and network control; see ``sysbackends`` for the implementations
+audio, network = sysbackends.create()
 
 
 def wifi_enabled():
     """Return True if WiFi radio is enabled."""
     try:
-        out = subprocess.check_output(["nmcli", "radio", "wifi"]).decode().strip()
-        return out.lower() == "enabled"
+        return network.wifi_enabled()
     except Exception:
         return True
 
 
 def set_wifi_enabled(enabled: bool) -> None:
-    """Enable or disable WiFi radio using nmcli."""
-    cmd = ["nmcli", "radio", "wifi", "on" if enabled else "off"]
-    try:
-        subprocess.check_call(cmd)
-    except Exception:
-        pass
+    """Enable or disable the WiFi radio."""
+    network.set_wifi_enabled(enabled)
 
 
 def current_ssid() -> str:
     """Return the SSID of the currently connected network, if any."""
     try:
-        out = subprocess.check_output([
-            "nmcli",
-            "-t",
-            "-f",
-            "active,ssid",
-            "device",
-            "wifi",
-        ]).decode()
-        for line in out.splitlines():
-            if line.startswith("yes:"):
-                return line.split(":", 1)[1] or "unknown"
+        return network.ssid() or "unknown"
     except Exception:
-        pass
-    return "unknown"
+        return "unknown"
 
 
 def set_volume(volume: int) -> None:
-    """Attempt to set system volume using ``amixer``."""
-    level = max(0, min(100, volume))
+    """Set the system volume in percent."""
+    audio.set_volume(max(0, min(100, volume)))
+
+
+def current_volume() -> int | None:
+    """Return the playback volume in percent, if known."""
     try:
-        subprocess.check_call(["amixer", "set", "Master", f"{level}%"])
+        return audio.volume()
     except Exception:
-        pass
+        return None
 
 
-def toggle_bluetooth(on: bool) -> None:
-    """Placeholder for connecting or disconnecting a Bluetooth speaker."""
-    cmd = ["bluetoothctl", "power", "on" if on else "off"]
+def bluetooth_powered() -> bool:
+    """Return True if the Bluetooth controller is powered on."""
     try:
-        subprocess.check_call(cmd)
+        return network.bluetooth_powered()
     except Exception:
-        pass
+        return False
+
+
+def toggle_bluetooth(on: bool) -> None:
+    """Power the Bluetooth controller on or off."""
+    network.set_bluetooth_powered(on)
 
 
 def available_sinks() -> list:
     """Return a list of available sound output sinks."""
     try:
-        out = subprocess.check_output(["pactl", "list", "short", "sinks"]).decode()
-        return [line.split("\t")[1] for line in out.splitlines() if line]
+        return audio.sinks()
     except Exception:
         return ["default"]
 
@@ -71,21 +74,14 @@ def available_sinks() -> list:
 def current_sink() -> str:
     """Return the name of the current default sound sink."""
     try:
-        out = subprocess.check_output(["pactl", "info"]).decode()
-        for line in out.splitlines():
-            if line.lower().startswith("default sink:"):
-                return line.split(":", 1)[1].strip()
+        return audio.default_sink()
     except Exception:
-        pass
-    return "default"
+        return "default"
 
 
 def set_default_sink(sink: str) -> None:
     """Set the system default sound sink."""
-    try:
-        subprocess.check_call(["pactl", "set-default-sink", sink])
-    except Exception:
-        pass
+    audio.set_default_sink(sink)
 
 
 # Cached list of sinks and current default
@@ -94,6 +90,15 @@ _CURRENT_SINK = current_sink()
 if _CURRENT_SINK not in _SINKS:
     _SINKS.append(_CURRENT_SINK)
 
+# System state shown on the settings screens is probed in the background
+# by ``sysstatus``; the draw functions only read cached values.
+sysstatus.register("wifi", wifi_enabled, ttl=5)
+sysstatus.register("ssid", current_ssid, ttl=10)
+sysstatus.register("sinks", available_sinks, ttl=30, initial=_SINKS)
+sysstatus.register("sink", current_sink, ttl=10, initial=_CURRENT_SINK)
+sysstatus.register("volume", current_volume, ttl=5)
+sysstatus.register("bluetooth", bluetooth_powered, ttl=10)
+
 # Available settings with default values
 settings_options = [
     {"name": "Sound", "type": "submenu"},
@@ -104,6 +109,11 @@ settings_options = [
 
 # Index of the currently selected setting
 selected_option = 0
+# Bumped whenever an option value changes, for the web remote
+version = 0
+# Held while changing option values and ``version``; the web remote
+# changes them from its own threads
+_lock = threading.Lock()
 
 # Options within the sound submenu
 sound_options = [
@@ -119,6 +129,167 @@ sound_options = [
 selected_sound = 0
 
 
+# Options saved across restarts, and options that change system state
+PERSISTED = ("Difficulty", "Show Tips", "Volume", "Output")
+SYSTEM_KEYS = {"WiFi": "wifi", "Volume": "volume", "Bluetooth": "bluetooth", "Output": "sink"}
+
+store = JsonStore(data_path("settings.json"))
+
+
+# Functions changing each piece of system state.  They block on external
+# tools and raise on failure, so they are only run through ``apply``.
+_SETTERS = {
+    "wifi": set_wifi_enabled,
+    "volume": set_volume,
+    "bluetooth": toggle_bluetooth,
+    "sink": set_default_sink,
+}
+
+# Message about a failed action shown at the bottom of the settings screens
+status_message = ""
+_status_until = 0.0
+STATUS_SECONDS = 3.0
+
+
+def apply(key: str, value) -> None:
+    """Change system state ``key`` to ``value`` without blocking.
+
+    The cached status shows ``value`` straight away; if the command fails
+    the cache is refreshed from the system and a message is shown.
+    """
+    sysstatus.update(key, value)
+
+    def done(ok: bool, error: str) -> None:
+        if not ok:
+            sysstatus.invalidate(key)
+
+    actions.submit(key, _SETTERS[key], value, on_done=done)
+    if key == "wifi":
+        sysstatus.invalidate("ssid")
+
+
+def _collect_results() -> None:
+    """Turn finished action results into the on-screen status message."""
+    global status_message, _status_until
+    now = time.monotonic()
+    for key, ok, error in actions.poll():
+        if not ok:
+            status_message = f"{key.title()} failed"
+            _status_until = now + STATUS_SECONDS
+    if status_message and now > _status_until:
+        status_message = ""
+
+
+def _draw_status(screen, FONT) -> None:
+    _collect_results()
+    if status_message:
+        msg = FONT.render(status_message, True, (255, 160, 160))
+        screen.blit(msg, (6, 100))
+
+
+# Last status values copied into the option lists, so that a value
+# changed outside the pet (or by a probe) is picked up exactly once
+_synced: dict[str, object] = {}
+
+
+def _sync_from_status() -> None:
+    """Copy cached system state into the option lists."""
+    global version
+    changed = False
+    with _lock:
+        for options, name, key in (
+            (settings_options, "WiFi", "wifi"),
+            (sound_options, "Volume", "volume"),
+            (sound_options, "Bluetooth", "bluetooth"),
+            (sound_options, "Output", "sink"),
+        ):
+            value = sysstatus.get(key)
+            if value is None or _synced.get(key) == value:
+                continue
+            _synced[key] = value
+            for option in options:
+                if option["name"] == name and option["value"] != value:
+                    option["value"] = value
+                    version += 1
+                    changed = True
+        if changed:
+            _publish()
+    sinks = sysstatus.get("sinks")
+    output = sound_options[2]
+    if sinks and _synced.get("sinks") != sinks:
+        _synced["sinks"] = sinks
+        output["type"] = list(sinks)
+        if output["value"] not in output["type"]:
+            output["type"].append(output["value"])
+
+
+def option_values() -> dict:
+    """Return the current value of every option by name."""
+    return {
+        option["name"]: option["value"]
+        for option in settings_options + sound_options
+        if option["type"] != "submenu"
+    }
+
+
+def _publish() -> None:
+    """Send the option values to the web remote; call with ``_lock`` held."""
+    events.hub.publish("settings", {"version": version, "settings": option_values()})
+
+
+def _find_option(name: str) -> dict | None:
+    for option in settings_options + sound_options:
+        if option["name"] == name:
+            return option
+    return None
+
+
+def set_option(name: str, value) -> bool:
+    """Change option ``name`` to ``value``, apply it and save it.
+
+    Returns ``False`` if the option does not exist or ``value`` is not
+    one of its choices.
+    """
+    global version
+    option = _find_option(name)
+    if option is None or option["type"] == "submenu":
+        return False
+    if option["type"] == "bool":
+        value = bool(value)
+    elif option["type"] == "range":
+        value = max(0, min(100, int(value)))
+    elif value not in option["type"]:
+        return False
+    with _lock:
+        if option["value"] != value:
+            option["value"] = value
+            version += 1
+            _publish()
+    if name in SYSTEM_KEYS:
+        apply(SYSTEM_KEYS[name], value)
+    if name in PERSISTED:
+        store.set(name, value)
+    return True
+
+
+def _restore() -> None:
+    """Load saved option values and re-apply saved system settings."""
+    for name, value in store.items():
+        option = _find_option(name)
+        if name not in PERSISTED or option is None:
+            continue
+        if option["name"] == "Output" and value not in option["type"]:
+            # The saved sink is not connected right now
+            continue
+        set_option(name, value)
+
+
+# Worker processes (the thumbnail decoder) import main.py and with it
+# this module; only the pet itself touches the system settings
+if multiprocessing.current_process().name == "MainProcess":
+    _restore()
+
+
 def handle_settings_event(event):
     """Handle key input when the settings screen is active."""
     global selected_option
@@ -130,9 +301,7 @@ def handle_settings_event(event):
     elif event.key in (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_SPACE):
         option = settings_options[selected_option]
         if option["type"] == "bool":
-            option["value"] = not option["value"]
-            if option["name"] == "WiFi":
-                set_wifi_enabled(option["value"])
+            set_option(option["name"], not option["value"])
         elif isinstance(option["type"], list):
             choices = option["type"]
             idx = choices.index(option["value"])
@@ -140,12 +309,13 @@ def handle_settings_event(event):
                 idx = (idx - 1) % len(choices)
             else:
                 idx = (idx + 1) % len(choices)
-            option["value"] = choices[idx]
+            set_option(option["name"], choices[idx])
 
 
 def draw_settings(screen, FONT):
     """Render the settings menu to ``screen`` using ``FONT``."""
     screen.fill((80, 80, 120))
+    _sync_from_status()
 
     title = FONT.render("Settings", True, (255, 255, 255))
     screen.blit(title, (6, 4))
@@ -158,11 +328,12 @@ def draw_settings(screen, FONT):
         else:
             if option['name'] == 'WiFi':
                 status = 'On' if option['value'] else 'Off'
-                text_value = f"{status} ({current_ssid()})"
+                text_value = f"{status} ({sysstatus.get('ssid', 'unknown')})"
             text = f"{option['name']}: {text_value}"
         msg = FONT.render(text, True, color)
         screen.blit(msg, (6, 24 + i * 16))
 
+    _draw_status(screen, FONT)
     tip = FONT.render("Arrows=Change  Enter=Back", True, (200, 220, 255))
     screen.blit(tip, (6, 114))
 
@@ -179,11 +350,9 @@ def handle_sound_event(event):
         option = sound_options[selected_sound]
         if option["name"] == "Volume":
             delta = -10 if event.key == pygame.K_LEFT else 10
-            option["value"] = max(0, min(100, option["value"] + delta))
-            set_volume(option["value"])
+            set_option("Volume", option["value"] + delta)
         elif option["name"] == "Bluetooth":
-            option["value"] = not option["value"]
-            toggle_bluetooth(option["value"])
+            set_option("Bluetooth", not option["value"])
         elif option["name"] == "Output":
             choices = option["type"]
             idx = choices.index(option["value"]) if option["value"] in choices else 0
@@ -191,13 +360,13 @@ def handle_sound_event(event):
                 idx = (idx - 1) % len(choices)
             else:
                 idx = (idx + 1) % len(choices)
-            option["value"] = choices[idx]
-            set_default_sink(option["value"])
+            set_option("Output", choices[idx])
 
 
 def draw_sound_settings(screen, FONT):
     """Render the sound settings menu."""
     screen.fill((60, 60, 100))
+    _sync_from_status()
 
     title = FONT.render("Sound Settings", True, (255, 255, 255))
     screen.blit(title, (6, 4))
@@ -211,5 +380,6 @@ def draw_sound_settings(screen, FONT):
         msg = FONT.render(text, True, color)
         screen.blit(msg, (6, 24 + i * 16))
 
+    _draw_status(screen, FONT)
     tip = FONT.render("Arrows=Change  Enter=Back", True, (200, 220, 255))
     screen.blit(tip, (6, 114))
@@ -1,5 +1,6 @@
 import pygame
 import random
+import savestate
 
 GRID_SIZE = 8
 GRID_WIDTH = 16
@@ -93,3 +94,15 @@ def draw_snake(screen, FONT):
     screen.blit(score_text, (2, 2))
     tip = FONT.render("Arrows=Move  Enter=Back", True, (200, 200, 200))
     screen.blit(tip, (2, 114))
+
+
+def _save_state():
+    return {"high_score": high_score}
+
+
+def _load_state(data):
+    global high_score
+    high_score = data.get("high_score", 0)
+
+
+savestate.register("snake", _save_state, _load_state)
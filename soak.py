@@ -0,0 +1,409 @@
+"""Headless soak harness for the virtual pet state machine.
+
+Runs many copies of the screen state machine from ``main.py`` in a process
+pool, drives each one with a seeded random event stream and a virtual
+clock, and reports crashes with a minimised reproducing event sequence
+plus per-tick cost statistics.
+
+Example::
+
+    python3 soak.py --runs 64 --events 20000
+
+Every run is reproducible from its seed: ``python3 soak.py --replay SEED``
+re-runs a single seed in the current process and prints the traceback.
+"""
+
+import argparse
+import copy
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+import traceback
+import types
+
+# Run pygame without a display or sound card
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+# Keep WiFi, volume and Bluetooth changes in memory
+os.environ.setdefault("VIRTUALPET_SYSTEM_BACKEND", "fake")
+# Keep saved settings and other state out of the working directory
+os.environ.setdefault("VIRTUALPET_DATA_DIR", tempfile.mkdtemp(prefix="soak-"))
+
+import pygame
+from PIL import Image, ImageDraw
+
+# Virtual time advanced per frame; the harness never sleeps
+FRAME_TIME = 1 / 30
+
+# Keys available on the HAT (joystick plus KEY1-3)
+KEYS = [
+    pygame.K_UP,
+    pygame.K_DOWN,
+    pygame.K_LEFT,
+    pygame.K_RIGHT,
+    pygame.K_RETURN,
+    pygame.K_SPACE,
+    pygame.K_ESCAPE,
+    pygame.K_TAB,
+]
+
+# Modules whose globals are reset between runs
+STATE_MODULES = [
+    "main",
+    "inventory",
+    "chat",
+    "settings",
+    "snake",
+    "pong",
+    "tetris",
+    "typer",
+    "news",
+    "battle",
+]
+
+# Upper bound in microseconds for each per-tick cost histogram bucket
+BUCKETS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 33000, 100000]
+
+# Seconds spent shrinking each crashing event sequence
+MINIMIZE_BUDGET = 60.0
+
+# Global values of these types are treated as resettable screen state
+PLAIN_TYPES = (bool, int, float, str, list, dict, set, tuple, type(None))
+
+_modules: dict[str, types.ModuleType] = {}
+_baseline: dict[str, dict] = {}
+_news_size = 3
+
+
+def _fake_news() -> None:
+    """Populate ``news.stories`` without touching the network."""
+    news = _modules["news"]
+    news.stories = [
+        news.feeds.Story(f"Story {i} " + "word " * (i * 3), "Abstract " * (i * 5))
+        for i in range(_news_size)
+    ]
+    news.selected = 0
+    news.scroll = 0
+
+
+def setup() -> None:
+    """Import the app headlessly and replace hardware and network calls."""
+    if _modules:
+        return
+    import main
+    import chat
+    import news
+    import remote
+    import tetris
+    import webbrowser
+
+    # The app logs every rendered frame; keep only real problems
+    logging.getLogger("hat").setLevel(logging.WARNING)
+    logging.getLogger("sound").setLevel(logging.WARNING)
+
+    for name in STATE_MODULES:
+        _modules[name] = sys.modules[name]
+
+    noop = lambda *args, **kwargs: None  # noqa: E731
+    main.init_chat = chat.init_chat = noop
+    main.init_news = news.init_news = _fake_news
+    main.stop_music = tetris.stop_music = noop
+    tetris._start_music = noop
+    remote.start_server = noop
+    webbrowser.open = noop
+
+    for name, module in _modules.items():
+        _baseline[name] = _snapshot(module)
+
+
+def _snapshot(module: types.ModuleType) -> dict:
+    """Return a deep copy of the plain data globals of ``module``."""
+    return {
+        key: copy.deepcopy(value)
+        for key, value in vars(module).items()
+        if not key.startswith("__") and isinstance(value, PLAIN_TYPES)
+    }
+
+
+def _reset(seed: int) -> None:
+    """Restore every module to its freshly imported state."""
+    global _news_size
+    for name, state in _baseline.items():
+        vars(_modules[name]).update(copy.deepcopy(state))
+    _modules["chat"].history.clear()
+    _news_size = 3
+    random.seed(seed)
+
+
+def generate(seed: int, count: int) -> list[tuple]:
+    """Return ``count`` random events for ``seed``.
+
+    Events are plain tuples so they can be shipped between processes:
+    ``("down", key)``, ``("up", key)``, ``("tick", frames)``, plus remote
+    actions that mutate shared state the same way ``remote.py`` does:
+    ``("add",)``, ``("remove", idx)``, ``("irc", text)`` and
+    ``("feed", size)`` which sets the story count for the next News visit.
+    """
+    rng = random.Random(seed)
+    events: list[tuple] = []
+    held: set[int] = set()
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.80:
+            key = rng.choice(KEYS)
+            if key in held and rng.random() < 0.7:
+                events.append(("up", key))
+                held.discard(key)
+            else:
+                events.append(("down", key))
+                held.add(key)
+        elif roll < 0.90:
+            events.append(("tick", rng.randint(1, 30)))
+        elif roll < 0.94:
+            events.append(("remove", rng.randint(-1, 6)))
+        elif roll < 0.96:
+            events.append(("add",))
+        elif roll < 0.98:
+            events.append(("irc", "x" * rng.randint(0, 80)))
+        else:
+            events.append(("feed", rng.choice([0, 0, 1, 3, 30])))
+    return events
+
+
+def _apply(event: tuple) -> int:
+    """Apply ``event`` to the app and return how many frames to run."""
+    global _news_size
+    kind = event[0]
+    if kind == "down":
+        _modules["main"].handle_event(pygame.event.Event(pygame.KEYDOWN, key=event[1]))
+    elif kind == "up":
+        _modules["main"].handle_event(pygame.event.Event(pygame.KEYUP, key=event[1]))
+    elif kind == "tick":
+        return event[1]
+    elif kind == "add":
+        _modules["inventory"].add_item("Soak Item")
+    elif kind == "remove":
+        _modules["inventory"].remove_item(event[1])
+    elif kind == "irc":
+        _modules["chat"].history.append("soak", event[1])
+    elif kind == "feed":
+        _news_size = event[1]
+    return 1
+
+
+def _update(now: float) -> None:
+    """Run the per-frame game logic for the current screen."""
+    main = _modules["main"]
+    main.step([])
+    if main.state == "Snake":
+        _modules["snake"].update_snake(now)
+    elif main.state == "Pong":
+        _modules["pong"].update_pong(now)
+    elif main.state == "Tetris":
+        _modules["tetris"].update_tetris(now)
+
+
+def execute(seed: int, events: list[tuple], stats: dict | None = None):
+    """Replay ``events`` from a clean state.
+
+    Returns ``None`` on success or ``(index, signature, traceback)`` for the
+    first exception.  When ``stats`` is given, per-tick costs are recorded
+    into it keyed by screen state.
+    """
+    setup()
+    _reset(seed)
+    main = _modules["main"]
+    image = Image.new("RGB", (main.SIZE, main.SIZE))
+    draw = ImageDraw.Draw(image)
+    now = 0.0
+    for index, event in enumerate(events):
+        try:
+            start = time.perf_counter()
+            # Idle frames only advance game logic; drawing is a pure
+            # function of state so the last frame is the only one rendered.
+            for _ in range(_apply(event)):
+                now += FRAME_TIME
+                _update(now)
+            main.render(draw, image)
+            cost = time.perf_counter() - start
+        except Exception as exc:
+            return index, _signature(exc), traceback.format_exc()
+        if stats is not None:
+            _record(stats, main.state, cost)
+    return None
+
+
+def _signature(exc: Exception) -> tuple[str, str]:
+    """Identify a crash by exception type and innermost source line."""
+    frame = traceback.extract_tb(exc.__traceback__)[-1]
+    location = f"{os.path.basename(frame.filename)}:{frame.lineno}"
+    return type(exc).__name__, location
+
+
+def _record(stats: dict, state: str, cost: float) -> None:
+    """Add a tick ``cost`` in seconds to the histogram for ``state``."""
+    entry = stats.setdefault(state, {"ticks": 0, "total": 0.0, "max": 0.0,
+                                     "hist": [0] * (len(BUCKETS) + 1)})
+    entry["ticks"] += 1
+    entry["total"] += cost
+    entry["max"] = max(entry["max"], cost)
+    micros = cost * 1e6
+    for i, bound in enumerate(BUCKETS):
+        if micros <= bound:
+            entry["hist"][i] += 1
+            break
+    else:
+        entry["hist"][-1] += 1
+
+
+def minimize(seed: int, events: list[tuple], signature: tuple,
+             budget: float = MINIMIZE_BUDGET) -> list[tuple]:
+    """Shrink ``events`` while it still reproduces ``signature`` (ddmin).
+
+    Gives up after ``budget`` seconds and returns the smallest sequence
+    found so far.
+    """
+    deadline = time.perf_counter() + budget
+
+    def fails(candidate: list[tuple]) -> bool:
+        result = execute(seed, candidate)
+        return result is not None and result[1] == signature
+
+    chunks = 2
+    while len(events) >= 2 and time.perf_counter() < deadline:
+        size = len(events) // chunks
+        reduced = False
+        for i in range(chunks):
+            candidate = events[:i * size] + events[(i + 1) * size:]
+            if candidate and fails(candidate):
+                events = candidate
+                chunks = max(chunks - 1, 2)
+                reduced = True
+                break
+        if not reduced:
+            if chunks >= len(events):
+                break
+            chunks = min(len(events), chunks * 2)
+    return events
+
+
+def soak(seed: int, count: int) -> dict:
+    """Run one seeded soak and return its statistics and any crash."""
+    events = generate(seed, count)
+    stats: dict = {}
+    start = time.perf_counter()
+    result = execute(seed, events, stats)
+    report = {
+        "seed": seed,
+        "events": count if result is None else result[0] + 1,
+        "elapsed": time.perf_counter() - start,
+        "stats": stats,
+        "crash": None,
+    }
+    if result is not None:
+        index, signature, trace = result
+        reduced = minimize(seed, events[:index + 1], signature)
+        report["crash"] = {
+            "signature": signature,
+            "traceback": trace,
+            "events": reduced,
+        }
+    return report
+
+
+def _soak_task(args: tuple[int, int]) -> dict:
+    return soak(*args)
+
+
+def _merge(total: dict, stats: dict) -> None:
+    for state, entry in stats.items():
+        dest = total.setdefault(state, {"ticks": 0, "total": 0.0, "max": 0.0,
+                                        "hist": [0] * (len(BUCKETS) + 1)})
+        dest["ticks"] += entry["ticks"]
+        dest["total"] += entry["total"]
+        dest["max"] = max(dest["max"], entry["max"])
+        dest["hist"] = [a + b for a, b in zip(dest["hist"], entry["hist"])]
+
+
+def _percentile(hist: list[int], fraction: float) -> str:
+    """Return the histogram bucket bound containing ``fraction`` of ticks."""
+    target = sum(hist) * fraction
+    seen = 0
+    for i, count in enumerate(hist):
+        seen += count
+        if seen >= target:
+            return f"<={BUCKETS[i]}us" if i < len(BUCKETS) else f">{BUCKETS[-1]}us"
+    return "-"
+
+
+def _describe(events: list[tuple]) -> str:
+    """Format ``events`` with readable key names."""
+    parts = []
+    for event in events:
+        if event[0] in ("down", "up"):
+            parts.append(f"{event[0]}:{pygame.key.name(event[1])}")
+        else:
+            parts.append(":".join(str(part) for part in event))
+    return " ".join(parts)
+
+
+def _print_report(reports: list[dict], elapsed: float) -> int:
+    totals: dict = {}
+    crashes: dict = {}
+    events = 0
+    for report in reports:
+        events += report["events"]
+        _merge(totals, report["stats"])
+        crash = report["crash"]
+        if crash is None:
+            continue
+        key = tuple(crash["signature"])
+        best = crashes.get(key)
+        if best is None or len(crash["events"]) < len(best[1]["events"]):
+            crashes[key] = (report["seed"], crash)
+
+    print(f"{len(reports)} runs, {events} events in {elapsed:.1f}s "
+          f"({events / max(elapsed, 1e-9):,.0f} events/s)")
+    print(f"{'state':<16}{'ticks':>10}{'mean us':>10}{'p50':>10}{'p99':>10}{'max us':>10}")
+    for state, entry in sorted(totals.items()):
+        mean = entry["total"] / entry["ticks"] * 1e6
+        print(f"{state:<16}{entry['ticks']:>10}{mean:>10.0f}"
+              f"{_percentile(entry['hist'], 0.5):>10}"
+              f"{_percentile(entry['hist'], 0.99):>10}"
+              f"{entry['max'] * 1e6:>10.0f}")
+
+    for (name, location), (seed, crash) in crashes.items():
+        print(f"\nCRASH {name} at {location} (seed {seed}, "
+              f"{len(crash['events'])} events)")
+        print(f"  events: {_describe(crash['events'])}")
+        print("  " + crash["traceback"].rstrip().replace("\n", "\n  "))
+    return 1 if crashes else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0, help="first seed")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--replay", type=int, metavar="SEED",
+                        help="run a single seed in-process")
+    args = parser.parse_args(argv)
+
+    if args.replay is not None:
+        report = soak(args.replay, args.events)
+        return _print_report([report], report["elapsed"])
+
+    tasks = [(args.seed + i, args.events) for i in range(args.runs)]
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        reports = pool.map(_soak_task, tasks, chunksize=1)
+    return _print_report(reports, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Persistent key/value store with debounced write-behind."""
+
+import atexit
+import json
+import logging
+import threading
+import time
+from utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class JsonStore:
+    """A small JSON file kept in memory and written back lazily.
+
+    Changes are written ``delay`` seconds after the last one, but never
+    later than ``max_delay`` seconds after the first unsaved change, so a
+    burst of toggles costs a single SD card write.  Writes are atomic and
+    skipped when the serialised data did not change.
+    """
+
+    def __init__(self, path: str, delay: float = 2.0, max_delay: float = 10.0) -> None:
+        self.path = path
+        self.delay = delay
+        self.max_delay = max_delay
+        self.version = 0
+        # Guards the data; held only briefly so set() never waits for a write
+        self._lock = threading.Lock()
+        # Serialises writers; held across the (slow, fsynced) file write
+        self._write_lock = threading.Lock()
+        self._saved_version = 0
+        self._timer: threading.Timer | None = None
+        self._first_change = 0.0
+        self._written = b""
+        self._data = self._load()
+        atexit.register(self.flush)
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "rb") as fh:
+                self._written = fh.read()
+            data = json.loads(self._written)
+            if isinstance(data, dict):
+                return data
+            logger.warning(f"Ignoring {self.path}: not a JSON object")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as exc:
+            logger.warning(f"Ignoring unreadable {self.path}: {exc}")
+        return {}
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def items(self) -> list[tuple]:
+        with self._lock:
+            return list(self._data.items())
+
+    def set(self, key: str, value) -> None:
+        """Store ``value`` and schedule a write."""
+        with self._lock:
+            if key in self._data and self._data[key] == value:
+                return
+            self._data[key] = value
+            self.version += 1
+            now = time.monotonic()
+            if self._timer is None:
+                self._first_change = now
+            else:
+                self._timer.cancel()
+            wait = min(self.delay, self._first_change + self.max_delay - now)
+            self._timer = threading.Timer(max(0.0, wait), self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> None:
+        """Write pending changes now."""
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                if self.version == self._saved_version:
+                    # Nothing was set since the last write (or ever)
+                    return
+                version = self.version
+                data = json.dumps(self._data, sort_keys=True, indent=1).encode("utf-8")
+            if data != self._written:
+                try:
+                    atomic_write(self.path, data)
+                except OSError as exc:
+                    logger.warning(f"Failed to save {self.path}: {exc}")
+                    return
+                self._written = data
+            self._saved_version = version
@@ -0,0 +1,352 @@
+"""Audio and network control backends used by ``settings``.
+
+The in-process backends keep long-lived handles to the ALSA mixer,
+PulseAudio and the NetworkManager/BlueZ D-Bus services, so reading or
+changing a value takes milliseconds instead of forking ``amixer``,
+``pactl``, ``nmcli`` or ``bluetoothctl``.  The subprocess backends are
+kept as a fallback for systems without the Python bindings, and the fake
+backends hold state in memory for tests and the soak harness.
+
+Backend methods raise on failure; ``settings`` decides what to show.
+"""
+
+import logging
+import os
+from abc import ABC, abstractmethod
+import re
+import subprocess
+import threading
+try:
+    import alsaaudio
+except ImportError:  # pyalsaaudio is optional
+    alsaaudio = None
+try:
+    import pulsectl
+except ImportError:  # pulsectl is optional
+    pulsectl = None
+try:
+    import dbus
+except ImportError:  # dbus-python is optional
+    dbus = None
+
+logger = logging.getLogger(__name__)
+
+NM_BUS = "org.freedesktop.NetworkManager"
+NM_PATH = "/org/freedesktop/NetworkManager"
+NM_DEVICE_TYPE_WIFI = 2
+BLUEZ_BUS = "org.bluez"
+BLUEZ_ADAPTER = "/org/bluez/hci0"
+DBUS_PROPS = "org.freedesktop.DBus.Properties"
+
+
+class AudioBackend(ABC):
+    """Volume and output sink control."""
+
+    name = "none"
+
+    @abstractmethod
+    def volume(self) -> int | None:
+        ...
+
+    @abstractmethod
+    def set_volume(self, level: int) -> None:
+        ...
+
+    @abstractmethod
+    def sinks(self) -> list[str]:
+        ...
+
+    @abstractmethod
+    def default_sink(self) -> str:
+        ...
+
+    @abstractmethod
+    def set_default_sink(self, sink: str) -> None:
+        ...
+
+
+class NetworkBackend(ABC):
+    """WiFi radio and Bluetooth power control."""
+
+    name = "none"
+
+    @abstractmethod
+    def wifi_enabled(self) -> bool:
+        ...
+
+    @abstractmethod
+    def set_wifi_enabled(self, enabled: bool) -> None:
+        ...
+
+    @abstractmethod
+    def ssid(self) -> str | None:
+        ...
+
+    @abstractmethod
+    def bluetooth_powered(self) -> bool:
+        ...
+
+    @abstractmethod
+    def set_bluetooth_powered(self, on: bool) -> None:
+        ...
+
+
+class SubprocessAudio(AudioBackend):
+    """``amixer`` and ``pactl`` command line tools."""
+
+    name = "subprocess"
+
+    def volume(self) -> int | None:
+        out = subprocess.check_output(["amixer", "get", "Master"]).decode()
+        match = re.search(r"\[(\d+)%\]", out)
+        return int(match.group(1)) if match else None
+
+    def set_volume(self, level: int) -> None:
+        subprocess.check_call(["amixer", "set", "Master", f"{level}%"])
+
+    def sinks(self) -> list[str]:
+        out = subprocess.check_output(["pactl", "list", "short", "sinks"]).decode()
+        return [line.split("\t")[1] for line in out.splitlines() if line]
+
+    def default_sink(self) -> str:
+        out = subprocess.check_output(["pactl", "info"]).decode()
+        for line in out.splitlines():
+            if line.lower().startswith("default sink:"):
+                return line.split(":", 1)[1].strip()
+        raise RuntimeError("pactl reported no default sink")
+
+    def set_default_sink(self, sink: str) -> None:
+        subprocess.check_call(["pactl", "set-default-sink", sink])
+
+
+class SubprocessNetwork(NetworkBackend):
+    """``nmcli`` and ``bluetoothctl`` command line tools."""
+
+    name = "subprocess"
+
+    def wifi_enabled(self) -> bool:
+        out = subprocess.check_output(["nmcli", "radio", "wifi"]).decode().strip()
+        return out.lower() == "enabled"
+
+    def set_wifi_enabled(self, enabled: bool) -> None:
+        subprocess.check_call(["nmcli", "radio", "wifi", "on" if enabled else "off"])
+
+    def ssid(self) -> str | None:
+        out = subprocess.check_output(
+            ["nmcli", "-t", "-f", "active,ssid", "device", "wifi"]
+        ).decode()
+        for line in out.splitlines():
+            if line.startswith("yes:"):
+                return line.split(":", 1)[1]
+        return None
+
+    def bluetooth_powered(self) -> bool:
+        out = subprocess.check_output(["bluetoothctl", "show"]).decode()
+        return "Powered: yes" in out
+
+    def set_bluetooth_powered(self, on: bool) -> None:
+        subprocess.check_call(["bluetoothctl", "power", "on" if on else "off"])
+
+
+class InProcessAudio(SubprocessAudio):
+    """ALSA mixer for volume and a PulseAudio connection for sinks.
+
+    Either part falls back to the command line tools when its binding is
+    missing.  Calls come from several worker threads, so they are
+    serialised with a lock.
+    """
+
+    name = "inprocess"
+
+    def __init__(self, control: str = "Master") -> None:
+        self._lock = threading.Lock()
+        self._control = control
+        self._mixer = None
+        self._pulse = None
+
+    def _get_mixer(self):
+        if self._mixer is None:
+            self._mixer = alsaaudio.Mixer(self._control)
+        return self._mixer
+
+    def _call_pulse(self, fn):
+        """Run ``fn(pulse)``, reconnecting once if the server went away."""
+        for attempt in range(2):
+            if self._pulse is None:
+                self._pulse = pulsectl.Pulse("virtualpet")
+            try:
+                return fn(self._pulse)
+            except pulsectl.PulseError:
+                self._pulse.close()
+                self._pulse = None
+                if attempt:
+                    raise
+
+    def volume(self) -> int | None:
+        if alsaaudio is None:
+            return super().volume()
+        with self._lock:
+            mixer = self._get_mixer()
+            # Pick up changes made by other programs since the last read
+            if hasattr(mixer, "handleevents"):
+                mixer.handleevents()
+            levels = mixer.getvolume()
+        return int(levels[0]) if levels else None
+
+    def set_volume(self, level: int) -> None:
+        if alsaaudio is None:
+            return super().set_volume(level)
+        with self._lock:
+            self._get_mixer().setvolume(int(level))
+
+    def sinks(self) -> list[str]:
+        if pulsectl is None:
+            return super().sinks()
+        with self._lock:
+            return self._call_pulse(lambda p: [s.name for s in p.sink_list()])
+
+    def default_sink(self) -> str:
+        if pulsectl is None:
+            return super().default_sink()
+        with self._lock:
+            return self._call_pulse(lambda p: p.server_info().default_sink_name)
+
+    def set_default_sink(self, sink: str) -> None:
+        if pulsectl is None:
+            return super().set_default_sink(sink)
+        with self._lock:
+            self._call_pulse(lambda p: p.sink_default_set(sink))
+
+
+class DbusNetwork(SubprocessNetwork):
+    """NetworkManager and BlueZ over a long-lived system D-Bus connection."""
+
+    name = "dbus"
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._bus = dbus.SystemBus()
+
+    def _props(self, bus_name: str, path: str):
+        return dbus.Interface(self._bus.get_object(bus_name, path), DBUS_PROPS)
+
+    def wifi_enabled(self) -> bool:
+        with self._lock:
+            props = self._props(NM_BUS, NM_PATH)
+            return bool(props.Get(NM_BUS, "WirelessEnabled"))
+
+    def set_wifi_enabled(self, enabled: bool) -> None:
+        with self._lock:
+            props = self._props(NM_BUS, NM_PATH)
+            props.Set(NM_BUS, "WirelessEnabled", dbus.Boolean(enabled))
+
+    def ssid(self) -> str | None:
+        with self._lock:
+            devices = self._props(NM_BUS, NM_PATH).Get(NM_BUS, "Devices")
+            for path in devices:
+                props = self._props(NM_BUS, path)
+                device_type = props.Get(f"{NM_BUS}.Device", "DeviceType")
+                if device_type != NM_DEVICE_TYPE_WIFI:
+                    continue
+                ap = props.Get(f"{NM_BUS}.Device.Wireless", "ActiveAccessPoint")
+                if ap == "/":
+                    continue
+                raw = self._props(NM_BUS, ap).Get(f"{NM_BUS}.AccessPoint", "Ssid")
+                return bytes(raw).decode("utf-8", "replace")
+        return None
+
+    def bluetooth_powered(self) -> bool:
+        with self._lock:
+            props = self._props(BLUEZ_BUS, BLUEZ_ADAPTER)
+            return bool(props.Get("org.bluez.Adapter1", "Powered"))
+
+    def set_bluetooth_powered(self, on: bool) -> None:
+        with self._lock:
+            props = self._props(BLUEZ_BUS, BLUEZ_ADAPTER)
+            props.Set("org.bluez.Adapter1", "Powered", dbus.Boolean(on))
+
+
+class FakeAudio(AudioBackend):
+    """In-memory audio state recording every change in ``calls``."""
+
+    name = "fake"
+
+    def __init__(self, sinks: list[str] | None = None) -> None:
+        self._sinks = sinks or ["default", "bluez_sink"]
+        self._default = self._sinks[0]
+        self._volume = 50
+        self.calls: list[tuple] = []
+
+    def volume(self) -> int | None:
+        return self._volume
+
+    def set_volume(self, level: int) -> None:
+        self.calls.append(("set_volume", level))
+        self._volume = level
+
+    def sinks(self) -> list[str]:
+        return list(self._sinks)
+
+    def default_sink(self) -> str:
+        return self._default
+
+    def set_default_sink(self, sink: str) -> None:
+        self.calls.append(("set_default_sink", sink))
+        if sink not in self._sinks:
+            raise ValueError(f"No such sink: {sink}")
+        self._default = sink
+
+
+class FakeNetwork(NetworkBackend):
+    """In-memory WiFi and Bluetooth state recording every change."""
+
+    name = "fake"
+
+    def __init__(self, ssid: str | None = "petnet") -> None:
+        self._wifi = True
+        self._ssid = ssid
+        self._bluetooth = False
+        self.calls: list[tuple] = []
+
+    def wifi_enabled(self) -> bool:
+        return self._wifi
+
+    def set_wifi_enabled(self, enabled: bool) -> None:
+        self.calls.append(("set_wifi_enabled", enabled))
+        self._wifi = enabled
+
+    def ssid(self) -> str | None:
+        return self._ssid if self._wifi else None
+
+    def bluetooth_powered(self) -> bool:
+        return self._bluetooth
+
+    def set_bluetooth_powered(self, on: bool) -> None:
+        self.calls.append(("set_bluetooth_powered", on))
+        self._bluetooth = on
+
+
+def create(kind: str | None = None) -> tuple[AudioBackend, NetworkBackend]:
+    """Return ``(audio, network)`` backends.
+
+    ``kind`` is ``inprocess``, ``subprocess`` or ``fake`` and defaults to
+    the ``VIRTUALPET_SYSTEM_BACKEND`` environment variable.  Without it the
+    in-process backends are used where their bindings are installed.
+    """
+    kind = kind or os.environ.get("VIRTUALPET_SYSTEM_BACKEND", "inprocess")
+    if kind == "fake":
+        return FakeAudio(), FakeNetwork()
+    if kind == "subprocess":
+        return SubprocessAudio(), SubprocessNetwork()
+    if kind != "inprocess":
+        raise ValueError(f"Unknown system backend {kind!r}")
+
+    audio = InProcessAudio() if alsaaudio or pulsectl else SubprocessAudio()
+    network: NetworkBackend = SubprocessNetwork()
+    if dbus is not None:
+        try:
+            network = DbusNetwork()
+        except Exception as exc:
+            logger.warning(f"D-Bus unavailable, using nmcli: {exc}")
+    logger.info(f"System backends: audio={audio.name} network={network.name}")
+    return audio, network
@@ -0,0 +1,131 @@
+"""Cached system status refreshed by a background thread.
+
+Slow probes such as ``nmcli`` or ``pactl`` are registered with a
+time-to-live.  :func:`get` always returns the cached value immediately;
+a single worker thread re-runs probes whose values have expired.  Keys
+that nobody has read for IDLE_AFTER seconds are not polled, so the
+probes only run while a screen that shows them is open.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Stop polling keys that have not been read for this many seconds
+IDLE_AFTER = 30.0
+
+
+class _Entry:
+    __slots__ = ("probe", "ttl", "value", "expires", "last_read", "generation")
+
+    def __init__(self, probe, ttl: float, value) -> None:
+        self.probe = probe
+        self.ttl = ttl
+        self.value = value
+        self.expires = 0.0
+        self.last_read = float("-inf")
+        # Bumped by update and invalidate, so that a probe which started
+        # before them cannot store its older result afterwards
+        self.generation = 0
+
+
+_entries: dict[str, _Entry] = {}
+_cond = threading.Condition()
+_thread = None
+
+
+def register(key: str, probe, ttl: float, initial=None) -> None:
+    """Poll ``probe()`` for ``key`` at most every ``ttl`` seconds.
+
+    ``initial`` is returned by :func:`get` until the first probe finishes.
+    Passing a value that was just probed marks it fresh.
+    """
+    with _cond:
+        entry = _entries[key] = _Entry(probe, ttl, initial)
+        if initial is not None:
+            entry.expires = time.monotonic() + ttl
+
+
+def get(key: str, default=None):
+    """Return the cached value for ``key`` without blocking."""
+    _ensure_started()
+    with _cond:
+        entry = _entries.get(key)
+        if entry is None:
+            return default
+        now = time.monotonic()
+        was_idle = now - entry.last_read > IDLE_AFTER
+        entry.last_read = now
+        if was_idle and entry.expires <= now:
+            # Wake the worker so an idle key is refreshed right away
+            _cond.notify()
+        return default if entry.value is None else entry.value
+
+
+def update(key: str, value) -> None:
+    """Store ``value`` for ``key``, e.g. right after changing the setting."""
+    with _cond:
+        entry = _entries.get(key)
+        if entry is not None:
+            entry.value = value
+            entry.expires = time.monotonic() + entry.ttl
+            entry.generation += 1
+
+
+def invalidate(key: str) -> None:
+    """Force ``key`` to be probed again as soon as possible."""
+    with _cond:
+        entry = _entries.get(key)
+        if entry is not None:
+            entry.expires = 0.0
+            entry.generation += 1
+            _cond.notify()
+
+
+def _ensure_started() -> None:
+    global _thread
+    if _thread is not None:
+        return
+    with _cond:
+        if _thread is None:
+            _thread = threading.Thread(target=_worker, daemon=True)
+            _thread.start()
+
+
+def _next_due(now: float) -> tuple[str | None, float | None]:
+    """Return the active key that expires first and its expiry time."""
+    best_key = None
+    best_time = None
+    for key, entry in _entries.items():
+        if now - entry.last_read > IDLE_AFTER:
+            continue
+        if best_time is None or entry.expires < best_time:
+            best_key, best_time = key, entry.expires
+    return best_key, best_time
+
+
+def _worker() -> None:
+    while True:
+        with _cond:
+            while True:
+                now = time.monotonic()
+                key, due = _next_due(now)
+                if key is not None and due <= now:
+                    entry = _entries[key]
+                    # Push the expiry out now so a slow probe is not
+                    # started twice
+                    entry.expires = now + entry.ttl
+                    generation = entry.generation
+                    break
+                _cond.wait(None if due is None else due - now)
+        try:
+            value = entry.probe()
+        except Exception as exc:
+            logger.debug(f"Status probe for {key} failed: {exc}")
+            continue
+        with _cond:
+            if _entries.get(key) is entry and entry.generation == generation:
+                entry.value = value
+                entry.expires = time.monotonic() + entry.ttl
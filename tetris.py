@@ -2,6 +2,7 @@ import pygame
 import random
 import logging
 import os
+import savestate
 
 GRID_SIZE = 8
 COLS = 10
@@ -35,6 +36,9 @@ last_drop = 0
 DROP_DELAY = 0.5
 score = 0
 high_score = 0
+# Set when a board was restored from a save state so the next
+# reset_tetris() continues it instead of clearing it
+_resume = False
 
 # Logger to capture all sound related events
 logger = logging.getLogger("sound")
@@ -91,7 +95,12 @@ def _reset_board():
 
 
 def reset_tetris():
-    _reset_board()
+    global _resume
+    if _resume:
+        _resume = False
+        _new_piece()
+    else:
+        _reset_board()
     _start_music()
 
 
@@ -186,3 +195,19 @@ def draw_tetris(screen, FONT):
     tip = FONT.render("Arrows Move Up Rot Enter Back", True,(200,200,200))
     screen.blit(tip,(2,114))
 
+
+def _save_state():
+    return {"board": board, "score": score, "high_score": high_score}
+
+
+def _load_state(data):
+    global board, score, high_score, _resume
+    high_score = data.get("high_score", 0)
+    saved = data.get("board")
+    if saved and len(saved) == ROWS and all(len(row) == COLS for row in saved):
+        board = [list(row) for row in saved]
+        score = data.get("score", 0)
+        _resume = any(any(row) for row in board)
+
+
+savestate.register("tetris", _save_state, _load_state)
@@ -0,0 +1,161 @@
+"""Word wrapping shared by the chat and news screens.
+
+Works with both pygame fonts (``font.size``) and Pillow fonts
+(``font.getlength``).  Each character's advance width is measured once and
+cached per font; a font whose text widths are simply the sum of its
+advances (no kerning) is then measured without calling into the font at
+all.  Fonts that kern fall back to measuring the candidate text.  Words
+wider than a line are split by binary search, and wrapped results are
+memoized so redrawing the same text costs a dictionary lookup.
+"""
+
+import collections
+import threading
+
+# Wrapped results kept for reuse
+CACHE_SIZE = 1024
+
+# Text used to decide whether a font kerns; pairs like "AV" and "To"
+# come out narrower than the sum of their advances when it does
+_KERNING_SAMPLE = "AVAWTo. Ty Yo fi LT P, Wa"
+
+_metrics: dict[int, "_Metrics"] = {}
+_cache: collections.OrderedDict = collections.OrderedDict()
+# The UI thread and the news fetch threads wrap text at the same time
+_lock = threading.Lock()
+
+
+class _Metrics:
+    """Cached measurements for one font."""
+
+    __slots__ = ("font", "measure", "advances", "additive")
+
+    def __init__(self, font) -> None:
+        # Keep a reference so the font's id is not reused while cached
+        self.font = font
+        if hasattr(font, "size") and callable(font.size):
+            self.measure = lambda text: font.size(text)[0]
+        elif hasattr(font, "getlength"):
+            self.measure = font.getlength
+        else:  # Pillow < 8
+            self.measure = lambda text: font.getsize(text)[0]
+        self.advances: dict[str, float] = {}
+        estimate = sum(self.advance(ch) for ch in _KERNING_SAMPLE)
+        self.additive = abs(self.measure(_KERNING_SAMPLE) - estimate) < 1
+
+    def advance(self, ch: str) -> float:
+        width = self.advances.get(ch)
+        if width is None:
+            width = self.advances[ch] = self.measure(ch)
+        return width
+
+    def width(self, text: str) -> float:
+        """Return the width of ``text`` in pixels."""
+        if not self.additive:
+            return self.measure(text)
+        advances = self.advances
+        total = 0
+        for ch in text:
+            width = advances.get(ch)
+            if width is None:
+                width = self.advance(ch)
+            total += width
+        return total
+
+    def fit(self, word: str, width: int) -> int:
+        """Return how many leading characters of ``word`` fit in ``width``."""
+        lo, hi = 0, len(word)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.width(word[:mid]) <= width:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+
+def metrics(font) -> _Metrics:
+    """Return the cached measurements for ``font``."""
+    with _lock:
+        found = _metrics.get(id(font))
+        if found is None or found.font is not font:
+            found = _metrics[id(font)] = _Metrics(font)
+        return found
+
+
+def text_width(text: str, font) -> float:
+    """Return the width of ``text`` in pixels when drawn with ``font``."""
+    return metrics(font).width(text)
+
+
+def _wrap_paragraph(text: str, m: _Metrics, width: int, lines: list[str]) -> None:
+    space = m.width(" ")
+    current = ""
+    current_width = 0
+    for word in text.split(" "):
+        word_width = m.width(word)
+        if not current:
+            candidate_width = word_width
+        elif m.additive:
+            candidate_width = current_width + space + word_width
+        else:
+            candidate_width = m.width(f"{current} {word}")
+        if candidate_width <= width:
+            current = f"{current} {word}" if current else word
+            current_width = candidate_width
+            continue
+
+        if current:
+            lines.append(current)
+
+        # Split words that are wider than a whole line
+        while word and word_width > width:
+            end = m.fit(word, width)
+            if end == 0:
+                # Not even one character fits; give up on this word
+                break
+            lines.append(word[:end])
+            word = word[end:]
+            word_width = m.width(word)
+
+        current = word
+        current_width = word_width
+
+    if current:
+        lines.append(current)
+
+
+def wrap(text: str, font, width: int) -> list[str]:
+    """Wrap ``text`` into lines no wider than ``width`` pixels.
+
+    Newlines in ``text`` start a new line; blank lines are kept as empty
+    strings.
+    """
+    m = metrics(font)
+    key = (m, width, text)
+    with _lock:
+        lines = _cache.get(key)
+        if lines is not None:
+            _cache.move_to_end(key)
+            return list(lines)
+
+    result: list[str] = []
+    paragraphs = text.split("\n")
+    for paragraph in paragraphs:
+        if paragraph:
+            _wrap_paragraph(paragraph, m, width, result)
+        elif len(paragraphs) > 1:
+            result.append("")
+
+    with _lock:
+        _cache[key] = tuple(result)
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def clear_cache() -> None:
+    """Forget all cached measurements and wrapped text."""
+    with _lock:
+        _metrics.clear()
+        _cache.clear()
@@ -0,0 +1,198 @@
+"""Story thumbnails, downloaded and shrunk in the background.
+
+Images are downloaded by a couple of threads and decoded and scaled down
+to ``THUMB_WIDTH`` pixels wide in a separate process, so the UI thread
+never decodes a JPEG.  The result is stored in ``thumbs/`` in the
+panel's RGB565 format (a ``<HH`` width and height, then the pixels),
+named after the SHA-1 of the image URL.  The least recently used files
+are deleted once the directory grows past ``CACHE_BYTES``, and the last
+few thumbnails are kept in memory ready to paste.
+"""
+
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import requests
+from PIL import Image, ImageChops
+from utils import atomic_write, data_path
+
+logger = logging.getLogger(__name__)
+
+THUMB_WIDTH = 128
+CACHE_DIR = data_path("thumbs")
+# Size of the thumbnail directory before old files are deleted
+CACHE_BYTES = int(os.environ.get("VIRTUALPET_THUMB_CACHE", str(4 << 20)))
+# Decoded thumbnails kept in memory
+MEMORY_ITEMS = 16
+# Download threads; decoding gets a single process so the UI keeps a core
+DOWNLOADERS = 2
+DECODERS = 1
+REQUEST_TIMEOUT = 10
+# Skip images bigger than this rather than decode them on a small device
+MAX_DOWNLOAD = 4 << 20
+
+HEADER = struct.Struct("<HH")
+RAW_MODE = "BGR;16"
+
+_images: OrderedDict[str, Image.Image] = OrderedDict()
+_pending: set[str] = set()
+# URLs that could not be loaded; not retried until restart
+_failed: set[str] = set()
+_lock = threading.Lock()
+_session: requests.Session | None = None
+_downloads: ThreadPoolExecutor | None = None
+_decoders: ProcessPoolExecutor | None = None
+_cache_size: int | None = None
+
+
+def _downscale(data: bytes, width: int) -> tuple[int, int, bytes]:
+    """Decode image ``data`` and return it ``width`` pixels wide in RGB565.
+
+    Runs in a worker process.
+    """
+    image = Image.open(io.BytesIO(data))
+    height = max(1, round(image.height * width / image.width))
+    # Let the JPEG decoder skip most of the work for big images
+    image.draft("RGB", (width, height))
+    image = image.convert("RGB").resize((width, height), Image.Resampling.BILINEAR)
+    # Pillow can read RGB565 but not write it; build the two bytes of each
+    # little-endian RRRRRGGG GGGBBBBB pixel from the channels
+    red, green, blue = image.split()
+    high = ImageChops.add(red.point(lambda v: v & 0xF8), green.point(lambda v: v >> 5))
+    low = ImageChops.add(green.point(lambda v: (v & 0x1C) << 3), blue.point(lambda v: v >> 3))
+    return width, height, Image.merge("LA", (low, high)).tobytes()
+
+
+def _path(url: str) -> str:
+    return os.path.join(CACHE_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".565")
+
+
+def _read(path: str) -> Image.Image | None:
+    try:
+        with open(path, "rb") as fh:
+            data = fh.read()
+        width, height = HEADER.unpack_from(data)
+        image = Image.frombytes("RGB", (width, height), data[HEADER.size:], "raw", RAW_MODE)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, struct.error) as exc:
+        logger.warning(f"Dropping bad thumbnail {path}: {exc}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    # Mark as recently used for eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return image
+
+
+def _evict(added: int) -> None:
+    """Delete the least recently used thumbnails beyond CACHE_BYTES."""
+    global _cache_size
+    with _lock:
+        if _cache_size is not None:
+            _cache_size += added
+            if _cache_size <= CACHE_BYTES:
+                return
+        entries = []
+        with os.scandir(CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith(".565"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        _cache_size = sum(size for _, size, _ in entries)
+        entries.sort()
+        while _cache_size > CACHE_BYTES and entries:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+                _cache_size -= size
+            except OSError:
+                pass
+
+
+def _remember(url: str, image: Image.Image) -> None:
+    with _lock:
+        _images[url] = image
+        _images.move_to_end(url)
+        while len(_images) > MEMORY_ITEMS:
+            _images.popitem(last=False)
+
+
+def _load(url: str) -> None:
+    """Fetch the thumbnail for ``url`` from disk or the network."""
+    try:
+        path = _path(url)
+        image = _read(path)
+        if image is None:
+            resp = _session.get(url, timeout=REQUEST_TIMEOUT, stream=True)
+            resp.raise_for_status()
+            data = resp.raw.read(MAX_DOWNLOAD + 1, decode_content=True)
+            resp.close()
+            if len(data) > MAX_DOWNLOAD:
+                raise ValueError(f"image larger than {MAX_DOWNLOAD} bytes")
+            width, height, pixels = _decoders.submit(_downscale, data, THUMB_WIDTH).result()
+            blob = HEADER.pack(width, height) + pixels
+            atomic_write(path, blob)
+            _evict(len(blob))
+            image = Image.frombytes("RGB", (width, height), pixels, "raw", RAW_MODE)
+        _remember(url, image)
+    except Exception as exc:
+        # Anything from a network error to an undecodable image just
+        # means the story is shown without a picture
+        logger.warning(f"No thumbnail for {url}: {exc}")
+        with _lock:
+            _failed.add(url)
+    finally:
+        with _lock:
+            _pending.discard(url)
+
+
+def start() -> None:
+    """Start the download threads and the decoder process."""
+    global _session, _downloads, _decoders
+    with _lock:
+        if _downloads is not None:
+            return
+        _session = requests.Session()
+        _downloads = ThreadPoolExecutor(DOWNLOADERS, thread_name_prefix="thumbs")
+        # Not fork: this process runs the UI, IRC and news threads, and a
+        # forked child could inherit a lock one of them was holding.  The
+        # fork server only preloads this module, not main.py.
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        _decoders = ProcessPoolExecutor(DECODERS, mp_context=context)
+
+
+def request(url: str) -> None:
+    """Start loading the thumbnail for ``url`` in the background.
+
+    Does nothing until :func:`start` has been called.
+    """
+    with _lock:
+        if (_downloads is None or not url or url in _images or url in _pending
+                or url in _failed):
+            return
+        _pending.add(url)
+    _downloads.submit(_load, url)
+
+
+def get(url: str) -> Image.Image | None:
+    """Return the thumbnail for ``url`` if it is ready, else start loading it."""
+    with _lock:
+        image = _images.get(url)
+        if image is not None:
+            _images.move_to_end(url)
+            return image
+    request(url)
+    return None
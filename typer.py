@@ -1,4 +1,5 @@
 import pygame
+import completion
 
 keyboard_chars = list("abcdefghijklmnopqrstuvwxyz0123456789.,!? ")
 VISIBLE = 10
@@ -24,7 +25,9 @@ def handle_type_event(event):
             typed_text = typed_text[-60:]
     elif event.key == pygame.K_DOWN:
         typed_text = typed_text[:-1]
-    elif event.key in (pygame.K_RETURN, pygame.K_SPACE):
+    elif event.key == pygame.K_SPACE:
+        typed_text = completion.accept(typed_text)[-60:]
+    elif event.key == pygame.K_RETURN:
         shift = not shift
 
     if cursor < scroll:
@@ -39,6 +42,14 @@ def draw_type(screen, FONT):
     msg = FONT.render(display, True, (255, 255, 255))
     screen.blit(msg, (4, 40))
 
+    # Up to three completions for the current word; SPACE takes the first
+    x = 4
+    for i, rest in enumerate(completion.complete(typed_text)):
+        word = completion.current_word(typed_text) + rest
+        text = FONT.render(word, True, (255, 255, 0) if i == 0 else (150, 150, 150))
+        screen.blit(text, (x, 64))
+        x += text.get_width() + 8
+
     start = scroll
     end = scroll + VISIBLE
     for i, ch in enumerate(keyboard_chars[start:end]):
@@ -49,5 +60,5 @@ def draw_type(screen, FONT):
         x = 6 + i * 12
         screen.blit(text, (x, 92))
 
-    tip = FONT.render("LR Move U=Sel D=Del ENT=Shift ESC=Back", True, (200, 200, 200))
+    tip = FONT.render("LR Move U=Sel D=Del SPC=Word ENT=Shift ESC=Back", True, (200, 200, 200))
     screen.blit(tip, (2, 114))
@@ -0,0 +1,161 @@
+"""Low-latency remote joystick over UDP.
+
+Clients such as ``joystick_client.py`` send one small datagram per key
+press or release.  Packets are fed into ``controller`` like the HAT's
+own buttons, so every screen sees ordinary pygame key events.  Each
+client is a separate ``controller`` source: its edges skip the GPIO
+debounce, and its held keys are tracked apart from the physical ones.
+
+Packet layout (network byte order, 10 bytes)::
+
+    magic  b"VJ"   2 bytes
+    version        1 byte   (PROTOCOL_VERSION)
+    kind           1 byte   (KIND_KEY or KIND_KEEPALIVE)
+    seq            4 bytes  incremented by the client for every packet
+    key            1 byte   index into KEY_ORDER
+    pressed        1 byte   1 = press, 0 = release
+
+Each client (source address) has its own sequence; packets that are not
+newer than the last one accepted are duplicates or arrived out of order
+and are dropped.  Keys held by a client that goes quiet for HOLD_TIMEOUT
+seconds are released, so a lost release packet cannot leave a key stuck.
+"""
+
+import logging
+import socket
+import struct
+import threading
+import time
+import controller
+from input_backends import KEY_NAMES
+
+logger = logging.getLogger("hat")
+
+PACKET = struct.Struct("!2sBBIBB")
+MAGIC = b"VJ"
+PROTOCOL_VERSION = 1
+KIND_KEY = 0
+KIND_KEEPALIVE = 1
+
+# Order of keys on the wire; clients must use the same order
+KEY_ORDER = list(KEY_NAMES)
+
+DEFAULT_PORT = 8001
+
+# Seconds without packets after which a client's held keys are released.
+# Clients send keepalives while any key is held.
+HOLD_TIMEOUT = 1.0
+
+# Clients not heard from for this long are forgotten entirely
+CLIENT_EXPIRY = 60.0
+
+_thread = None
+
+
+class _Client:
+    """Per-address sequence and held-key state."""
+
+    __slots__ = ("seq", "last_seen", "held")
+
+    def __init__(self, seq: int, now: float) -> None:
+        self.seq = seq
+        self.last_seen = now
+        self.held: set[int] = set()
+
+
+def _is_newer(seq: int, last: int) -> bool:
+    """Compare 32-bit sequence numbers allowing for wrap-around."""
+    return 0 < (seq - last) % 2**32 < 2**31
+
+
+def _source(addr: tuple) -> str:
+    """Return the ``controller`` source name for client ``addr``."""
+    return f"udp:{addr[0]}:{addr[1]}"
+
+
+class JoystickServer:
+    """Receives joystick datagrams and feeds them into ``feed``."""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = DEFAULT_PORT,
+                 feed=controller.feed) -> None:
+        self.feed = feed
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.settimeout(HOLD_TIMEOUT / 4)
+        self.clients: dict[tuple, _Client] = {}
+        self.accepted = 0
+        self.dropped = 0
+        self._stop = threading.Event()
+
+    def handle(self, data: bytes, addr: tuple, now: float) -> bool:
+        """Apply one datagram; return ``False`` if it was dropped."""
+        if len(data) != PACKET.size:
+            self.dropped += 1
+            return False
+        magic, version, kind, seq, key_idx, pressed = PACKET.unpack(data)
+        if magic != MAGIC or version != PROTOCOL_VERSION:
+            self.dropped += 1
+            return False
+        client = self.clients.get(addr)
+        if client is None:
+            client = self.clients[addr] = _Client(seq - 1, now)
+        if not _is_newer(seq, client.seq):
+            self.dropped += 1
+            return False
+        client.seq = seq
+        client.last_seen = now
+        if kind == KIND_KEY and key_idx < len(KEY_ORDER):
+            key = KEY_NAMES[KEY_ORDER[key_idx]]
+            if pressed:
+                client.held.add(key)
+            else:
+                client.held.discard(key)
+            self.feed(key, bool(pressed), _source(addr))
+        self.accepted += 1
+        return True
+
+    def expire(self, now: float) -> None:
+        """Release keys of silent clients and forget idle ones."""
+        for addr, client in list(self.clients.items()):
+            idle = now - client.last_seen
+            if client.held and idle > HOLD_TIMEOUT:
+                logger.debug(f"Releasing keys held by silent client {addr}")
+                for key in client.held:
+                    self.feed(key, False, _source(addr))
+                client.held.clear()
+            if idle > CLIENT_EXPIRY:
+                del self.clients[addr]
+
+    def serve_forever(self) -> None:
+        while not self._stop.is_set():
+            try:
+                data, addr = self.sock.recvfrom(64)
+            except socket.timeout:
+                data = None
+            except OSError:
+                break
+            now = time.monotonic()
+            if data is not None:
+                self.handle(data, addr, now)
+            self.expire(now)
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.sock.close()
+
+
+def start(host: str = "0.0.0.0", port: int = DEFAULT_PORT) -> JoystickServer | None:
+    """Start the UDP joystick server in a background thread."""
+    global _thread
+    if _thread:
+        return None
+    try:
+        server = JoystickServer(host, port)
+    except OSError as exc:
+        logger.exception(f"Failed to start UDP joystick on port {port}: {exc}")
+        return None
+    _thread = threading.Thread(target=server.serve_forever, daemon=True)
+    _thread.start()
+    logger.info(f"UDP joystick listening on {host}:{port}")
+    return server
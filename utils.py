@@ -1 +1,38 @@
-# Utility functions can go here in the future
+"""Small helpers shared by several modules."""
+
+import os
+import tempfile
+
+# Directory for persistent files such as settings and save states
+DATA_DIR = os.environ.get("VIRTUALPET_DATA_DIR", ".")
+
+
+def data_path(name: str) -> str:
+    """Return the path of ``name`` inside ``DATA_DIR``."""
+    return os.path.join(DATA_DIR, name)
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """Replace ``path`` with ``data`` so readers never see a partial file.
+
+    The data is written to a temporary file in the same directory, synced
+    and renamed over ``path``; the directory is synced as well so the
+    rename survives a power cut.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)